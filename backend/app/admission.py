@@ -0,0 +1,280 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from .config import settings
+
+# Plan-aware admission control for expensive routes (analysis + polish).
+# A fixed number of concurrency slots is split into per-tier reservations and
+# a shared remainder. A tier may always use its own reserved slots and any
+# free shared slot, never another tier's reservation. When requests have to
+# wait, freed slots go to waiters in weighted fair order (start-time fair
+# queuing: each tier's virtual clock advances by 1/weight per admission).
+# While the latency SLO is breached, low-priority tiers are shed outright.
+# The SLO is on analysis latency as reported through observe() (queue wait
+# and LLM polish are not part of it), over the last slo_window seconds, so a
+# breach clears by itself once slow samples age out even if nothing runs.
+
+TIERS = ("pro", "free")
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed or its tier's queue is full."""
+
+class AdmissionTimeout(Exception):
+    """Raised when a request waited longer than the queue timeout."""
+
+def plan_tier(state: Dict[str, str]) -> str:
+    """Scheduling tier for a subscription state ({"plan", "status"})."""
+    if state.get("plan", "").startswith("pro") and state.get("status") == "active":
+        return "pro"
+    return "free"
+
+def parse_tier_map(raw: str, cast: Callable[[str], Any] = float) -> Dict[str, Any]:
+    """'pro=4,free=1' -> {"pro": 4.0, "free": 1.0}"""
+    out = {}
+    for part in raw.split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = cast(v.strip())
+    return out
+
+class _Waiter:
+    __slots__ = ("tier", "tag", "enqueued", "grant", "granted", "abandoned")
+
+    def __init__(self, tier: str, tag: float, grant: Callable[[], None]):
+        self.tier = tier
+        self.tag = tag
+        self.enqueued = time.monotonic()
+        self.grant = grant
+        self.granted = False
+        self.abandoned = False
+
+class _TierStats:
+    def __init__(self, window: int):
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.running = 0
+        self.waits: Deque[float] = deque(maxlen=window)
+
+    def wait_quantile(self, q: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class AdmissionController:
+    def __init__(
+        self,
+        capacity: int = 32,
+        reserved: Optional[Dict[str, int]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        max_queue: int = 256,
+        queue_timeout: float = 10.0,
+        slo_seconds: float = 2.0,
+        shed_tiers: tuple = ("free",),
+        window: int = 200,
+        slo_window: float = 60.0,
+    ):
+        reserved = {t: n for t, n in (reserved or {}).items() if n > 0}
+        if sum(reserved.values()) > capacity:
+            raise ValueError("Reserved admission slots exceed capacity")
+        self.capacity = capacity
+        self.reserved = reserved
+        self.weights = weights or {}
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slo_seconds = slo_seconds
+        self.slo_window = slo_window
+        self.shed_tiers = shed_tiers
+        self._shared_free = capacity - sum(reserved.values())
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._vclock = 0.0
+        self._last_tag: Dict[str, float] = {}
+        self._stats: Dict[str, _TierStats] = {}
+        self._window = window
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=window)  # (when, seconds)
+        self.breached = False
+
+    def _tier_stats(self, tier: str) -> _TierStats:
+        st = self._stats.get(tier)
+        if st is None:
+            st = self._stats[tier] = _TierStats(self._window)
+        return st
+
+    def _can_run(self, tier: str) -> bool:
+        return self._tier_stats(tier).running < self.reserved.get(tier, 0) or self._shared_free > 0
+
+    def _take(self, tier: str, waited: float) -> None:
+        st = self._tier_stats(tier)
+        if st.running >= self.reserved.get(tier, 0):
+            self._shared_free -= 1
+        st.running += 1
+        st.admitted += 1
+        st.waits.append(waited)
+
+    def _give_back(self, tier: str) -> None:
+        st = self._tier_stats(tier)
+        st.running -= 1
+        if st.running >= self.reserved.get(tier, 0):
+            self._shared_free += 1
+
+    def _dispatch(self) -> None:
+        # Grant freed slots to eligible waiters, smallest virtual start tag first.
+        while True:
+            best: Optional[_Waiter] = None
+            for tier, q in self._queues.items():
+                while q and q[0].abandoned:
+                    q.popleft()
+                if q and self._can_run(tier) and (best is None or q[0].tag < best.tag):
+                    best = q[0]
+            if best is None:
+                return
+            self._queues[best.tier].popleft()
+            self._vclock = max(self._vclock, best.tag)
+            self._take(best.tier, time.monotonic() - best.enqueued)
+            best.granted = True
+            best.grant()
+
+    def _enter(self, tier: str, grant: Callable[[], None]) -> Optional[_Waiter]:
+        """Admit immediately (returns None) or enqueue a waiter; raises when shed."""
+        with self._lock:
+            st = self._tier_stats(tier)
+            self._update_breach()
+            if self.breached and tier in self.shed_tiers:
+                st.shed += 1
+                raise AdmissionRejected(f"Shedding {tier} traffic while latency SLO is breached")
+            queue = self._queues.setdefault(tier, deque())
+            if not queue and self._can_run(tier):
+                self._take(tier, 0.0)
+                return None
+            if len(queue) >= self.max_queue:
+                st.shed += 1
+                raise AdmissionRejected(f"Admission queue for {tier} is full")
+            start = max(self._vclock, self._last_tag.get(tier, 0.0))
+            tag = start + 1.0 / self.weights.get(tier, 1.0)
+            self._last_tag[tier] = tag
+            waiter = _Waiter(tier, tag, grant)
+            queue.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter: _Waiter, timed_out: bool = True) -> bool:
+        """Give up waiting; returns False if the slot was granted meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.abandoned = True
+            if timed_out:
+                self._tier_stats(waiter.tier).timeouts += 1
+            return True
+
+    def _exit(self, tier: str) -> None:
+        with self._lock:
+            self._give_back(tier)
+            self._dispatch()
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of one analysis (the work the SLO is about)."""
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+            self._update_breach()
+
+    def _update_breach(self) -> None:
+        self.breached = self._p95_latency() > self.slo_seconds
+
+    def _p95_latency(self) -> float:
+        horizon = time.monotonic() - self.slo_window
+        while self._latencies and self._latencies[0][0] < horizon:
+            self._latencies.popleft()
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(seconds for _, seconds in self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    @contextmanager
+    def slot(self, tier: str):
+        """Hold one admission slot for tier (blocking; for sync routes)."""
+        event = threading.Event()
+        waiter = self._enter(tier, event.set)
+        if waiter is not None and not event.wait(self.queue_timeout) and self._abandon(waiter):
+            raise AdmissionTimeout(f"Waited more than {self.queue_timeout}s for an analysis slot")
+        try:
+            yield
+        finally:
+            self._exit(tier)
+
+    @asynccontextmanager
+    async def aslot(self, tier: str):
+        """Hold one admission slot for tier without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        waiter = self._enter(tier, lambda: loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None)))
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._abandon(waiter):
+                    raise AdmissionTimeout(f"Waited more than {self.queue_timeout}s for an analysis slot")
+            except asyncio.CancelledError:
+                # Client went away while queued: leave the queue, or hand back
+                # a slot granted in the meantime, so it is not held by nobody.
+                if not self._abandon(waiter, timed_out=False):
+                    self._exit(tier)
+                raise
+        try:
+            yield
+        finally:
+            self._exit(tier)
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(1 for q in self._queues.values() for w in q if not w.abandoned)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._update_breach()
+            tiers = {}
+            for tier, st in self._stats.items():
+                tiers[tier] = {
+                    "running": st.running,
+                    "queued": sum(1 for w in self._queues.get(tier, ()) if not w.abandoned),
+                    "reserved": self.reserved.get(tier, 0),
+                    "weight": self.weights.get(tier, 1.0),
+                    "admitted": st.admitted,
+                    "shed": st.shed,
+                    "timeouts": st.timeouts,
+                    "queue_wait_p50": round(st.wait_quantile(0.5), 4),
+                    "queue_wait_p95": round(st.wait_quantile(0.95), 4),
+                }
+            return {
+                "capacity": self.capacity,
+                "shared_free": self._shared_free,
+                "latency_p95": round(self._p95_latency(), 4),
+                "slo_seconds": self.slo_seconds,
+                "breached": self.breached,
+                "tiers": tiers,
+            }
+
+_admission: Optional[AdmissionController] = None
+_admission_lock = threading.Lock()
+
+def get_admission() -> AdmissionController:
+    """Process-wide admission controller built from settings on first use."""
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController(
+                    capacity=settings.ADMISSION_CAPACITY,
+                    reserved=parse_tier_map(settings.ADMISSION_RESERVED, int),
+                    weights=parse_tier_map(settings.ADMISSION_WEIGHTS),
+                    max_queue=settings.ADMISSION_MAX_QUEUE,
+                    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                    slo_seconds=settings.ADMISSION_SLO_SECONDS,
+                    slo_window=settings.ADMISSION_SLO_WINDOW_SECONDS,
+                )
+    return _admission
@@ -1,20 +1,23 @@
 from __future__ import annotations
-import re, math, statistics
-from dataclasses import dataclass
-from typing import Dict, Any, List, Tuple
+import re, math, statistics, sys, operator, codecs
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Any, IO, Iterable, Iterator, List, Optional, Tuple, Union
+from .lexicons import DEFAULT_MODEL_VERSION, get_matcher
 
 # Deterministic, explainable, offline engine.
 # Produces "style signals" and Big Five-ish proxy scores.
 # Not diagnostic; outputs hypotheses + suggestions.
 
 WORD_RE = re.compile(r"[A-Za-z']+")
-
-def _words(text: str) -> List[str]:
-    return WORD_RE.findall(text.lower())
-
-def _sentences(text: str) -> List[str]:
-    parts = re.split(r"[.!?]+", text)
-    return [p.strip() for p in parts if p.strip()]
+SENTENCE_END_RE = re.compile(r"[.!?]+")
+_NON_SPACE_RE = re.compile(r"\S")
+PUNCT_CHARS = ",;:—-()<>"
+# Longest word fragment carried between chunks. Longer "words" still count as
+# words but never match a lexicon entry, so memory stays bounded per stream.
+FRAGMENT_CAP = 64
+# Default chunk size for streaming analysis (characters).
+CHUNK_SIZE = 64 * 1024
 
 def _clamp(x: float, lo: float = 0.0, hi: float = 100.0) -> float:
     return max(lo, min(hi, x))
@@ -25,30 +28,163 @@ class Feature:
     value: float
     note: str
 
-def extract_features(free_text: str, survey: Dict[str, Any]) -> List[Feature]:
-    w = _words(free_text)
-    s = _sentences(free_text)
-    n_words = len(w)
-    n_sent = max(1, len(s))
-    avg_sent_len = n_words / n_sent
+@dataclass
+class TextStats:
+    """
+    Sufficient statistics of a free-text answer: everything extract_features
+    needs, without the text itself. Resumable: feed() more text at any time
+    (e.g. an appended journal entry) and only the new text is scanned.
+    Lexicon hits depend on the scoring model's lexicon pack, so stats are
+    tied to model_version.
+    """
+    chars: int = 0
+    alpha: int = 0
+    upper: int = 0
+    punct: int = 0
+    words: int = 0
+    sentences: int = 0
+    lexicon: Dict[str, int] = field(default_factory=dict)
+    model_version: str = DEFAULT_MODEL_VERSION
+    # Open state at the end of the text fed so far
+    pending_word: str = ""  # lowercased word touching the end; may continue in the next feed
+    sentence_open: bool = False  # trailing segment has content not yet closed by [.!?]
+    recent: List[str] = field(default_factory=list)  # last completed words, for phrases spanning feeds
+
+    def _count_words(self, words: List[str]) -> None:
+        matcher = get_matcher(self.model_version)
+        lexicon = self.lexicon
+        self.words += len(words)
+        if not matcher.has_phrases:
+            for word, k in Counter(words).items():
+                if len(word) >= FRAGMENT_CAP:
+                    continue
+                for lex in matcher.word_lexicons(word):
+                    lexicon[lex] = lexicon.get(lex, 0) + k
+            return
+        keep = matcher.max_phrase_len - 1
+        history = self.recent
+        for word in words:
+            if len(word) >= FRAGMENT_CAP:
+                word = ""  # counted, never matched; breaks phrases
+            else:
+                for lex in matcher.word_lexicons(word) + matcher.phrase_lexicons(history, word):
+                    lexicon[lex] = lexicon.get(lex, 0) + 1
+            history.append(word)
+            if len(history) > keep:
+                del history[0]
+
+    def feed(self, text: str) -> "TextStats":
+        """Scan more text, CHUNK_SIZE characters at a time so memory stays bounded however long it is."""
+        for chunk in iter_text_chunks(text, CHUNK_SIZE):
+            self._feed_chunk(chunk)
+        return self
+
+    def _feed_chunk(self, chunk: str) -> None:
+        self.chars += len(chunk)
+        self.alpha += sum(map(str.isalpha, chunk))
+        self.upper += sum(map(str.isupper, chunk))
+        self.punct += sum(chunk.count(c) for c in PUNCT_CHARS)
+
+        lowered = chunk.lower()
+        words = WORD_RE.findall(lowered)
+        carry = self.pending_word
+        if carry:
+            if words and WORD_RE.match(lowered):
+                words[0] = carry + words[0]
+            else:
+                # chunk did not start with a word character: the carried word ended
+                words.insert(0, carry)
+        self.pending_word = ""
+        if words and WORD_RE.match(lowered, len(lowered) - 1):
+            self.pending_word = words.pop()[:FRAGMENT_CAP]
+        self._count_words(words)
+
+        last = 0
+        for m in SENTENCE_END_RE.finditer(chunk):
+            if self.sentence_open or _NON_SPACE_RE.search(chunk, last, m.start()):
+                self.sentences += 1
+            self.sentence_open = False
+            last = m.end()
+        if _NON_SPACE_RE.search(chunk, last):
+            self.sentence_open = True
 
-    # simple lexicons (tiny but effective)
-    intensifiers = set("very really absolutely totally insanely extremely super so".split())
-    modal = set("maybe might could perhaps likely".split())
-    certainty = set("always never must definitely certain".split())
-    emotion = set("love hate fear hope excited anxious calm".split())
-    technical = set("api cli github json yaml docker deploy auth stripe".split())
-    creative = set("poetic metaphor vibe aesthetic dreamy mythic".split())
+    def finalized(self) -> "TextStats":
+        """Copy with the open word/sentence closed, as if the text ended here."""
+        out = TextStats.from_dict(self.to_dict())
+        if out.pending_word:
+            out._count_words([out.pending_word])
+            out.pending_word = ""
+        if out.sentence_open:
+            out.sentences += 1
+            out.sentence_open = False
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chars": self.chars, "alpha": self.alpha, "upper": self.upper, "punct": self.punct,
+            "words": self.words, "sentences": self.sentences, "lexicon": dict(self.lexicon),
+            "model_version": self.model_version,
+            "pending_word": self.pending_word, "sentence_open": self.sentence_open,
+            "recent": list(self.recent),
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TextStats":
+        return cls(
+            chars=d["chars"], alpha=d["alpha"], upper=d["upper"], punct=d["punct"],
+            words=d["words"], sentences=d["sentences"], lexicon=dict(d.get("lexicon", {})),
+            model_version=d.get("model_version", DEFAULT_MODEL_VERSION),
+            pending_word=d.get("pending_word", ""), sentence_open=d.get("sentence_open", False),
+            recent=list(d.get("recent", [])),
+        )
+
+def scan_text(free_text: str, model_version: str = DEFAULT_MODEL_VERSION) -> TextStats:
+    """Scan a complete text; the result can still be fed appended text."""
+    return TextStats(model_version=model_version).feed(free_text)
+
+def iter_text_chunks(source: Union[str, IO[str]], size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield a string or text stream in chunks of at most `size` characters."""
+    if isinstance(source, str):
+        for i in range(0, len(source), size):
+            yield source[i:i + size]
+        return
+    while True:
+        chunk = source.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_decoded(byte_chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Decode a byte stream incrementally; multi-byte characters may straddle chunks."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for raw in byte_chunks:
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def scan_chunks(chunks: Iterable[str], model_version: str = DEFAULT_MODEL_VERSION) -> TextStats:
+    """Scan a text stream chunk by chunk. Words and sentences split across
+    chunk boundaries are joined, so the result equals scan_text on the
+    concatenation while peak memory is one chunk plus a bounded fragment."""
+    stats = TextStats(model_version=model_version)
+    for chunk in chunks:
+        stats.feed(chunk)
+    return stats
+
+def features_from_stats(stats: TextStats, survey: Dict[str, Any]) -> List[Feature]:
+    st = stats.finalized()
+    n_words = st.words
+    n_sent = max(1, st.sentences)
+    avg_sent_len = n_words / n_sent
 
-    intens_count = sum(1 for x in w if x in intensifiers)
-    modal_count = sum(1 for x in w if x in modal)
-    cert_count = sum(1 for x in w if x in certainty)
-    emo_count = sum(1 for x in w if x in emotion)
-    tech_count = sum(1 for x in w if x in technical)
-    cre_count = sum(1 for x in w if x in creative)
+    def rate(lex: str) -> float:
+        return (st.lexicon.get(lex, 0) / max(1, n_words))*100.0
 
-    caps_ratio = (sum(1 for ch in free_text if ch.isupper()) / max(1, sum(1 for ch in free_text if ch.isalpha())))
-    punct_density = (sum(1 for ch in free_text if ch in ",;:—-()<>" ) / max(1, len(free_text)))
+    caps_ratio = st.upper / max(1, st.alpha)
+    punct_density = st.punct / max(1, st.chars)
 
     # Survey signals (expected keys; safe defaults)
     # Values should be 1-5 Likert in UI.
@@ -61,12 +197,12 @@ def extract_features(free_text: str, survey: Dict[str, Any]) -> List[Feature]:
     feats = [
         Feature("word_count", float(n_words), "Total words in free-text." ),
         Feature("avg_sentence_len", float(avg_sent_len), "Average sentence length (words)." ),
-        Feature("intensifier_rate", (intens_count / max(1, n_words))*100.0, "Percent of words that are intensifiers." ),
-        Feature("modal_rate", (modal_count / max(1, n_words))*100.0, "Percent of words that express uncertainty." ),
-        Feature("certainty_rate", (cert_count / max(1, n_words))*100.0, "Percent of words that express certainty/absolutes." ),
-        Feature("emotion_rate", (emo_count / max(1, n_words))*100.0, "Percent of emotion-laden words." ),
-        Feature("technical_rate", (tech_count / max(1, n_words))*100.0, "Percent of technical lexicon words." ),
-        Feature("creative_rate", (cre_count / max(1, n_words))*100.0, "Percent of creative/aesthetic lexicon words." ),
+        Feature("intensifier_rate", rate("intensifier"), "Percent of words that are intensifiers." ),
+        Feature("modal_rate", rate("modal"), "Percent of words that express uncertainty." ),
+        Feature("certainty_rate", rate("certainty"), "Percent of words that express certainty/absolutes." ),
+        Feature("emotion_rate", rate("emotion"), "Percent of emotion-laden words." ),
+        Feature("technical_rate", rate("technical"), "Percent of technical lexicon words." ),
+        Feature("creative_rate", rate("creative"), "Percent of creative/aesthetic lexicon words." ),
         Feature("caps_ratio", caps_ratio*100.0, "Uppercase letters as % of alphabetic characters." ),
         Feature("punct_density", punct_density*100.0, "Punctuation density proxy." ),
         Feature("survey_novelty", novelty, "Self-reported novelty seeking (1-5)." ),
@@ -77,6 +213,9 @@ def extract_features(free_text: str, survey: Dict[str, Any]) -> List[Feature]:
     ]
     return feats
 
+def extract_features(free_text: str, survey: Dict[str, Any], model_version: str = DEFAULT_MODEL_VERSION) -> List[Feature]:
+    return features_from_stats(scan_text(free_text, model_version), survey)
+
 def score_traits(features: List[Feature]) -> Dict[str, Any]:
     # Map features -> trait proxies (0-100)
     f = {x.name: x.value for x in features}
@@ -107,59 +246,132 @@ def score_traits(features: List[Feature]) -> Dict[str, Any]:
         }
     }
 
-def generate_narrative(scores: Dict[str, Any], features: List[Feature]) -> Dict[str, Any]:
-    bf = scores["big_five"]
-    ss = scores["style_signals"]
+# Trait order of the flattened score vector: (group, trait) pairs as they
+# appear in the dict returned by score_traits.
+TRAIT_KEYS: Tuple[Tuple[str, str], ...] = (
+    ("big_five", "openness"),
+    ("big_five", "conscientiousness"),
+    ("big_five", "extraversion"),
+    ("big_five", "agreeableness"),
+    ("big_five", "neuroticism"),
+    ("style_signals", "intensity"),
+    ("style_signals", "systems_thinking"),
+    ("style_signals", "ambiguity_tolerance"),
+)
+_TRAIT_INDEX = {name: i for i, (_, name) in enumerate(TRAIT_KEYS)}
 
-    # Hypothesis statements (non-diagnostic, cautious)
-    bullets = []
-    if bf["openness"] >= 65:
-        bullets.append("High novelty/idea-connection tendency; you likely enjoy remixing concepts across domains.")
-    if ss["systems_thinking"] >= 65:
-        bullets.append("Strong systems orientation; you may prefer end-to-end plans and dislike vague placeholders.")
-    if ss["intensity"] >= 65:
-        bullets.append("High intensity signal; your engagement often runs 'all in' when something matters.")
-    if bf["conscientiousness"] >= 65:
-        bullets.append("Preference for structure and execution; checklists and automation may feel soothing.")
-    if bf["neuroticism"] >= 65:
-        bullets.append("Higher sensitivity signal; sensory overload or stress spikes may be more likely under chaos.")
-    if not bullets:
-        bullets.append("Mixed/balanced profile; you may flex styles depending on context.")
+def trait_vector(scores: Dict[str, Any]) -> List[float]:
+    """Flatten score_traits output into a list ordered like TRAIT_KEYS."""
+    return [float(scores[group][name]) for group, name in TRAIT_KEYS]
 
+# Narrative text, keyed by stable template id. Reports carry the ids so they
+# can be stored, cached or localized without depending on the English text.
+NARRATIVE_TEMPLATES: Dict[str, str] = {tid: sys.intern(text) for tid, text in {
+    # Hypothesis statements (non-diagnostic, cautious)
+    "hyp.openness.high": "High novelty/idea-connection tendency; you likely enjoy remixing concepts across domains.",
+    "hyp.systems_thinking.high": "Strong systems orientation; you may prefer end-to-end plans and dislike vague placeholders.",
+    "hyp.intensity.high": "High intensity signal; your engagement often runs 'all in' when something matters.",
+    "hyp.conscientiousness.high": "Preference for structure and execution; checklists and automation may feel soothing.",
+    "hyp.neuroticism.high": "Higher sensitivity signal; sensory overload or stress spikes may be more likely under chaos.",
+    "hyp.balanced": "Mixed/balanced profile; you may flex styles depending on context.",
     # Suggestions
-    suggestions = [
-        "Use a two-pass workflow: (1) wild ideation, (2) ruthless reduction into a minimal shippable unit.",
-        "If you feel overwhelmed, reduce inputs: dim light, fewer tabs, single-task timers, simple ambient audio.",
-        "When communicating, state: goal → constraints → definition of done. It lowers friction dramatically.",
+    "sug.two_pass": "Use a two-pass workflow: (1) wild ideation, (2) ruthless reduction into a minimal shippable unit.",
+    "sug.reduce_inputs": "If you feel overwhelmed, reduce inputs: dim light, fewer tabs, single-task timers, simple ambient audio.",
+    "sug.goal_constraints": "When communicating, state: goal → constraints → definition of done. It lowers friction dramatically.",
+    "sug.ambiguity_tolerance.low": "Ambiguity may feel costly—ask for concrete examples, timelines, and acceptance criteria.",
+    "sug.agreeableness.low": "Directness can be a superpower; add a 1-line 'warm wrapper' to reduce misreads.",
+    "sug.extraversion.high": "You may ideate best out loud—voice notes or co-working can amplify output.",
+}.items()}
+
+DISCLAIMER = "This report is a self-reflection aid, not a diagnosis. If you suspect a clinical condition, consult a qualified professional."
+
+@dataclass(frozen=True)
+class NarrativeRule:
+    template_id: str
+    section: str  # hypotheses|suggestions
+    trait: Optional[str] = None  # None: rule always fires
+    op: str = ">="
+    threshold: float = 0.0
+
+_OPS = {">=": operator.ge, ">": operator.gt, "<": operator.lt, "<=": operator.le}
+
+# Evaluated in table order; the order fixes the order of the rendered lists.
+NARRATIVE_RULES: Tuple[NarrativeRule, ...] = (
+    NarrativeRule("hyp.openness.high", "hypotheses", "openness", ">=", 65),
+    NarrativeRule("hyp.systems_thinking.high", "hypotheses", "systems_thinking", ">=", 65),
+    NarrativeRule("hyp.intensity.high", "hypotheses", "intensity", ">=", 65),
+    NarrativeRule("hyp.conscientiousness.high", "hypotheses", "conscientiousness", ">=", 65),
+    NarrativeRule("hyp.neuroticism.high", "hypotheses", "neuroticism", ">=", 65),
+    NarrativeRule("sug.two_pass", "suggestions"),
+    NarrativeRule("sug.reduce_inputs", "suggestions"),
+    NarrativeRule("sug.goal_constraints", "suggestions"),
+    NarrativeRule("sug.ambiguity_tolerance.low", "suggestions", "ambiguity_tolerance", "<", 45),
+    NarrativeRule("sug.agreeableness.low", "suggestions", "agreeableness", "<", 45),
+    NarrativeRule("sug.extraversion.high", "suggestions", "extraversion", ">", 60),
+)
+# Fallback hypothesis when no hypothesis rule fires.
+_HYPOTHESIS_FALLBACK = ("hyp.balanced",)
+
+def _compile_rules(rules: Tuple[NarrativeRule, ...]):
+    """Resolve rule traits/operators once into (id, is_hypothesis, index, op, threshold) rows."""
+    compiled = []
+    for r in rules:
+        if r.template_id not in NARRATIVE_TEMPLATES:
+            raise ValueError(f"Unknown narrative template: {r.template_id}")
+        if r.trait is None:
+            compiled.append((r.template_id, r.section == "hypotheses", None, None, 0.0))
+        else:
+            compiled.append((r.template_id, r.section == "hypotheses", _TRAIT_INDEX[r.trait], _OPS[r.op], float(r.threshold)))
+    return tuple(compiled)
+
+_COMPILED_RULES = _compile_rules(NARRATIVE_RULES)
+
+# Features surfaced in the explainability block.
+EXPLAIN_FEATURES = frozenset(("intensifier_rate", "technical_rate", "creative_rate", "survey_focus", "survey_structure", "survey_novelty"))
+
+def select_templates(vec: List[float]) -> Tuple[List[str], List[str]]:
+    """Evaluate the rule table against a trait vector in one pass; returns (hypothesis_ids, suggestion_ids)."""
+    fired = [(tid, hyp) for tid, hyp, i, op, t in _COMPILED_RULES if i is None or op(vec[i], t)]
+    hyp_ids = [tid for tid, hyp in fired if hyp] or list(_HYPOTHESIS_FALLBACK)
+    sug_ids = [tid for tid, hyp in fired if not hyp]
+    return hyp_ids, sug_ids
+
+def render_templates(template_ids: List[str], templates: Optional[Dict[str, str]] = None) -> List[str]:
+    """Render template ids to text; pass a translated table to localize."""
+    table = templates or NARRATIVE_TEMPLATES
+    return [table.get(tid, NARRATIVE_TEMPLATES[tid]) for tid in template_ids]
+
+def generate_narrative(scores: Dict[str, Any], features: List[Feature]) -> Dict[str, Any]:
+    hyp_ids, sug_ids = select_templates(trait_vector(scores))
+
+    explain = [
+        {"feature": ft.name, "value": round(ft.value,2), "note": ft.note}
+        for ft in features if ft.name in EXPLAIN_FEATURES
     ]
-    if ss["ambiguity_tolerance"] < 45:
-        suggestions.append("Ambiguity may feel costly—ask for concrete examples, timelines, and acceptance criteria.")
-    if bf["agreeableness"] < 45:
-        suggestions.append("Directness can be a superpower; add a 1-line 'warm wrapper' to reduce misreads.")
-    if bf["extraversion"] > 60:
-        suggestions.append("You may ideate best out loud—voice notes or co-working can amplify output.")
-
-    explain = []
-    for ft in features:
-        if ft.name in ("intensifier_rate","technical_rate","creative_rate","survey_focus","survey_structure","survey_novelty"):
-            explain.append({
-                "feature": ft.name,
-                "value": round(ft.value,2),
-                "note": ft.note
-            })
 
     return {
-        "hypotheses": bullets,
-        "suggestions": suggestions,
+        "hypotheses": render_templates(hyp_ids),
+        "suggestions": render_templates(sug_ids),
+        "hypothesis_ids": hyp_ids,
+        "suggestion_ids": sug_ids,
         "explainability": explain,
-        "disclaimer": "This report is a self-reflection aid, not a diagnosis. If you suspect a clinical condition, consult a qualified professional."
+        "disclaimer": DISCLAIMER,
     }
 
-def analyze(free_text: str, survey: Dict[str, Any]) -> Dict[str, Any]:
-    feats = extract_features(free_text, survey)
+def analyze_stats(stats: TextStats, survey: Dict[str, Any]) -> Dict[str, Any]:
+    """Score from stored text statistics; no re-tokenization of the text."""
+    feats = features_from_stats(stats, survey)
     scores = score_traits(feats)
     narrative = generate_narrative(scores, feats)
     return {
         "scores": scores,
-        "narrative": narrative
+        "narrative": narrative,
+        "model_version": stats.model_version,
     }
+
+def analyze_stream(chunks: Iterable[str], survey: Dict[str, Any], model_version: str = DEFAULT_MODEL_VERSION) -> Dict[str, Any]:
+    """Streaming analysis mode: same result as analyze() on the joined text."""
+    return analyze_stats(scan_chunks(chunks, model_version), survey)
+
+def analyze(free_text: str, survey: Dict[str, Any], model_version: str = DEFAULT_MODEL_VERSION) -> Dict[str, Any]:
+    return analyze_stats(scan_text(free_text, model_version), survey)
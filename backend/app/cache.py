@@ -0,0 +1,355 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Cache abstraction shared by every uvicorn worker on a host (or fleet).
+#   memory - per-process dict; the default and what tests use
+#   sqlite - one file shared by all workers on a host (WAL mode)
+#   redis  - any Redis-protocol server (tests use fakeredis)
+# Values are JSON-serializable. invalidate() deletes a key everywhere and fans
+# the invalidation out to every subscribed process (pub/sub), which is what
+# keeps per-process near caches coherent (see TieredCache).
+
+Subscriber = Callable[[str], None]
+
+class Cache(ABC):
+    def __init__(self):
+        self._subscribers: List[Subscriber] = []
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, ttl: float) -> int:
+        """Atomically increment a counter; a new counter expires after ttl seconds."""
+
+    def invalidate(self, key: str) -> None:
+        """Delete key and notify every subscriber, in this and other processes."""
+        self.delete(key)
+        self._publish(key)
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self._subscribers.append(callback)
+
+    def _publish(self, key: str) -> None:
+        self._dispatch(key)
+
+    def _dispatch(self, key: str) -> None:
+        for cb in list(self._subscribers):
+            try:
+                cb(key)
+            except Exception as e:
+                logger.error(f"Cache invalidation subscriber failed: {e}")
+
+    def close(self) -> None:
+        pass
+
+class MemoryCache(Cache):
+    """Per-process cache. Invalidations only reach this process."""
+
+    def __init__(self, max_entries: int = 10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[Any, Optional[float]]]:
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._live(key, time.time())
+            return None if item is None else item[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            if len(self._data) >= self.max_entries and key not in self._data:
+                self._evict(time.time())
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def _evict(self, now: float) -> None:
+        expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+        for k in expired:
+            del self._data[k]
+        if len(self._data) >= self.max_entries:
+            # drop the oldest insertion (dicts keep insertion order)
+            del self._data[next(iter(self._data))]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key: str, ttl: float) -> int:
+        with self._lock:
+            now = time.time()
+            item = self._live(key, now)
+            if item is None:
+                if len(self._data) >= self.max_entries:
+                    self._evict(now)
+                self._data[key] = (1, now + ttl)
+                return 1
+            value = int(item[0]) + 1
+            self._data[key] = (value, item[1])
+            return value
+
+class SQLiteCache(Cache):
+    """
+    Cache in a SQLite file shared by the workers of one host. Invalidations
+    are appended to an events table; each process polls it (start_listener)
+    and dispatches events it has not seen yet.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.5, event_retention: float = 300.0):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.event_retention = event_retention
+        self._local = threading.local()
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, ts REAL NOT NULL)")
+        # Only invalidations published after we attached are delivered to us.
+        self._last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key: str, ttl: float) -> int:
+        now = time.time()
+        row = self._conn().execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, '1', ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN '1' ELSE CAST(CAST(value AS INTEGER) + 1 AS TEXT) END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, now + ttl, now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def _publish(self, key: str) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("INSERT INTO events (key, ts) VALUES (?, ?)", (key, now))
+        conn.execute("DELETE FROM events WHERE ts < ?", (now - self.event_retention,))
+        self.poll()
+
+    def poll(self) -> int:
+        """Dispatch invalidations published since the last poll; returns how many."""
+        with self._poll_lock:
+            rows = self._conn().execute(
+                "SELECT id, key FROM events WHERE id > ? ORDER BY id", (self._last_event,)
+            ).fetchall()
+            if rows:
+                self._last_event = rows[-1][0]
+        for _, key in rows:
+            self._dispatch(key)
+        return len(rows)
+
+    def start_listener(self) -> None:
+        if self._listener is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.poll()
+                    self._conn().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+                except Exception as e:
+                    logger.error(f"Cache invalidation poll failed: {e}")
+
+        self._listener = threading.Thread(target=loop, name="cache-invalidation", daemon=True)
+        self._listener.start()
+
+    def close(self) -> None:
+        self._stop.set()
+
+class RedisCache(Cache):
+    """Redis-protocol backend; invalidations go out on a pub/sub channel."""
+
+    def __init__(self, url: str, channel: str = "atlas:invalidate", prefix: str = "atlas:", client=None):
+        super().__init__()
+        if client is None:
+            try:
+                import redis  # optional dependency, only needed for this backend
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+            client = redis.Redis.from_url(url)
+        self._client = client  # tests pass a fakeredis client
+        self.channel = channel
+        self.prefix = prefix
+        self._pubsub = None
+        self._listener = None
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def incr(self, key: str, ttl: float) -> int:
+        pipe = self._client.pipeline()
+        pipe.incr(self.prefix + key)
+        pipe.pexpire(self.prefix + key, int(ttl * 1000), nx=True)
+        return int(pipe.execute()[0])
+
+    def _publish(self, key: str) -> None:
+        # Our own listener receives it too, like every other process.
+        self._client.publish(self.channel, key)
+
+    def start_listener(self) -> None:
+        if self._pubsub is not None:
+            return
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: lambda msg: self._dispatch(msg["data"].decode("utf-8"))})
+        self._listener = self._pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+
+class TieredCache(Cache):
+    """
+    Process-local near cache in front of a shared backend. Reads hit the
+    local tier first; invalidations from any process evict the local copy.
+    Counters always go to the shared tier so limits hold across workers.
+    """
+
+    def __init__(self, shared: Cache, local_ttl: float = 30.0):
+        super().__init__()
+        self.shared = shared
+        self.local = MemoryCache()
+        self.local_ttl = local_ttl
+        shared.subscribe(self._on_invalidate)
+
+    def _on_invalidate(self, key: str) -> None:
+        self.local.delete(key)
+        self._dispatch(key)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, self.local_ttl)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.shared.set(key, value, ttl)
+        self.local.set(key, value, min(ttl, self.local_ttl) if ttl else self.local_ttl)
+
+    def delete(self, key: str) -> None:
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def incr(self, key: str, ttl: float) -> int:
+        return self.shared.incr(key, ttl)
+
+    def invalidate(self, key: str) -> None:
+        self.local.delete(key)
+        self.shared.invalidate(key)
+
+    def start_listener(self) -> None:
+        start = getattr(self.shared, "start_listener", None)
+        if start:
+            start()
+
+    def close(self) -> None:
+        self.shared.close()
+
+def subscription_key(user_id: int) -> str:
+    """Cache key of a user's plan/status (principal cache); invalidate it on change."""
+    return f"subscription:{user_id}"
+
+def versioned_key(cache: Cache, key: str) -> str:
+    """
+    Where the current value of key lives: key plus a random version stored
+    under key itself. invalidate(key) drops the version, so the next reader
+    starts a new one. A reader that loaded the old value from the database
+    before the change can only write it under the retired version, which no
+    one reads again (the read-then-set race of a plain cache-aside key).
+    """
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version)
+    return f"{key}@{version}"
+
+def build_cache(backend: str, url: Optional[str] = None) -> Cache:
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "sqlite":
+        return TieredCache(SQLiteCache(url or "./data/cache.db"))
+    if backend == "redis":
+        return TieredCache(RedisCache(url or "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Cache:
+    """Process-wide cache built from CACHE_BACKEND/CACHE_URL on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache(settings.CACHE_BACKEND, settings.CACHE_URL)
+    return _cache
+
+def start_cache_listener() -> None:
+    start = getattr(get_cache(), "start_listener", None)
+    if start:
+        start()
@@ -7,12 +7,18 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite:///./data/atlas.db"
+    # Async connection pool (Postgres); bounds concurrent DB work of the async routes
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
     
     # Security
     JWT_SECRET: str = "change_me"
     
     # Mode
     DEMO_MODE: bool = True
+
+    # Comma-separated emails allowed on /admin endpoints
+    ADMIN_EMAILS: str = ""
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000"
@@ -30,9 +36,70 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     OPENAI_MODEL: str = "gpt-4.1-mini"
     OPENAI_POLISH_ENABLED: bool = False
+    POLISH_BATCH_WINDOW_MS: int = 50  # distinct inputs arriving within this window share one request
+    POLISH_BATCH_MAX_ITEMS: int = 16
+    POLISH_TIMEOUT_SECONDS: float = 30.0
+
+    # Scoring model: selects the lexicon pack (app/lexicon_packs/<version>.json)
+    SCORING_MODEL_VERSION: str = "v1"
+    LEXICON_PACK_DIR: str | None = None  # extra directory searched for packs first
+
+    # Analysis executor: inline|thread|process (see app/executor.py)
+    ANALYSIS_EXECUTOR: str = "inline"
+    ANALYSIS_WORKERS: int = 0  # 0 = one per CPU
+    ANALYSIS_QUEUE_SIZE: int = 64
+    ANALYSIS_TIMEOUT_SECONDS: float = 30.0
+
+    # Plan-aware admission control for /analyze (see app/admission.py)
+    ADMISSION_CAPACITY: int = 32  # concurrent analyses per process
+    ADMISSION_RESERVED: str = "pro=8"  # slots only a tier may use
+    ADMISSION_WEIGHTS: str = "pro=4,free=1"  # fair-queuing weights when waiting
+    ADMISSION_MAX_QUEUE: int = 256  # per tier
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    ADMISSION_SLO_SECONDS: float = 2.0  # p95 analysis latency above this sheds free traffic
+    ADMISSION_SLO_WINDOW_SECONDS: float = 60.0  # latency samples older than this are dropped
+
+    # Readiness (/readyz, see app/readiness.py): not ready while a signal is
+    # above its threshold, ready again once all are below threshold * READY_RECOVERY_RATIO.
+    # A threshold of 0 reports the signal (also on /metrics) without gating on it.
+    READY_DB_POOL_UTILIZATION: float = 0.9  # checked-out connections / pool capacity
+    READY_EXECUTOR_UTILIZATION: float = 0.9  # in-flight analyses / executor capacity
+    READY_QUEUE_DEPTH: int = 64  # requests waiting for an admission slot
+    READY_LOOP_LAG_SECONDS: float = 0.5
+    READY_LLM_ERROR_RATE: float = 0.0  # an LLM outage hits every instance alike; off by default
+    READY_RECOVERY_RATIO: float = 0.8
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.25
+
+    # Idempotency-Key responses are replayed for this long
+    IDEMPOTENCY_TTL_HOURS: int = 24
+
+    # Population percentile snapshots are flushed to the DB this often
+    PERCENTILE_FLUSH_SECONDS: float = 30.0
+
+    # Similar profiles / archetypes (see app/similarity.py)
+    SIMILARITY_CLUSTERS: int = 8
+    SIMILARITY_REFRESH_SECONDS: float = 30.0  # pick up vectors written by other workers
+
+    # Retention (see app/retention.py): days of history kept in the hot tables
+    # per plan tier, e.g. "free=365,pro=0" (empty or 0 = forever); older
+    # intakes/reports move to ARCHIVE_DIR. Off by default: ARCHIVE_DIR must be
+    # durable storage shared by every instance (a mounted volume/network share),
+    # or archived data is lost on redeploy and invisible to the other instances.
+    RETENTION_DAYS: str = ""
+    ARCHIVE_DIR: str = "./data/archive"
+    ARCHIVE_INTERVAL_SECONDS: float = 0.0  # 0 disables the background archiver
+
+    # Shared cache: memory|sqlite|redis (see app/cache.py)
+    CACHE_BACKEND: str = "memory"
+    CACHE_URL: str | None = None  # sqlite file path or redis:// URL
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
 
     # Rate limiting
     RATE_LIMIT_RPM: int = 60
+
+    # Request size limits (enforced while the body is read)
+    MAX_REQUEST_BYTES: int = 2 * 1024 * 1024
+    MAX_FREE_TEXT_CHARS: int = 500_000
     
     # Observability
     SENTRY_DSN: str | None = None
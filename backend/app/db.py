@@ -1,12 +1,43 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from .config import settings
 
 connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 engine = create_engine(settings.DATABASE_URL, echo=False, connect_args=connect_args)
 
+# Async drivers for the same database; the hot API routes use these so a
+# request waiting on the database does not hold a threadpool thread.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    """The async-driver form of a sync DATABASE_URL (already-async URLs pass through)."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def create_async_engine_for(url: str, **kwargs) -> AsyncEngine:
+    return create_async_engine(async_database_url(url), echo=False, **kwargs)
+
+pool_args = {} if settings.DATABASE_URL.startswith("sqlite") else {"pool_size": settings.DB_POOL_SIZE, "max_overflow": settings.DB_MAX_OVERFLOW}
+async_engine = create_async_engine_for(settings.DATABASE_URL, **pool_args)
+
 def init_db() -> None:
     SQLModel.metadata.create_all(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+def async_session_dependency(bind: AsyncEngine):
+    """A FastAPI dependency yielding AsyncSessions on bind."""
+    async def get_async_session():
+        async with AsyncSession(bind, expire_on_commit=False) as session:
+            yield session
+    return get_async_session
+
+get_async_session = async_session_dependency(async_engine)
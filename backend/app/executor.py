@@ -0,0 +1,168 @@
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Analysis executor: where CPU-bound engine work (tokenizing, scoring) runs.
+#   inline  - in the calling thread (request threadpool); the historical behaviour
+#   thread  - dedicated thread pool; isolates analysis from the request threadpool
+#   process - pre-started worker processes; sidesteps the GIL so analyses scale across cores
+BACKENDS = ("inline", "thread", "process")
+
+class AnalysisBusy(Exception):
+    """Raised when the bounded analysis queue is full."""
+
+class AnalysisTimeout(Exception):
+    """Raised when an analysis task exceeds its timeout."""
+
+def _warm_worker() -> None:
+    # Runs once per worker process (in-process for inline/thread): import the
+    # engine and compile the lexicon pack so the first real task does not pay for it.
+    from . import analysis_engine, lexicons
+    if settings.LEXICON_PACK_DIR:
+        lexicons.register_pack_dir(settings.LEXICON_PACK_DIR)
+    analysis_engine.scan_text("warm up", settings.SCORING_MODEL_VERSION)
+
+def _noop() -> None:
+    return None
+
+class AnalysisExecutor:
+    def __init__(self, backend: str = "inline", workers: int = 0, queue_size: int = 64, timeout: float = 30.0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown analysis executor backend: {backend}")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.timeout = timeout
+        # Capacity = tasks running on workers + tasks waiting for a worker.
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._pool = None
+        if backend != "process":
+            _warm_worker()
+        if backend == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis")
+        elif backend == "process":
+            # spawn: forking a process that already runs threads (uvicorn, the
+            # thread pool) is unsafe; workers are started eagerly below instead.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+            for f in [self._pool.submit(_noop) for _ in range(self.workers)]:
+                f.result()
+        logger.info(f"Analysis executor: {backend} ({self.workers} workers, queue {queue_size})")
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Queue fn(*args); raises AnalysisBusy instead of queueing without bound."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise AnalysisBusy("Analysis queue full")
+        with self._lock:
+            self._in_flight += 1
+        if self._pool is None:
+            fut: Future = Future()
+            try:
+                fut.set_result(fn(*args))
+            except BaseException as e:
+                fut.set_exception(e)
+        else:
+            try:
+                fut = self._pool.submit(fn, *args)
+            except BaseException:
+                with self._lock:
+                    self._in_flight -= 1
+                self._slots.release()
+                raise
+        fut.add_done_callback(self._release)
+        return fut
+
+    def _timed_out(self, fut: Future) -> AnalysisTimeout:
+        # A task already running in a worker cannot be interrupted; cancel()
+        # only drops it if it is still queued. Either way the caller moves on.
+        fut.cancel()
+        with self._lock:
+            self.timeouts += 1
+        return AnalysisTimeout(f"Analysis exceeded {self.timeout}s")
+
+    def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on the executor and wait for the result (sync callers)."""
+        fut = self.submit(fn, *args)
+        try:
+            return fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise self._timed_out(fut)
+
+    async def run_async(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on the executor without blocking the event loop."""
+        if self._pool is None:
+            # inline: hand off to the default threadpool rather than the loop itself
+            return await asyncio.get_running_loop().run_in_executor(None, self.run, fn, *args)
+        fut = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(fut), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out(fut)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "in_flight": self._in_flight,
+            "capacity": self.workers + self.queue_size,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+_executor: Optional[AnalysisExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> AnalysisExecutor:
+    """Process-wide executor built from settings on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = AnalysisExecutor(
+                    backend=settings.ANALYSIS_EXECUTOR,
+                    workers=settings.ANALYSIS_WORKERS,
+                    queue_size=settings.ANALYSIS_QUEUE_SIZE,
+                    timeout=settings.ANALYSIS_TIMEOUT_SECONDS,
+                )
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator, List, Optional
+from sqlmodel import Session, select
+from .analysis_engine import TRAIT_KEYS
+from .models import Report
+
+# Report export: rows are read from a server-side cursor in batches, flattened
+# to one column per trait, and encoded incrementally, so memory is bounded by
+# the batch size however many reports are exported.
+
+FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+BATCH_SIZE = 1000
+
+TRAIT_COLUMNS = [f"{group}_{name}" for group, name in TRAIT_KEYS]
+COLUMNS = ["report_id", "user_id", "session_id", "created_at", "model_version", *TRAIT_COLUMNS]
+
+class ExportUnavailable(Exception):
+    """Raised when a format's optional dependency is missing."""
+
+def flatten_report(report_id: int, user_id: int, session_id: int, created_at, result_json: str) -> Dict[str, Any]:
+    result = json.loads(result_json)
+    scores = result.get("scores", {})
+    row: Dict[str, Any] = {
+        "report_id": report_id,
+        "user_id": user_id,
+        "session_id": session_id,
+        "created_at": created_at.isoformat() if created_at else None,
+        "model_version": result.get("model_version"),
+    }
+    for (group, name), column in zip(TRAIT_KEYS, TRAIT_COLUMNS):
+        row[column] = scores.get(group, {}).get(name)
+    return row
+
+def iter_report_batches(db: Session, user_id: Optional[int] = None, batch_size: int = BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Flattened report rows in id order, batch_size at a time (all users if user_id is None)."""
+    stmt = select(Report.id, Report.user_id, Report.session_id, Report.created_at, Report.result_json).order_by(Report.id)
+    if user_id is not None:
+        stmt = stmt.where(Report.user_id == user_id)
+    result = db.exec(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    batch: List[Dict[str, Any]] = []
+    for row in result:
+        batch.append(flatten_report(*row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _iter_csv(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=COLUMNS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+def _iter_ndjson(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    try:
+        import orjson
+        dumps = orjson.dumps
+    except ImportError:  # pragma: no cover
+        dumps = lambda row: json.dumps(row, separators=(",", ":")).encode("utf-8")
+    for batch in batches:
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+def _parquet_schema(pa):
+    return pa.schema(
+        [
+            ("report_id", pa.int64()),
+            ("user_id", pa.int64()),
+            ("session_id", pa.int64()),
+            ("created_at", pa.string()),
+            ("model_version", pa.string()),
+        ]
+        + [(c, pa.float64()) for c in TRAIT_COLUMNS]
+    )
+
+def _iter_parquet(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema(pa)
+    sink = _DrainableSink()
+    # One row group per batch; the footer is written on close.
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ExportUnavailable("Parquet export requires the 'pyarrow' package") from e
+
+def iter_export(db: Session, fmt: str, user_id: Optional[int] = None, batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """Encoded export stream; closes db when exhausted."""
+    check_format(fmt)
+    encoders = {"csv": _iter_csv, "ndjson": _iter_ndjson, "parquet": _iter_parquet}
+    try:
+        yield from encoders[fmt](iter_report_batches(db, user_id, batch_size))
+    finally:
+        db.close()
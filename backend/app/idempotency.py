@@ -0,0 +1,85 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from .config import settings
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+def request_fingerprint(*parts: Any) -> str:
+    """Stable hash of the request inputs a key is bound to."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def find_response(db: Session, user_id: int, route: str, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+    """Stored response for (user, route, key), or None. Reusing a key for a different request is a 422."""
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key too long")
+    rec = db.exec(select(IdempotencyRecord).where(
+        IdempotencyRecord.user_id == user_id,
+        IdempotencyRecord.route == route,
+        IdempotencyRecord.key == key,
+    )).first()
+    if not rec:
+        return None
+    if rec.created_at < datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS):
+        db.delete(rec)
+        db.commit()
+        return None
+    if rec.request_hash != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+    logger.info(f"Idempotent replay for user {user_id} {route} key {key}")
+    return json.loads(rec.response_json)
+
+def store_response(db: Session, user_id: int, route: str, key: str, fingerprint: str, body: Dict[str, Any]) -> None:
+    """Remember the response for a key. If another worker stored it first, theirs wins."""
+    db.add(IdempotencyRecord(
+        user_id=user_id, route=route, key=key, request_hash=fingerprint,
+        response_json=json.dumps(body),
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+def purge_user_records(db: Session, user_id: int) -> None:
+    for rec in db.exec(select(IdempotencyRecord).where(IdempotencyRecord.user_id == user_id)).all():
+        db.delete(rec)
+
+class AsyncSingleFlight:
+    """
+    In-process request coalescing for coroutines: concurrent do() calls with
+    the same key share one execution of fn. The first caller runs it; the
+    others await the same result (or exception) without blocking the loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call)
+        call = self._calls[key] = asyncio.get_running_loop().create_future()
+        call.add_done_callback(lambda f: f.cancelled() or f.exception())  # no "never retrieved" warnings
+        try:
+            result = await fn()
+            call.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            del self._calls[key]
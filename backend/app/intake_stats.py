@@ -0,0 +1,40 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Session, select
+from .analysis_engine import TextStats, scan_text
+from .config import settings
+from .models import IntakeStats, SessionIntake
+import json
+
+def save_intake_stats(db: Session, session_id: int, stats: TextStats) -> None:
+    """Upsert the stored text statistics for an intake (caller commits)."""
+    row = db.exec(select(IntakeStats).where(IntakeStats.session_id == session_id)).first()
+    if not row:
+        row = IntakeStats(session_id=session_id, stats_json="")
+    row.stats_json = json.dumps(stats.to_dict(), separators=(",", ":"))
+    row.updated_at = datetime.utcnow()
+    db.add(row)
+
+def stored_intake_stats(db: Session, intake: SessionIntake) -> Optional[TextStats]:
+    """Stored statistics under the current scoring model, or None if missing or from another model version."""
+    row = db.exec(select(IntakeStats).where(IntakeStats.session_id == intake.id)).first()
+    if row:
+        stats = TextStats.from_dict(json.loads(row.stats_json))
+        if stats.model_version == settings.SCORING_MODEL_VERSION:
+            return stats
+    return None
+
+def load_intake_stats(db: Session, intake: SessionIntake) -> TextStats:
+    """
+    Stored statistics for an intake under the current scoring model. Intakes
+    without stats, or with stats from another model version's lexicon pack,
+    are scanned once and backfilled.
+    """
+    stats = stored_intake_stats(db, intake)
+    if stats is not None:
+        return stats
+    stats = scan_text(intake.free_text or "", settings.SCORING_MODEL_VERSION)
+    save_intake_stats(db, intake.id, stats)
+    db.commit()
+    return stats
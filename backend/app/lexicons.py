@@ -0,0 +1,118 @@
+from __future__ import annotations
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Versioned lexicon packs. A pack maps lexicon names to entries:
+#   "word"          exact (lowercase) word
+#   "stem*"         any word starting with "stem"
+#   "two words"     phrase: consecutive exact words
+# Packs are compiled once into a LexiconMatcher, so matching stays linear in
+# text length however large the word lists grow.
+
+DEFAULT_MODEL_VERSION = "v1"
+PACK_DIRS: List[str] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon_packs")]
+# Cache of per-word lookups (exact + stem), per matcher.
+WORD_CACHE_SIZE = 65536
+
+class LexiconPackError(ValueError):
+    pass
+
+def register_pack_dir(path: str) -> None:
+    """Search an extra directory for <version>.json packs (takes precedence)."""
+    if path and path not in PACK_DIRS:
+        PACK_DIRS.insert(0, path)
+        get_matcher.cache_clear()
+
+def load_pack(version: str) -> Dict[str, List[str]]:
+    for d in PACK_DIRS:
+        path = os.path.join(d, f"{version}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                pack = json.load(f)
+            if pack.get("version", version) != version:
+                raise LexiconPackError(f"{path} declares version {pack.get('version')!r}, expected {version!r}")
+            return pack["lexicons"]
+    raise LexiconPackError(f"No lexicon pack for scoring model version {version!r}")
+
+class _Node:
+    __slots__ = ("children", "lexicons")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.lexicons: Tuple[str, ...] = ()
+
+def _insert(root: _Node, path: Iterable[str], lexicon: str) -> None:
+    node = root
+    for step in path:
+        node = node.children.setdefault(step, _Node())
+    if lexicon not in node.lexicons:
+        node.lexicons += (lexicon,)
+
+class LexiconMatcher:
+    """
+    Compiled form of a pack:
+      - exact words: one dict lookup
+      - stems: character trie, walked once per distinct word (O(word length))
+      - phrases: trie over reversed word sequences, walked back from each
+        token through at most max_phrase_len - 1 previous tokens
+    Per-word results are memoized, so the common case is a dict hit.
+    """
+
+    def __init__(self, version: str, lexicons: Dict[str, Sequence[str]]):
+        self.version = version
+        self.names: Tuple[str, ...] = tuple(lexicons)
+        self._exact: Dict[str, Tuple[str, ...]] = {}
+        self._stems = _Node()
+        self._phrases = _Node()
+        self.max_phrase_len = 1
+        for lexicon, entries in lexicons.items():
+            for raw in entries:
+                entry = " ".join(raw.lower().split())
+                if not entry:
+                    continue
+                if " " in entry:
+                    words = entry.split(" ")
+                    if any(w.endswith("*") for w in words):
+                        raise LexiconPackError(f"Stems are not supported inside phrases: {raw!r}")
+                    _insert(self._phrases, reversed(words), lexicon)
+                    self.max_phrase_len = max(self.max_phrase_len, len(words))
+                elif entry.endswith("*"):
+                    if len(entry) == 1:
+                        raise LexiconPackError("Bare '*' entry")
+                    _insert(self._stems, entry[:-1], lexicon)
+                elif lexicon not in self._exact.get(entry, ()):
+                    self._exact[entry] = self._exact.get(entry, ()) + (lexicon,)
+        self.has_phrases = self.max_phrase_len > 1
+        self.word_lexicons = lru_cache(maxsize=WORD_CACHE_SIZE)(self._word_lexicons)
+
+    def _word_lexicons(self, word: str) -> Tuple[str, ...]:
+        """Lexicons a single word belongs to (exact entries and matching stems)."""
+        found = self._exact.get(word, ())
+        node = self._stems
+        for ch in word:
+            node = node.children.get(ch)
+            if node is None:
+                break
+            for lex in node.lexicons:
+                if lex not in found:
+                    found += (lex,)
+        return found
+
+    def phrase_lexicons(self, history: Sequence[str], word: str) -> Tuple[str, ...]:
+        """Lexicons of phrases ending at `word`, given the preceding tokens."""
+        node = self._phrases.children.get(word)
+        found: Tuple[str, ...] = ()
+        i = len(history) - 1
+        while node is not None and i >= 0:
+            node = node.children.get(history[i])
+            if node is not None:
+                found += node.lexicons
+            i -= 1
+        return found
+
+@lru_cache(maxsize=None)
+def get_matcher(version: str = DEFAULT_MODEL_VERSION) -> LexiconMatcher:
+    """Compiled matcher for a scoring model version (compiled once per process)."""
+    return LexiconMatcher(version, load_pack(version))
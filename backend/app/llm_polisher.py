@@ -1,10 +1,18 @@
 from __future__ import annotations
-from typing import Dict, Any
-from openai import OpenAI
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from .config import settings
+import asyncio
+import hashlib
 import logging
 import json
 import copy
+import queue
+import re
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -17,100 +25,269 @@ SYSTEM_INSTRUCTIONS = (
     "Return ONLY valid JSON with keys: hypotheses (array of strings), suggestions (array of strings)."
 )
 
+BATCH_INSTRUCTIONS = (
+    "You receive several independent narratives under \"items\", each with an \"id\". "
+    "Polish each one separately and return ONLY valid JSON: "
+    "{\"items\": [{\"id\": ..., \"hypotheses\": [...], \"suggestions\": [...]}]}, one entry per input id."
+)
+
+CONSTRAINTS = [
+    "Do not change any numbers or scores",
+    "Do not diagnose or claim medical conditions",
+    "Keep output concise and executive",
+    "Use cautious, non-absolute language",
+    "Return JSON with keys: hypotheses, suggestions"
+]
+
 def validate_scores_unchanged(original: Dict[str, Any], polished: Dict[str, Any]) -> bool:
     """Ensure scores are identical between original and polished versions."""
     original_scores = original.get("scores", {})
     polished_scores = polished.get("scores", {})
     return original_scores == polished_scores
 
-def polish_narrative(payload: Dict[str, Any]) -> Dict[str, Any]:
+def polish_input(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Polish narrative sections using LLM while keeping deterministic scores immutable.
-    Falls back gracefully on any error.
+    The LLM input for a report. Explainability is passed as feature names and
+    notes only: the per-report values are not needed to reword fixed templates,
+    and leaving them out makes inputs repeat across reports (see PolishMemo).
+    """
+    narrative = payload.get("narrative", {})
+    return {
+        "original_hypotheses": narrative.get("hypotheses", []),
+        "original_suggestions": narrative.get("suggestions", []),
+        "explainability_context": [
+            {"feature": e.get("feature"), "note": e.get("note")} for e in narrative.get("explainability", [])
+        ],
+        "constraints": CONSTRAINTS,
+    }
+
+def memo_key(user_input: Dict[str, Any], model: str) -> str:
+    raw = json.dumps({"model": model, "instructions": SYSTEM_INSTRUCTIONS, "input": user_input}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _parse_json(out_text: str) -> Optional[Any]:
+    if out_text.strip().startswith("{"):
+        return json.loads(out_text)
+    # Try to find JSON in markdown code blocks
+    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', out_text, re.DOTALL)
+    if json_match:
+        return json.loads(json_match.group(1))
+    return None
+
+def _polished_sections(polished: Any) -> Optional[Dict[str, List[str]]]:
+    """Keep only well-formed hypotheses/suggestions from one model output."""
+    if not isinstance(polished, dict):
+        return None
+    out = {k: polished[k] for k in ("hypotheses", "suggestions")
+           if isinstance(polished.get(k), list) and all(isinstance(x, str) for x in polished[k])}
+    return out or None
+
+def openai_send(inputs: List[Dict[str, Any]]) -> List[Optional[Dict[str, List[str]]]]:
+    """One Responses API call for a batch of polish inputs; one result (or None) per input."""
+    # Imported lazily: the SDK is heavy and never needed when polishing is off.
+    from openai import OpenAI
+    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    if len(inputs) == 1:
+        instructions, body = SYSTEM_INSTRUCTIONS, inputs[0]
+    else:
+        instructions = SYSTEM_INSTRUCTIONS + " " + BATCH_INSTRUCTIONS
+        body = {"items": [{"id": i, **item} for i, item in enumerate(inputs)]}
+
+    # Use Responses API (Manus-compatible OpenAI endpoint)
+    resp = client.responses.create(
+        model=settings.OPENAI_MODEL,
+        instructions=instructions,
+        input=[
+            {"role": "user", "content": "Polish this narrative. Return ONLY JSON."},
+            {"role": "user", "content": json.dumps(body)},
+        ],
+        text={"verbosity": "low"},
+    )
+    parsed = _parse_json(getattr(resp, "output_text", None) or "")
+    if len(inputs) == 1:
+        return [_polished_sections(parsed)]
+    results: List[Optional[Dict[str, List[str]]]] = [None] * len(inputs)
+    items = parsed.get("items") if isinstance(parsed, dict) else None
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("id"), int) and 0 <= item["id"] < len(inputs):
+            results[item["id"]] = _polished_sections(item)
+    return results
+
+class PolishBatcher:
+    """
+    Collects polish inputs for up to window seconds (or max_items) and sends
+    the distinct ones as one multi-item request. Identical inputs pending at
+    the same time share one Future.
     """
+
+    def __init__(self, send: Callable[[List[Dict[str, Any]]], List[Optional[Dict[str, List[str]]]]] = openai_send,
+                 window: float = 0.05, max_items: int = 16, error_window: float = 300.0):
+        self.send = send
+        self.window = window
+        self.max_items = max_items
+        self.error_window = error_window
+        self.calls = 0
+        self._outcomes: "deque[Tuple[float, bool]]" = deque()  # (time, failed) per call, last error_window seconds
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue()
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="polish-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, user_input: Dict[str, Any]) -> Future:
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = self._pending[key] = Future()
+                self._queue.put((key, user_input))
+            return fut
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self.calls += 1
+        failed = False
+        try:
+            results = self.send([user_input for _, user_input in batch])
+        except Exception as e:
+            logger.error(f"LLM polish error: {e}")
+            results = []
+            failed = True
+        self._record(failed)
+        results = list(results)[:len(batch)] + [None] * (len(batch) - len(results))
+        with self._lock:
+            futures = [self._pending.pop(key) for key, _ in batch]
+        for fut, result in zip(futures, results):
+            fut.set_result(result)
+
+    def _record(self, failed: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - self.error_window:
+                self._outcomes.popleft()
+
+    def error_rate(self, min_calls: int = 5) -> float:
+        """Share of failed LLM calls in the last error_window seconds (0 below min_calls calls)."""
+        with self._lock:
+            horizon = time.monotonic() - self.error_window
+            recent = [failed for t, failed in self._outcomes if t >= horizon]
+        return sum(recent) / len(recent) if len(recent) >= min_calls else 0.0
+
+_batcher: Optional[PolishBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_batcher() -> PolishBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = PolishBatcher(window=settings.POLISH_BATCH_WINDOW_MS / 1000.0, max_items=settings.POLISH_BATCH_MAX_ITEMS)
+    return _batcher
+
+def llm_error_rate() -> float:
+    """Recent LLM call failure rate of this process (0 if polishing has not run)."""
+    return _batcher.error_rate() if _batcher is not None else 0.0
+
+def _memo_get(db, key: str) -> Optional[Dict[str, List[str]]]:
+    from sqlmodel import select
+    from .models import PolishMemo
+    row = db.exec(select(PolishMemo).where(PolishMemo.key == key)).first()
+    return json.loads(row.output_json) if row else None
+
+def _memo_put(db, key: str, output: Dict[str, List[str]]) -> None:
+    """
+    Add the memo to the caller's transaction (committed with the report).
+    INSERT ... ON CONFLICT (key) DO NOTHING: concurrent analyses of the same
+    input share one batcher result and all try to memoize it; the losers
+    must not fail, or roll back, the session they were handed.
+    """
+    from .models import PolishMemo
+    values = {"key": key, "model": settings.OPENAI_MODEL, "output_json": json.dumps(output), "created_at": datetime.utcnow()}
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:  # pragma: no cover - no upsert; a savepoint confines a duplicate key to the memo
+        from sqlalchemy.exc import IntegrityError
+        try:
+            with db.begin_nested():
+                db.add(PolishMemo(**values))
+        except IntegrityError:
+            pass
+        return
+    db.execute(insert(PolishMemo).values(**values).on_conflict_do_nothing(index_elements=["key"]))
+
+def _polish_enabled() -> bool:
     if not settings.OPENAI_POLISH_ENABLED:
         logger.debug("LLM polish disabled")
-        return payload
-
+        return False
     if not settings.OPENAI_API_KEY:
         logger.warning("LLM polish enabled but no API key configured")
+        return False
+    return True
+
+def _apply_polished(payload: Dict[str, Any], original_payload: Dict[str, Any], polished: Optional[Dict[str, List[str]]]) -> bool:
+    """Apply polished sections to payload; False (payload unusable) if the output is invalid."""
+    if not polished:
+        logger.warning("LLM response not usable, falling back")
+        return False
+
+    narrative = payload.get("narrative", {})
+    # Validate and apply only allowed changes
+    if "hypotheses" in polished:
+        narrative["hypotheses"] = polished["hypotheses"]
+    if "suggestions" in polished:
+        narrative["suggestions"] = polished["suggestions"]
+    payload["narrative"] = narrative
+
+    # Final validation: scores must be unchanged
+    if not validate_scores_unchanged(original_payload, payload):
+        logger.error("Scores changed during polish! Reverting to original")
+        return False
+    return True
+
+async def polish_narrative_async(payload: Dict[str, Any], db) -> Dict[str, Any]:
+    """
+    Polish narrative sections using LLM while keeping deterministic scores immutable.
+    db is an AsyncSession: identical inputs are served from the PolishMemo
+    table; misses go through the shared micro-batcher, which is awaited, not
+    blocked on. The memo is written in db's transaction and never committed
+    here. Falls back gracefully on any error.
+    """
+    if not _polish_enabled():
         return payload
 
-    # Deep copy to preserve original
     original_payload = copy.deepcopy(payload)
-    
+
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-        scores = payload.get("scores", {})
-        narrative = payload.get("narrative", {})
-        explainability = narrative.get("explainability", [])
-        hypotheses = narrative.get("hypotheses", [])
-        suggestions = narrative.get("suggestions", [])
-
-        user_input = {
-            "original_hypotheses": hypotheses,
-            "original_suggestions": suggestions,
-            "explainability_context": explainability,
-            "constraints": [
-                "Do not change any numbers or scores",
-                "Do not diagnose or claim medical conditions",
-                "Keep output concise and executive",
-                "Use cautious, non-absolute language",
-                "Return JSON with keys: hypotheses, suggestions"
-            ]
-        }
-
-        # Use Responses API (Manus-compatible OpenAI endpoint)
-        resp = client.responses.create(
-            model=settings.OPENAI_MODEL,
-            instructions=SYSTEM_INSTRUCTIONS,
-            input=[
-                {"role": "user", "content": "Polish this narrative. Return ONLY JSON."},
-                {"role": "user", "content": json.dumps(user_input)},
-            ],
-            text={"verbosity": "low"},
-        )
-
-        # Parse response
-        out_text = getattr(resp, "output_text", None) or ""
-        
-        # Try to extract JSON from response
-        polished = None
-        if out_text.strip().startswith("{"):
-            polished = json.loads(out_text)
-        else:
-            # Try to find JSON in markdown code blocks
-            import re
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', out_text, re.DOTALL)
-            if json_match:
-                polished = json.loads(json_match.group(1))
-        
-        if not isinstance(polished, dict):
-            logger.warning("LLM response not a dict, falling back")
-            return original_payload
-        
-        # Validate and apply only allowed changes
-        if isinstance(polished.get("hypotheses"), list):
-            narrative["hypotheses"] = polished["hypotheses"]
-            logger.info("Polished hypotheses applied")
-        
-        if isinstance(polished.get("suggestions"), list):
-            narrative["suggestions"] = polished["suggestions"]
-            logger.info("Polished suggestions applied")
-        
-        payload["narrative"] = narrative
-        
-        # Final validation: scores must be unchanged
-        if not validate_scores_unchanged(original_payload, payload):
-            logger.error("Scores changed during polish! Reverting to original")
+        user_input = polish_input(payload)
+        key = memo_key(user_input, settings.OPENAI_MODEL)
+        polished = await db.run_sync(_memo_get, key)
+        memoized = polished is not None
+        if not memoized:
+            fut = asyncio.wrap_future(get_batcher().submit(key, user_input))
+            polished = await asyncio.wait_for(asyncio.shield(fut), settings.POLISH_TIMEOUT_SECONDS)
+        if not _apply_polished(payload, original_payload, polished):
             return original_payload
-        
+        if not memoized:
+            await db.run_sync(_memo_put, key, polished)
+        logger.info("Polished narrative applied" + (" (memoized)" if memoized else ""))
         return payload
-        
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error in LLM polish: {e}")
-        return original_payload
+
     except Exception as e:
         logger.error(f"LLM polish error: {e}")
         return original_payload
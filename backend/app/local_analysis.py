@@ -0,0 +1,199 @@
+from __future__ import annotations
+import csv
+import json
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, IO, Iterable, Iterator, List, Optional
+from .analysis_engine import TRAIT_KEYS, analyze
+
+# Offline batch scoring (`atlasctl analyze-local`): records are streamed from
+# NDJSON or CSV, scored in chunks on worker processes and written in input
+# order as chunks complete, so memory is bounded by the number of chunks in
+# flight. Only the analysis engine is used: no database, no network.
+
+INPUT_FORMATS = ("ndjson", "csv")
+OUTPUT_FORMATS = ("ndjson", "parquet")
+CHUNK_SIZE = 256
+
+TRAIT_COLUMNS = [f"{group}_{name}" for group, name in TRAIT_KEYS]
+TEXT_FIELDS = ("text", "free_text")
+
+def detect_format(path: Optional[str], formats: tuple, default: str) -> str:
+    """Format from a file extension (.jsonl counts as ndjson), else default."""
+    if path and path != "-":
+        ext = path.rsplit(".", 1)[-1].lower()
+        if ext == "jsonl":
+            ext = "ndjson"
+        if ext in formats:
+            return ext
+    return default
+
+def _record(n: int, obj: Dict[str, Any]) -> Dict[str, Any]:
+    text = next((obj[k] for k in TEXT_FIELDS if obj.get(k) is not None), "")
+    return {"id": obj.get("id", n), "text": text, "survey": obj.get("survey") or {}}
+
+def iter_ndjson(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    """{"id"?, "text" | "free_text", "survey"?} per line; id defaults to the record number."""
+    n = 0
+    for line in f:
+        if not line.strip():
+            continue
+        n += 1
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"id": n, "error": f"Invalid JSON: {e}"}
+            continue
+        if not isinstance(obj, dict):
+            yield {"id": n, "error": "Expected a JSON object"}
+            continue
+        yield _record(n, obj)
+
+def iter_csv(f: IO[str]) -> Iterator[Dict[str, Any]]:
+    """
+    CSV with a header row: id (optional), text or free_text, and either a
+    survey column holding a JSON object or one column per survey item.
+    Empty cells are left out of the survey.
+    """
+    csv.field_size_limit(sys.maxsize)
+    for n, row in enumerate(csv.DictReader(f), start=1):
+        survey: Dict[str, Any] = {}
+        try:
+            if row.get("survey"):
+                survey.update(json.loads(row["survey"]))
+        except json.JSONDecodeError as e:
+            yield {"id": row.get("id") or n, "error": f"Invalid survey JSON: {e}"}
+            continue
+        for k, v in row.items():
+            if k and k not in ("id", "survey", *TEXT_FIELDS) and v not in (None, ""):
+                survey[k] = v
+        yield _record(n, {"id": row.get("id") or n, "text": row.get("text") or row.get("free_text") or "", "survey": survey})
+
+def iter_records(f: IO[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    if fmt not in INPUT_FORMATS:
+        raise ValueError(f"Unknown input format: {fmt}")
+    return iter_ndjson(f) if fmt == "ndjson" else iter_csv(f)
+
+def analyze_records(records: List[Dict[str, Any]], model_version: str) -> List[Dict[str, Any]]:
+    """Worker task: score one chunk; a failing record yields an error row, not a failed chunk."""
+    out = []
+    for rec in records:
+        if "error" in rec:
+            out.append(rec)
+            continue
+        try:
+            out.append({"id": rec["id"], **analyze(rec["text"], rec["survey"], model_version)})
+        except Exception as e:
+            out.append({"id": rec["id"], "error": f"{type(e).__name__}: {e}"})
+    return out
+
+class NdjsonWriter:
+    """One JSON object per result: the full analysis, or {"id", "error"}."""
+
+    def __init__(self, f: IO[bytes]):
+        self.f = f
+        try:
+            import orjson
+            self._dumps = orjson.dumps
+        except ImportError:  # pragma: no cover
+            self._dumps = lambda row: json.dumps(row, separators=(",", ":")).encode("utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self.f.write(b"".join(self._dumps(row) + b"\n" for row in rows))
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.flush()
+
+class ParquetWriter:
+    """One row per result with a column per trait (as in report exports); one row group per chunk."""
+
+    def __init__(self, f: IO[bytes]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires the 'pyarrow' package") from e
+        self._pa = pa
+        self.schema = pa.schema(
+            [("id", pa.string()), ("model_version", pa.string()), ("error", pa.string())]
+            + [(c, pa.float64()) for c in TRAIT_COLUMNS]
+        )
+        self._writer = pq.ParquetWriter(pa.PythonFile(f, mode="w"), self.schema, compression="zstd")
+
+    @staticmethod
+    def flatten(row: Dict[str, Any]) -> Dict[str, Any]:
+        scores = row.get("scores", {})
+        flat = {"id": str(row["id"]), "model_version": row.get("model_version"), "error": row.get("error")}
+        for (group, name), column in zip(TRAIT_KEYS, TRAIT_COLUMNS):
+            flat[column] = scores.get(group, {}).get(name)
+        return flat
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.write_table(self._pa.Table.from_pylist([self.flatten(r) for r in rows], schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+def open_writer(f: IO[bytes], fmt: str):
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    return NdjsonWriter(f) if fmt == "ndjson" else ParquetWriter(f)
+
+def _chunks(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_local(
+    records: Iterable[Dict[str, Any]],
+    writer,
+    executor,
+    model_version: str,
+    chunk_size: int = CHUNK_SIZE,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    progress_interval: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Score records on executor (an AnalysisExecutor) chunk by chunk and hand
+    results to writer in input order. At most the executor's capacity in
+    chunks is in flight; reading pauses until the oldest chunk is written.
+    Returns throughput stats.
+    """
+    window = executor.workers + executor.queue_size
+    pending: Deque = deque()
+    stats = {"records": 0, "errors": 0, "text_chars": 0, "seconds": 0.0, "records_per_second": 0.0}
+    started = time.monotonic()
+    last_report = started
+
+    def drain_one() -> None:
+        nonlocal last_report
+        rows = pending.popleft().result()
+        writer.write(rows)
+        stats["records"] += len(rows)
+        stats["errors"] += sum(1 for r in rows if "error" in r)
+        now = time.monotonic()
+        stats["seconds"] = round(now - started, 3)
+        stats["records_per_second"] = round(stats["records"] / max(now - started, 1e-9), 1)
+        if progress and now - last_report >= progress_interval:
+            last_report = now
+            progress(dict(stats))
+
+    for chunk in _chunks(records, chunk_size):
+        stats["text_chars"] += sum(len(r.get("text") or "") for r in chunk)
+        while len(pending) >= window:
+            drain_one()
+        pending.append(executor.submit(analyze_records, chunk, model_version))
+    while pending:
+        drain_one()
+    writer.close()
+    elapsed = time.monotonic() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["records_per_second"] = round(stats["records"] / max(elapsed, 1e-9), 1)
+    return stats
@@ -1,20 +1,37 @@
 from __future__ import annotations
-from fastapi import FastAPI, Depends, HTTPException, Header, Request
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from typing import Optional, Dict, Any
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional, Dict, Any, Tuple
 import json
 import logging
+import time
+from datetime import datetime, timedelta
 from .config import settings
-from .db import init_db, get_session
-from .models import User, SessionIntake, Report, Subscription
-from .schemas import RegisterIn, LoginIn, TokenOut, IntakeIn, IntakeOut, ReportOut, MeOut
+from .db import init_db, get_session, get_async_session, engine, async_engine
+from .models import User, SessionIntake, Report, ReportVector, Subscription, IntakeStats
+from .schemas import RegisterIn, LoginIn, TokenOut, IntakeIn, IntakePatchIn, IntakeOut, ReportOut, MeOut, TrendsOut
 from .security import hash_password, verify_password, create_access_token, decode_token
-from .analysis_engine import analyze
-from .llm_polisher import polish_narrative
+from .analysis_engine import analyze_stats, scan_text
+from .intake_stats import save_intake_stats, load_intake_stats, stored_intake_stats
+from .llm_polisher import polish_narrative_async
 from .stripe_pay import stripe_configured, create_checkout_session
 from .stripe_webhook import verify_webhook_signature, process_webhook_event
-from .middleware import RequestIDMiddleware, RateLimitMiddleware, LoggingMiddleware
+from .percentiles import percentile_index
+from .readiness import check_readiness, loop_monitor, metrics_text
+from .retention import Archiver, iter_archived, restore_user, purge_user_archive, retention_days
+from .similarity import vector_index, vector_key, save_report_vector, purge_user_vectors, unpack_vector, vector_scores
+from .trends import update_trends, get_trends, purge_user_trends
+from .idempotency import AsyncSingleFlight, request_fingerprint, find_response, store_response, purge_user_records
+from .cache import get_cache, start_cache_listener, subscription_key, versioned_key
+from .admission import get_admission, plan_tier, AdmissionRejected, AdmissionTimeout
+from .executor import get_executor, shutdown_executor, AnalysisBusy, AnalysisTimeout
+from .export import iter_export, check_format, ExportUnavailable, MEDIA_TYPES
+from .responses import DefaultJSONResponse, RawJSONResponse, json_response, report_list_bytes
+from .middleware import RequestIDMiddleware, RateLimitMiddleware, LoggingMiddleware, BodySizeLimitMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -23,12 +40,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Insight Atlas API", version="0.2.0")
+app = FastAPI(title="Insight Atlas API", version="0.2.0", default_response_class=DefaultJSONResponse)
 
 # Middleware stack (order matters)
 app.add_middleware(RequestIDMiddleware)
 app.add_middleware(LoggingMiddleware)
 app.add_middleware(RateLimitMiddleware, rpm=settings.RATE_LIMIT_RPM)
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.MAX_REQUEST_BYTES)
 
 origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
 app.add_middleware(
@@ -39,17 +57,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_archiver = Archiver(engine, settings.ARCHIVE_INTERVAL_SECONDS)
+
 @app.on_event("startup")
 def _startup():
     init_db()
+    get_executor()  # start (and warm) analysis workers before taking traffic
+    start_cache_listener()
+    get_cache().subscribe(vector_index.on_invalidate)
+    with Session(engine) as db:
+        percentile_index.load(db)
+        vector_index.load(db)
+    _archiver.start()
     logger.info("Insight Atlas API started")
 
+@app.on_event("startup")
+async def _start_loop_monitor():
+    loop_monitor.start()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    _archiver.stop()
+    await loop_monitor.stop()
+    shutdown_executor()
+    with Session(engine) as db:
+        percentile_index.flush(db)
+    await async_engine.dispose()
+
 # Health and version endpoints
 @app.get("/healthz")
 def healthz():
     """Health check endpoint for load balancers."""
     return {"status": "ok"}
 
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness for load balancers: 503 while the instance is saturated (see
+    app/readiness.py). Served on the event loop, so a full threadpool does
+    not delay the probe.
+    """
+    body = check_readiness()
+    return json_response(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Saturation signals as Prometheus gauges, for autoscaling."""
+    return PlainTextResponse(metrics_text())
+
 @app.get("/version")
 def version():
     """Version endpoint."""
@@ -76,14 +131,110 @@ def _ensure_subscription_row(db: Session, user: User) -> Subscription:
         db.refresh(sub)
     return sub
 
-def _require_pro(db: Session, user: User) -> Subscription:
-    sub = _ensure_subscription_row(db, user)
+def _run_analysis(fn, *args):
+    """
+    Run CPU-bound engine work on the analysis executor, mapping overload to
+    HTTP errors. Its latency (executor queue + compute) feeds the admission SLO.
+    """
+    started = time.monotonic()
+    try:
+        result = get_executor().run(fn, *args)
+    except AnalysisBusy:
+        raise HTTPException(status_code=503, detail="Analysis capacity exhausted, retry shortly")
+    except AnalysisTimeout:
+        get_admission().observe(time.monotonic() - started)
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+    get_admission().observe(time.monotonic() - started)
+    return result
+
+async def _run_analysis_async(fn, *args):
+    """_run_analysis for async routes: awaits the executor instead of blocking a thread."""
+    started = time.monotonic()
+    try:
+        result = await get_executor().run_async(fn, *args)
+    except AnalysisBusy:
+        raise HTTPException(status_code=503, detail="Analysis capacity exhausted, retry shortly")
+    except AnalysisTimeout:
+        get_admission().observe(time.monotonic() - started)
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+    get_admission().observe(time.monotonic() - started)
+    return result
+
+async def _admitted(state: Dict[str, str], fn):
+    """Await fn() holding an admission slot for the user's plan tier, mapping shedding to 503."""
+    try:
+        async with get_admission().aslot(plan_tier(state)):
+            return await fn()
+    except (AdmissionRejected, AdmissionTimeout) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+_single_flight = AsyncSingleFlight()
+
+async def _idempotent(db: AsyncSession, user: User, route: str, key: str, request: Dict[str, Any], fn) -> Dict[str, Any]:
+    """Replay the stored response for an Idempotency-Key, or await fn() once and store its response."""
+    fingerprint = request_fingerprint(route, request)
+    cached = await db.run_sync(find_response, user.id, route, key, fingerprint)
+    if cached is not None:
+        return cached
+
+    async def run_and_store() -> Dict[str, Any]:
+        # Re-check inside the flight: a concurrent retry may have just finished.
+        again = await db.run_sync(find_response, user.id, route, key, fingerprint)
+        if again is not None:
+            return again
+        body = await fn()
+        await db.run_sync(store_response, user.id, route, key, fingerprint, body)
+        return body
+
+    return await _single_flight.do(("idempotency", user.id, route, key), run_and_store)
+
+def _require_admin(user: User) -> None:
+    admins = {e.strip().lower() for e in settings.ADMIN_EMAILS.split(",") if e.strip()}
+    if user.email.lower() not in admins:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+def _cached_subscription_state(cache, user_id: int) -> Tuple[str, Optional[Dict[str, str]]]:
+    """(versioned cache key, cached plan/status or None) for a user."""
+    key = versioned_key(cache, subscription_key(user_id))
+    return key, cache.get(key)
+
+def _subscription_state(db: Session, user: User) -> Dict[str, str]:
+    """Plan/status for a user via the principal cache; Stripe webhooks invalidate it on change."""
+    cache = get_cache()
+    key, state = _cached_subscription_state(cache, user.id)
+    if state is None:
+        sub = _ensure_subscription_row(db, user)
+        state = {"plan": sub.plan, "status": sub.status}
+        cache.set(key, state, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    return state
+
+async def _subscription_state_async(db: AsyncSession, user: User) -> Dict[str, str]:
+    """
+    _subscription_state for async routes. run_sync executes on the event loop
+    thread, so only the database read goes through it; the sqlite/redis cache
+    round trips run in the threadpool.
+    """
+    cache = get_cache()
+    key, state = await run_in_threadpool(_cached_subscription_state, cache, user.id)
+    if state is None:
+        sub = await db.run_sync(_ensure_subscription_row, user)
+        state = {"plan": sub.plan, "status": sub.status}
+        await run_in_threadpool(cache.set, key, state, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+    return state
+
+def _check_pro(state: Dict[str, str]) -> Dict[str, str]:
     if settings.DEMO_MODE:
-        return sub
-    if sub.plan.startswith("pro") and sub.status == "active":
-        return sub
+        return state
+    if state["plan"].startswith("pro") and state["status"] == "active":
+        return state
     raise HTTPException(status_code=402, detail="Upgrade required")
 
+def _require_pro(db: Session, user: User) -> Dict[str, str]:
+    return _check_pro(_subscription_state(db, user))
+
+async def _require_pro_async(db: AsyncSession, user: User) -> Dict[str, str]:
+    return _check_pro(await _subscription_state_async(db, user))
+
 @app.post("/auth/register", response_model=TokenOut)
 def register(payload: RegisterIn, db: Session = Depends(get_session)):
     existing = db.exec(select(User).where(User.email == payload.email)).first()
@@ -107,47 +258,179 @@ def login(payload: LoginIn, db: Session = Depends(get_session)):
     return TokenOut(access_token=token)
 
 @app.get("/me", response_model=MeOut)
-def me(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+async def me(authorization: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_async_session)):
+    user = await db.run_sync(_get_user_from_token, authorization)
+    state = await _subscription_state_async(db, user)
+    return MeOut(email=user.email, plan=state["plan"], status=state["status"])
+
+@app.get("/me/trends", response_model=TrendsOut)
+def my_trends(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Trait trends over time, served from the per-user aggregate row."""
     user = _get_user_from_token(db, authorization)
-    sub = _ensure_subscription_row(db, user)
-    return MeOut(email=user.email, plan=sub.plan, status=sub.status)
+    return get_trends(db, user.id)
+
+@app.get("/stats/percentiles")
+def stats_percentiles(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Population quantiles (p10/p25/p50/p75/p90) for every trait."""
+    _get_user_from_token(db, authorization)
+    return percentile_index.summary()
 
 @app.post("/intake", response_model=IntakeOut)
-def create_intake(payload: IntakeIn, authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
-    user = _get_user_from_token(db, authorization)
+async def create_intake(payload: IntakeIn, authorization: Optional[str] = Header(default=None), idempotency_key: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_async_session)):
+    user = await db.run_sync(_get_user_from_token, authorization)
     if not payload.consent:
         raise HTTPException(status_code=400, detail="Consent required")
-    _require_pro(db, user)
-    s = SessionIntake(user_id=user.id, consent=True, survey_json=json.dumps(payload.survey), free_text=payload.free_text)
-    db.add(s)
-    db.commit()
-    db.refresh(s)
-    return IntakeOut(session_id=s.id)
+    await _require_pro_async(db, user)
 
-@app.post("/analyze/{session_id}", response_model=ReportOut)
-def analyze_session(session_id: int, authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    async def create() -> Dict[str, Any]:
+        # Scan first: if the executor sheds or times out (503/504) nothing is
+        # stored, so the client's retry does not leave a duplicate intake.
+        stats = await _run_analysis_async(scan_text, payload.free_text, settings.SCORING_MODEL_VERSION)
+        s = SessionIntake(user_id=user.id, consent=True, survey_json=json.dumps(payload.survey), free_text=payload.free_text)
+        db.add(s)
+        await db.flush()
+        await db.run_sync(save_intake_stats, s.id, stats)
+        await db.commit()  # intake and its stats land together
+        return IntakeOut(session_id=s.id).model_dump()
+
+    if not idempotency_key:
+        return await create()
+    return await _idempotent(db, user, "intake", idempotency_key, payload.model_dump(), create)
+
+@app.patch("/intake/{session_id}", response_model=IntakeOut)
+def update_intake(session_id: int, payload: IntakePatchIn, authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Edit an intake: merge survey answers and/or append text. Only the appended text is scanned."""
     user = _get_user_from_token(db, authorization)
     _require_pro(db, user)
     s = db.exec(select(SessionIntake).where(SessionIntake.id == session_id, SessionIntake.user_id == user.id)).first()
     if not s:
         raise HTTPException(status_code=404, detail="Session not found")
-    survey = json.loads(s.survey_json or "{}")
-    result = analyze(s.free_text or "", survey)
-    result = polish_narrative(result)
-    r = Report(user_id=user.id, session_id=s.id, result_json=json.dumps(result))
-    db.add(r)
+    if payload.survey is not None:
+        survey = json.loads(s.survey_json or "{}")
+        survey.update(payload.survey)
+        s.survey_json = json.dumps(survey)
+    if payload.append_text:
+        if len(s.free_text or "") + len(payload.append_text) > settings.MAX_FREE_TEXT_CHARS:
+            raise HTTPException(status_code=413, detail="Intake text too large")
+        stats = load_intake_stats(db, s)
+        s.free_text = (s.free_text or "") + payload.append_text
+        save_intake_stats(db, s.id, _run_analysis(stats.feed, payload.append_text))
+    db.add(s)
     db.commit()
-    db.refresh(r)
-    return ReportOut(report_id=r.id, session_id=s.id, result=result)
+    return IntakeOut(session_id=s.id)
+
+@app.post("/analyze/{session_id}", response_model=ReportOut)
+async def analyze_session(session_id: int, authorization: Optional[str] = Header(default=None), idempotency_key: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_async_session)):
+    user = await db.run_sync(_get_user_from_token, authorization)
+    state = await _require_pro_async(db, user)
+
+    async def analyze_and_store() -> Dict[str, Any]:
+        s = (await db.exec(select(SessionIntake).where(SessionIntake.id == session_id, SessionIntake.user_id == user.id))).first()
+        if not s:
+            raise HTTPException(status_code=404, detail="Session not found")
+        survey = json.loads(s.survey_json or "{}")
+        stats = await db.run_sync(stored_intake_stats, s)
+        if stats is None:
+            # Missing or from another model version: scan once on the executor and backfill.
+            stats = await _run_analysis_async(scan_text, s.free_text or "", settings.SCORING_MODEL_VERSION)
+            await db.run_sync(save_intake_stats, s.id, stats)
+        result = await _run_analysis_async(analyze_stats, stats, survey)
+        result = await polish_narrative_async(result, db)
+        result["percentiles"] = percentile_index.percentiles(result["scores"])
+        r = Report(user_id=user.id, session_id=s.id, result_json=json.dumps(result))
+        db.add(r)
+        await db.run_sync(update_trends, user.id, result["scores"], r.created_at)
+        await db.flush()
+        vec = await db.run_sync(save_report_vector, r, result["scores"])
+        await db.commit()
+        await db.refresh(r)
+        # Only committed reports count toward the population.
+        percentile_index.record(result["scores"])
+        vector_index.add(r.id, user.id, vec)
+        await db.run_sync(percentile_index.maybe_flush)
+        return ReportOut(report_id=r.id, session_id=s.id, result=result).model_dump()
+
+    # Analysis and polish run under a plan-tier admission slot.
+    run = lambda: _admitted(state, analyze_and_store)
+
+    # Concurrent analyses of the same session (double clicks, client retries)
+    # share one run and one Report row.
+    coalesced = lambda: _single_flight.do(("analyze", user.id, session_id), run)
+    if not idempotency_key:
+        return json_response(await coalesced())
+    return json_response(await _idempotent(db, user, "analyze", idempotency_key, {"session_id": session_id}, coalesced))
 
 @app.get("/reports", response_model=list[ReportOut])
-def list_reports(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+async def list_reports(authorization: Optional[str] = Header(default=None), db: AsyncSession = Depends(get_async_session)):
+    user = await db.run_sync(_get_user_from_token, authorization)
+    rows = (await db.exec(
+        select(Report.id, Report.session_id, Report.result_json)
+        .where(Report.user_id == user.id)
+        .order_by(Report.created_at.desc())
+    )).all()
+    # Stored result_json is spliced into the body as-is; no decode/re-encode.
+    return RawJSONResponse(report_list_bytes(rows))
+
+@app.get("/reports/archived", response_model=list[ReportOut])
+def list_archived_reports(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Reports moved out of the hot tables by the retention archiver, newest first."""
     user = _get_user_from_token(db, authorization)
-    rows = db.exec(select(Report).where(Report.user_id == user.id).order_by(Report.created_at.desc())).all()
-    out = []
-    for r in rows:
-        out.append(ReportOut(report_id=r.id, session_id=r.session_id, result=json.loads(r.result_json)))
-    return out
+    rows = sorted(iter_archived(user.id, "reports"), key=lambda r: r["created_at"], reverse=True)
+    return RawJSONResponse(report_list_bytes([(r["id"], r["session_id"], r["result_json"]) for r in rows]))
+
+@app.get("/reports/{report_id}/similar")
+def similar_reports(report_id: int, k: int = Query(default=10, ge=1, le=50), authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """The report's archetype and the k most similar profiles of other users (anonymized: scores only)."""
+    user = _get_user_from_token(db, authorization)
+    row = db.exec(select(ReportVector).where(ReportVector.report_id == report_id, ReportVector.user_id == user.id)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Report not found")
+    vector_index.maybe_refresh(db)
+    vec = unpack_vector(row.vector).tolist()
+    return {
+        "report_id": report_id,
+        "archetype": vector_index.archetype(vec),
+        "neighbors": [
+            {"distance": round(d, 2), "scores": vector_scores(v)}
+            for _, d, v in vector_index.knn(vec, k, exclude_user=user.id)
+        ],
+    }
+
+@app.get("/admin/stats")
+def admin_stats(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Analysis executor and admission queue metrics (admins only)."""
+    user = _get_user_from_token(db, authorization)
+    _require_admin(user)
+    return {"executor": get_executor().stats(), "admission": get_admission().stats()}
+
+def _export_response(db: Session, fmt: str, user_id: Optional[int], filename: str) -> StreamingResponse:
+    try:
+        check_format(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    # The request session is closed once the route returns; the stream gets
+    # its own session on the same engine and closes it when done.
+    stream_db = Session(db.get_bind())
+    return StreamingResponse(
+        iter_export(stream_db, fmt, user_id),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+@app.get("/reports/export")
+def export_reports(format: str = Query(default="csv"), authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Stream the user's reports as CSV, NDJSON or Parquet, one column per trait."""
+    user = _get_user_from_token(db, authorization)
+    return _export_response(db, format, user.id, "reports")
+
+@app.get("/admin/reports/export")
+def admin_export_reports(format: str = Query(default="csv"), authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Stream every user's reports for warehouse loads (admins only)."""
+    user = _get_user_from_token(db, authorization)
+    _require_admin(user)
+    return _export_response(db, format, None, "reports-all")
 
 @app.delete("/data/purge")
 def purge_my_data(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
@@ -158,11 +441,29 @@ def purge_my_data(authorization: Optional[str] = Header(default=None), db: Sessi
         db.delete(r)
     intakes = db.exec(select(SessionIntake).where(SessionIntake.user_id == user.id)).all()
     for s in intakes:
+        stats = db.exec(select(IntakeStats).where(IntakeStats.session_id == s.id)).first()
+        if stats:
+            db.delete(stats)
         db.delete(s)
+    purge_user_records(db, user.id)
+    purge_user_trends(db, user.id)
+    purge_user_vectors(db, user.id)
     db.commit()
+    purge_user_archive(user.id)
+    get_cache().invalidate(vector_key(user.id))  # drops the vectors from every worker's index
     logger.info(f"Data purged for user {user.email}")
     return {"ok": True}
 
+@app.post("/data/restore")
+def restore_my_data(authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
+    """Bring archived intakes/reports that are inside the plan's retention window back into the hot tables (e.g. after an upgrade)."""
+    user = _get_user_from_token(db, authorization)
+    days = retention_days(_subscription_state(db, user))
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    restored = restore_user(db, user.id, since)
+    logger.info(f"Restored {restored} for user {user.email}")
+    return {"restored": restored}
+
 @app.post("/billing/checkout")
 def billing_checkout(plan: str, authorization: Optional[str] = Header(default=None), db: Session = Depends(get_session)):
     user = _get_user_from_token(db, authorization)
@@ -173,6 +474,7 @@ def billing_checkout(plan: str, authorization: Optional[str] = Header(default=No
         sub.status = "active"
         db.add(sub)
         db.commit()
+        get_cache().invalidate(subscription_key(user.id))
         logger.info(f"Demo upgrade for {user.email} to {sub.plan}")
         return {"mode": "demo", "upgraded": True, "plan": sub.plan}
 
@@ -196,7 +498,7 @@ def billing_checkout(plan: str, authorization: Optional[str] = Header(default=No
     return {"url": url}
 
 @app.post("/stripe/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_session)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_async_session)):
     """Handle Stripe webhook events with signature verification and idempotency."""
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
@@ -207,7 +509,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_session)):
     event = verify_webhook_signature(payload, sig_header)
     
     try:
-        process_webhook_event(db, event)
+        await db.run_sync(process_webhook_event, event)
         return {"received": True}
     except Exception as e:
         logger.error(f"Webhook processing error: {e}")
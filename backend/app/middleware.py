@@ -2,11 +2,13 @@ from __future__ import annotations
 import time
 import uuid
 import logging
-from fastapi import Request, HTTPException
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-from typing import Dict, Callable
-from collections import defaultdict
+from starlette.responses import Response, JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Dict, Callable, Optional
+from .cache import Cache, MemoryCache, get_cache
 from .config import settings
 
 logger = logging.getLogger(__name__)
@@ -23,32 +25,35 @@ class RequestIDMiddleware(BaseHTTPMiddleware):
         return response
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple in-memory rate limiting by IP address."""
+    """Fixed-window rate limiting by IP address, counted in the shared cache so all workers agree."""
     
-    def __init__(self, app, rpm: int = 60):
+    def __init__(self, app, rpm: int = 60, cache: Optional[Cache] = None):
         super().__init__(app)
         self.rpm = rpm
-        self.requests: Dict[str, list] = defaultdict(list)
+        self._cache = cache
+    
+    @property
+    def cache(self) -> Cache:
+        return self._cache or get_cache()
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Skip rate limiting for health checks
-        if request.url.path in ["/healthz", "/version"]:
+        if request.url.path in ["/healthz", "/readyz", "/metrics", "/version"]:
             return await call_next(request)
         
         client_ip = request.client.host if request.client else "unknown"
-        now = time.time()
-        minute_ago = now - 60
-        
-        # Clean old requests
-        self.requests[client_ip] = [ts for ts in self.requests[client_ip] if ts > minute_ago]
+        window = int(time.time() // 60)
         
-        # Check limit
-        if len(self.requests[client_ip]) >= self.rpm:
+        key = f"ratelimit:{client_ip}:{window}"
+        cache = self.cache
+        if isinstance(cache, MemoryCache):
+            count = cache.incr(key, ttl=60)
+        else:
+            # sqlite/redis round trip: keep it off the event loop
+            count = await run_in_threadpool(cache.incr, key, 60)
+        if count > self.rpm:
             logger.warning(f"Rate limit exceeded for {client_ip}")
-            raise HTTPException(status_code=429, detail="Too many requests")
-        
-        # Record request
-        self.requests[client_ip].append(now)
+            return JSONResponse({"detail": "Too many requests"}, status_code=429)
         
         return await call_next(request)
 
@@ -67,3 +72,77 @@ class LoggingMiddleware(BaseHTTPMiddleware):
         logger.info(f"[{request_id}] {response.status_code} {duration:.3f}s")
         
         return response
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+class BodySizeLimitMiddleware:
+    """
+    Reject request bodies above max_bytes with 413.
+
+    Pure ASGI so the limit is enforced while the body streams in: an honest
+    Content-Length is rejected up front, and chunked/lying clients are cut
+    off as soon as the running byte count crosses the limit, before the
+    rest of the body is buffered.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    await self._reject(scope, receive, send)
+                    return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    if response_started:
+                        raise _BodyTooLarge()
+                    # Answer 413 here: the app's body parser would turn any
+                    # exception into its own 400. The app sees a disconnect
+                    # and whatever it sends afterwards is dropped.
+                    rejected = True
+                    await self._reject(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        logger.warning(f"Request body over {self.max_bytes} bytes rejected: {scope.get('path')}")
+        response = JSONResponse({"detail": "Request body too large"}, status_code=413)
+        await response(scope, receive, send)
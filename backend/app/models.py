@@ -1,5 +1,6 @@
 from __future__ import annotations
 from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
 from typing import Optional
 from datetime import datetime
 
@@ -39,3 +40,64 @@ class StripeEvent(SQLModel, table=True):
     stripe_event_id: str = Field(index=True, unique=True)
     event_type: str
     processed_at: datetime = Field(default_factory=datetime.utcnow)
+
+class IntakeStats(SQLModel, table=True):
+    """Sufficient statistics of an intake's free_text (see analysis_engine.TextStats)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: int = Field(index=True, unique=True)
+    stats_json: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class IdempotencyRecord(SQLModel, table=True):
+    """Stored 200 response body for a client-supplied Idempotency-Key, replayed on retries (errors are not stored)."""
+    __table_args__ = (UniqueConstraint("user_id", "route", "key"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True)
+    route: str
+    key: str
+    request_hash: str
+    response_json: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UserTrend(SQLModel, table=True):
+    """Per-user trait aggregates, updated incrementally as reports are written (see app/trends.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True, unique=True)
+    report_count: int = Field(default=0)
+    stats_json: str = Field(default="{}")
+    series_json: str = Field(default="{}")
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class TraitDistribution(SQLModel, table=True):
+    """Population histogram snapshot for one trait (see app/percentiles.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    trait: str = Field(index=True, unique=True)
+    total: int = Field(default=0)
+    counts_json: str = Field(default="{}")  # {bin: count}, sparse
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class RescoreCheckpoint(SQLModel, table=True):
+    """Progress of a bulk re-scoring job (see app/rescore.py), committed with each chunk."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job: str = Field(index=True, unique=True)
+    model_version: str
+    last_intake_id: int = Field(default=0)
+    processed: int = Field(default=0)
+    failed: int = Field(default=0)
+    finished: bool = Field(default=False)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class PolishMemo(SQLModel, table=True):
+    """LLM polish output keyed by a hash of the prompt and model (see app/llm_polisher.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(index=True, unique=True)
+    model: str
+    output_json: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ReportVector(SQLModel, table=True):
+    """A report's trait vector packed as little-endian float32 (see app/similarity.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    report_id: int = Field(index=True, unique=True)
+    user_id: int = Field(index=True)
+    vector: bytes
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from .analysis_engine import TRAIT_KEYS, trait_vector
+from .config import settings
+from .models import Report, TraitDistribution
+
+logger = logging.getLogger(__name__)
+
+# Trait scores are clamped to 0-100 and rounded to one decimal, so the
+# population distribution fits exactly in 1001 bins. An exact counting
+# histogram beats an approximate sketch here: O(log bins) update and query,
+# mergeable by addition across workers, and no error growth with volume.
+BINS = 1001
+QUANTILES = (10, 25, 50, 75, 90)
+
+def _bin(value: float) -> int:
+    return min(BINS - 1, max(0, int(round(value * 10))))
+
+class TraitHistogram:
+    """Counts per 0.1 bin with a Fenwick tree for prefix sums."""
+
+    def __init__(self):
+        self.counts = [0] * BINS
+        self._tree = [0] * (BINS + 1)
+        self.total = 0
+
+    def add_bin(self, b: int, k: int = 1) -> None:
+        self.counts[b] += k
+        self.total += k
+        i = b + 1
+        while i <= BINS:
+            self._tree[i] += k
+            i += i & -i
+
+    def add(self, value: float, k: int = 1) -> None:
+        self.add_bin(_bin(value), k)
+
+    def merge(self, counts: Dict[int, int]) -> None:
+        for b, k in counts.items():
+            if k:
+                self.add_bin(int(b), k)
+
+    def count_below(self, b: int) -> int:
+        """Number of samples in bins < b."""
+        s, i = 0, b
+        while i > 0:
+            s += self._tree[i]
+            i -= i & -i
+        return s
+
+    def percentile_of(self, value: float) -> Optional[float]:
+        """Mid-rank percentile of value in the population (0-100)."""
+        if not self.total:
+            return None
+        b = _bin(value)
+        below = self.count_below(b)
+        return round(100.0 * (below + 0.5 * self.counts[b]) / self.total, 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Smallest score with at least q% of the population at or below it."""
+        if not self.total:
+            return None
+        target = max(1, -(-self.total * q // 100))
+        # Fenwick descent: largest prefix with sum < target
+        pos, remaining, step = 0, target, 1 << BINS.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= BINS and self._tree[nxt] < remaining:
+                pos = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return pos / 10.0
+
+    def sparse(self) -> Dict[int, int]:
+        return {b: k for b, k in enumerate(self.counts) if k}
+
+class PercentileIndex:
+    """
+    Process-local view of the population distribution of every trait.
+
+    record() updates the local histograms and a pending delta; flush() adds
+    the delta to the shared TraitDistribution rows and reloads the merged
+    totals, which folds in what other workers flushed in the meantime.
+    The first load() against a database without TraitDistribution rows
+    seeds them from the stored reports.
+    """
+
+    def __init__(self, flush_interval: float = 30.0):
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.hist = {name: TraitHistogram() for _, name in TRAIT_KEYS}
+        self._delta: Dict[str, Dict[int, int]] = {name: {} for _, name in TRAIT_KEYS}
+        self._last_flush = time.monotonic()
+
+    @property
+    def total(self) -> int:
+        return self.hist[TRAIT_KEYS[0][1]].total
+
+    def record(self, scores: Dict[str, Any]) -> None:
+        with self._lock:
+            for (_, name), x in zip(TRAIT_KEYS, trait_vector(scores)):
+                b = _bin(x)
+                self.hist[name].add_bin(b)
+                self._delta[name][b] = self._delta[name].get(b, 0) + 1
+
+    def percentiles(self, scores: Dict[str, Any]) -> Dict[str, Dict[str, Optional[float]]]:
+        """Percentile block for a report, shaped like its scores."""
+        out: Dict[str, Dict[str, Optional[float]]] = {}
+        for (group, name), x in zip(TRAIT_KEYS, trait_vector(scores)):
+            out.setdefault(group, {})[name] = self.hist[name].percentile_of(x)
+        return out
+
+    def summary(self, quantiles: Sequence[int] = QUANTILES) -> Dict[str, Any]:
+        traits: Dict[str, Dict[str, Any]] = {}
+        for group, name in TRAIT_KEYS:
+            h = self.hist[name]
+            traits.setdefault(group, {})[name] = {f"p{q}": h.quantile(q) for q in quantiles}
+        return {"count": self.total, "traits": traits}
+
+    def seed(self, db: Session) -> None:
+        """
+        Build the shared rows from every stored report's scores. Written
+        once, so workers that flush later add to the history instead of
+        replacing it; a worker that loses the race to insert just reloads.
+        """
+        counts: Dict[str, Dict[int, int]] = {name: {} for _, name in TRAIT_KEYS}
+        rows = db.exec(select(Report.result_json).execution_options(yield_per=500))
+        for result_json in rows:
+            try:
+                vec = trait_vector(json.loads(result_json).get("scores", {}))
+            except (KeyError, TypeError, ValueError):
+                continue  # malformed or pre-trait result
+            for (_, name), x in zip(TRAIT_KEYS, vec):
+                b = _bin(x)
+                counts[name][b] = counts[name].get(b, 0) + 1
+        for _, name in TRAIT_KEYS:
+            db.add(TraitDistribution(
+                trait=name,
+                total=sum(counts[name].values()),
+                counts_json=json.dumps(counts[name], separators=(",", ":")),
+            ))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another worker seeded first
+        else:
+            logger.info(f"Seeded percentiles from {sum(counts[TRAIT_KEYS[0][1]].values())} stored reports")
+
+    def load(self, db: Session) -> None:
+        rows = {r.trait: r for r in db.exec(select(TraitDistribution)).all()}
+        if not rows:
+            self.seed(db)
+            rows = {r.trait: r for r in db.exec(select(TraitDistribution)).all()}
+        with self._lock:
+            pending = self._delta
+            self._reset()
+            for _, name in TRAIT_KEYS:
+                if name in rows:
+                    self.hist[name].merge({int(b): k for b, k in json.loads(rows[name].counts_json).items()})
+                self.hist[name].merge(pending[name])
+            self._delta = pending
+
+    def flush(self, db: Session) -> None:
+        with self._lock:
+            delta, self._delta = self._delta, {name: {} for _, name in TRAIT_KEYS}
+        if any(delta.values()):
+            for _, name in TRAIT_KEYS:
+                if not delta[name]:
+                    continue
+                row = db.exec(select(TraitDistribution).where(TraitDistribution.trait == name).with_for_update()).first()
+                if not row:
+                    row = TraitDistribution(trait=name)
+                counts = {int(b): k for b, k in json.loads(row.counts_json or "{}").items()}
+                for b, k in delta[name].items():
+                    counts[b] = counts.get(b, 0) + k
+                row.counts_json = json.dumps(counts, separators=(",", ":"))
+                row.total += sum(delta[name].values())
+                row.updated_at = datetime.utcnow()
+                db.add(row)
+            try:
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    # keep the samples for the next attempt
+                    for name, d in delta.items():
+                        for b, k in d.items():
+                            self._delta[name][b] = self._delta[name].get(b, 0) + k
+                raise
+        self.load(db)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self, db: Session) -> None:
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        try:
+            self.flush(db)
+        except Exception as e:
+            logger.error(f"Percentile snapshot flush failed: {e}")
+
+percentile_index = PercentileIndex(flush_interval=settings.PERCENTILE_FLUSH_SECONDS)
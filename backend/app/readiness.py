@@ -0,0 +1,144 @@
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Load-aware readiness (/readyz) and the same signals for autoscaling (/metrics).
+# Every signal is read from counters the components already keep, so a probe
+# costs a few attribute reads. The gate trips when a signal goes above its
+# threshold and only clears once it is back below threshold * recovery_ratio,
+# so an instance near a limit does not flap in and out of the load balancer.
+
+class LoopLagMonitor:
+    """
+    Event-loop lag: a task sleeps interval seconds and records how late it
+    wakes up. lag() also counts a tick that is overdue right now, so a loop
+    stuck on blocking work shows up before the monitor gets to run again.
+    """
+
+    def __init__(self, interval: float = 0.25, window: int = 20):
+        self.interval = interval
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._last_tick: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(0.0, time.monotonic() - self._last_tick - self.interval))
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._last_tick = None
+
+    def lag(self) -> float:
+        if self._last_tick is None:
+            return 0.0
+        overdue = time.monotonic() - self._last_tick - self.interval
+        return max(max(self._samples, default=0.0), overdue, 0.0)
+
+class ReadinessGate:
+    """Ready/not-ready from signals and per-signal thresholds, with hysteresis (0 = not gated)."""
+
+    def __init__(self, thresholds: Dict[str, float], recovery_ratio: float = 0.8):
+        self.thresholds = thresholds
+        self.recovery_ratio = recovery_ratio
+        self.tripped: Set[str] = set()
+        self.ready = True
+        self._lock = threading.Lock()
+
+    def update(self, signals: Dict[str, float]) -> bool:
+        with self._lock:
+            for name, limit in self.thresholds.items():
+                if limit <= 0:
+                    continue
+                value = signals.get(name, 0.0)
+                if name in self.tripped:
+                    if value < limit * self.recovery_ratio:
+                        self.tripped.discard(name)
+                elif value > limit:
+                    self.tripped.add(name)
+            ready = not self.tripped
+            if ready != self.ready:
+                if ready:
+                    logger.info("Instance ready again")
+                else:
+                    logger.warning(f"Instance not ready: {', '.join(sorted(self.tripped))} over threshold")
+                self.ready = ready
+            return ready
+
+def _pool_usage(pool) -> Tuple[int, int]:
+    """(checked-out connections, capacity) of a QueuePool; (0, 0) for pools that do not count."""
+    checkedout = getattr(pool, "checkedout", None)
+    if checkedout is None:
+        return 0, 0
+    overflow = getattr(pool, "_max_overflow", 0)
+    capacity = pool.size() + overflow if overflow >= 0 else 0  # -1: unbounded overflow
+    return checkedout(), capacity
+
+def collect_signals() -> Dict[str, float]:
+    """Current saturation signals of this process."""
+    from .admission import get_admission
+    from .db import async_engine, engine
+    from .executor import get_executor
+    from .llm_polisher import llm_error_rate
+
+    out, cap = 0, 0
+    for pool in (engine.pool, async_engine.sync_engine.pool):
+        o, c = _pool_usage(pool)
+        out += o
+        cap += c
+    executor = get_executor()
+    executor_capacity = executor.workers + executor.queue_size
+    return {
+        "db_checked_out": out,
+        "db_pool_utilization": round(out / cap, 4) if cap else 0.0,
+        "analyses_in_flight": executor.in_flight,
+        "executor_utilization": round(executor.in_flight / executor_capacity, 4) if executor_capacity else 0.0,
+        "queue_depth": get_admission().queue_depth(),
+        "loop_lag_seconds": round(loop_monitor.lag(), 4),
+        "llm_error_rate": round(llm_error_rate(), 4),
+    }
+
+def check_readiness() -> Dict[str, Any]:
+    signals = collect_signals()
+    ready = readiness_gate.update(signals)
+    return {"ready": ready, "tripped": sorted(readiness_gate.tripped), "signals": signals}
+
+def metrics_text() -> str:
+    """Prometheus text exposition of the readiness signals (gauges)."""
+    signals = collect_signals()
+    lines = []
+    for name, value in [*signals.items(), ("ready", int(readiness_gate.ready))]:
+        lines.append(f"# TYPE atlas_{name} gauge")
+        lines.append(f"atlas_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+loop_monitor = LoopLagMonitor(interval=settings.LOOP_LAG_INTERVAL_SECONDS)
+readiness_gate = ReadinessGate(
+    {
+        "db_pool_utilization": settings.READY_DB_POOL_UTILIZATION,
+        "executor_utilization": settings.READY_EXECUTOR_UTILIZATION,
+        "queue_depth": settings.READY_QUEUE_DEPTH,
+        "loop_lag_seconds": settings.READY_LOOP_LAG_SECONDS,
+        "llm_error_rate": settings.READY_LLM_ERROR_RATE,
+    },
+    recovery_ratio=settings.READY_RECOVERY_RATIO,
+)
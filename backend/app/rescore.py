@@ -0,0 +1,163 @@
+from __future__ import annotations
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from .analysis_engine import analyze
+from .executor import AnalysisExecutor
+from .lexicons import get_matcher
+from .models import Report, RescoreCheckpoint, SessionIntake
+from .percentiles import percentile_index
+from .similarity import save_report_vector
+from .trends import update_trends
+
+logger = logging.getLogger(__name__)
+
+# Bulk re-scoring: recompute every intake under a scoring model version and
+# write the results as new Report rows. Intakes are read in keyset order
+# (id > last_intake_id), analyzed in parallel slices on an AnalysisExecutor,
+# and each chunk's reports are written the way /analyze writes one (report,
+# trait vector, per-user trends) in one transaction together with the
+# checkpoint, so a killed job resumes exactly where it stopped. Once a chunk
+# has committed, its scores are recorded in the percentile index and flushed
+# to the shared histogram rows that the API workers merge on their next flush.
+# The LLM polish is skipped; rescored reports are deterministic engine output.
+
+CHUNK_SIZE = 500
+
+Item = Tuple[int, int, str, str]  # intake id, user id, survey_json, free_text
+
+def _analyze_slice(items: List[Item], model_version: str) -> List[Tuple[int, int, Optional[str]]]:
+    # Runs in an executor worker; returns (intake id, user id, result_json or None on failure).
+    out = []
+    for intake_id, user_id, survey_json, free_text in items:
+        try:
+            result = analyze(free_text or "", json.loads(survey_json or "{}"), model_version)
+            out.append((intake_id, user_id, json.dumps(result)))
+        except Exception:
+            out.append((intake_id, user_id, None))
+    return out
+
+class Throttle:
+    """Caps throughput at max_rate items/second (0 = unthrottled)."""
+
+    def __init__(self, max_rate: float = 0.0, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.max_rate = max_rate
+        self.clock = clock
+        self.sleep = sleep
+        self._start = clock()
+        self._count = 0
+
+    def wait(self, n: int) -> None:
+        self._count += n
+        if self.max_rate <= 0:
+            return
+        ahead = self._count / self.max_rate - (self.clock() - self._start)
+        if ahead > 0:
+            self.sleep(ahead)
+
+def get_checkpoint(db: Session, job: str, model_version: str) -> RescoreCheckpoint:
+    cp = db.exec(select(RescoreCheckpoint).where(RescoreCheckpoint.job == job)).first()
+    if cp is None:
+        cp = RescoreCheckpoint(job=job, model_version=model_version)
+        db.add(cp)
+        db.commit()
+        db.refresh(cp)
+    elif cp.model_version != model_version:
+        raise ValueError(f"Job {job!r} re-scores with model {cp.model_version!r}, not {model_version!r}")
+    return cp
+
+def _fetch_chunk(db: Session, after_id: int, limit: int) -> List[Item]:
+    return list(db.exec(
+        select(SessionIntake.id, SessionIntake.user_id, SessionIntake.survey_json, SessionIntake.free_text)
+        .where(SessionIntake.id > after_id)
+        .order_by(SessionIntake.id)
+        .limit(limit)
+    ).all())
+
+def _store_reports(db: Session, results: List[Tuple[int, int, str]], now: datetime) -> List[Tuple[Report, Dict[str, Any]]]:
+    """Add one chunk's reports with their vectors and trend updates (caller commits); returns (report, scores)."""
+    written = []
+    for intake_id, user_id, result_json in results:
+        r = Report(user_id=user_id, session_id=intake_id, result_json=result_json, created_at=now)
+        db.add(r)
+        scores = json.loads(result_json)["scores"]
+        update_trends(db, user_id, scores, now)
+        written.append((r, scores))
+    db.flush()  # one batched INSERT for the chunk; assigns report ids
+    for r, scores in written:
+        save_report_vector(db, r, scores)
+    return written
+
+def run_rescore(
+    engine: Engine,
+    model_version: str,
+    job: Optional[str] = None,
+    executor: Optional[AnalysisExecutor] = None,
+    chunk_size: int = CHUNK_SIZE,
+    max_rate: float = 0.0,
+    max_chunks: Optional[int] = None,
+    progress: Optional[Callable[[RescoreCheckpoint], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Re-score all intakes with model_version, resuming job's checkpoint.
+    max_rate caps intakes/second to leave headroom for live traffic;
+    max_chunks stops early (the job can be resumed later).
+    """
+    job = job or f"rescore-{model_version}"
+    get_matcher(model_version)  # fail fast on an unknown version
+    own_executor = executor is None
+    if own_executor:
+        executor = AnalysisExecutor(backend="process", queue_size=0)
+    throttle = Throttle(max_rate)
+    chunks = 0
+    try:
+        with Session(engine) as db:
+            cp = get_checkpoint(db, job, model_version)
+            percentile_index.load(db)  # seeds the shared rows first if there are none yet
+            while not cp.finished and (max_chunks is None or chunks < max_chunks):
+                items = _fetch_chunk(db, cp.last_intake_id, chunk_size)
+                written: List[Tuple[Report, Dict[str, Any]]] = []
+                if not items:
+                    cp.finished = True
+                else:
+                    n = max(1, min(executor.workers, len(items)))
+                    slices = [items[i::n] for i in range(n)]
+                    futures = [executor.submit(_analyze_slice, s, model_version) for s in slices]
+                    results = [r for f in futures for r in f.result()]
+                    now = datetime.utcnow()
+                    written = _store_reports(db, [r for r in sorted(results) if r[2] is not None], now)
+                    cp.failed += len(results) - len(written)
+                    cp.processed += len(written)
+                    cp.last_intake_id = items[-1][0]
+                    chunks += 1
+                cp.updated_at = datetime.utcnow()
+                db.add(cp)
+                db.commit()  # reports and checkpoint land together
+                db.refresh(cp)
+                if written:
+                    for _, scores in written:
+                        percentile_index.record(scores)
+                    try:
+                        percentile_index.flush(db)
+                    except Exception as e:
+                        logger.error(f"Percentile flush failed (retried with the next chunk): {e}")
+                if progress:
+                    progress(cp)
+                throttle.wait(len(items))
+            percentile_index.flush(db)  # anything a failed chunk flush left pending
+            logger.info(f"Rescore {job}: {cp.processed} reports, {cp.failed} failed, last intake {cp.last_intake_id}")
+            return {
+                "job": cp.job,
+                "model_version": cp.model_version,
+                "processed": cp.processed,
+                "failed": cp.failed,
+                "last_intake_id": cp.last_intake_id,
+                "finished": cp.finished,
+            }
+    finally:
+        if own_executor:
+            executor.shutdown()
@@ -0,0 +1,32 @@
+from __future__ import annotations
+from typing import Any, Iterable, Tuple
+from fastapi.responses import JSONResponse, Response
+
+# Fast JSON responses. orjson encodes several times faster than the stdlib
+# encoder behind JSONResponse; fall back to it if orjson is not installed.
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:  # pragma: no cover
+    orjson = None
+    DefaultJSONResponse = JSONResponse
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    """Return already-trusted content directly, skipping response_model re-validation."""
+    return DefaultJSONResponse(content, status_code=status_code)
+
+class RawJSONResponse(Response):
+    """Body is pre-encoded JSON bytes, sent as-is."""
+    media_type = "application/json"
+
+def report_list_bytes(rows: Iterable[Tuple[int, int, str]]) -> bytes:
+    """
+    Encode (report_id, session_id, result_json) rows as a ReportOut list by
+    splicing the stored result JSON into the output verbatim, instead of
+    decoding and re-encoding every report.
+    """
+    parts = [
+        b'{"report_id":%d,"session_id":%d,"result":%s}' % (report_id, session_id, result_json.encode("utf-8"))
+        for report_id, session_id, result_json in rows
+    ]
+    return b"[" + b",".join(parts) + b"]"
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy import exists
+from sqlmodel import Session, select
+from .admission import parse_tier_map, plan_tier
+from .cache import get_cache
+from .config import settings
+from .models import IntakeStats, Report, ReportVector, SessionIntake, Subscription
+from .similarity import save_report_vector, vector_key
+
+logger = logging.getLogger(__name__)
+
+# Retention: intakes (with their reports) older than the plan's retention
+# window are moved out of the hot tables into per-user archive chunks,
+#   ARCHIVE_DIR/<user_id>/<table>-<YYYY-MM>.ndjson.gz
+# one chunk per table and month of created_at. Chunks are append-only: each
+# archiver pass appends a new gzip member, so a chunk is never rewritten.
+# Readers de-duplicate by row id (a pass interrupted between writing the
+# archive and deleting the rows leaves a duplicate, never a loss).
+# Derived rows (IntakeStats, ReportVector) are dropped and recomputed on restore.
+# ARCHIVE_DIR must be durable and shared by every instance: the archive is the
+# only copy once rows are deleted, and /reports/archived, restore and purge
+# read it from whichever instance serves the request.
+
+def retention_days(state: Dict[str, str]) -> Optional[int]:
+    """Retention window for a subscription state; None keeps data forever."""
+    days = parse_tier_map(settings.RETENTION_DAYS, int).get(plan_tier(state))
+    return days if days and days > 0 else None
+
+def user_archive_dir(user_id: int, root: Optional[str] = None) -> str:
+    return os.path.join(root or settings.ARCHIVE_DIR, str(int(user_id)))
+
+def _row_json(row) -> str:
+    return json.dumps(row.model_dump(), default=lambda o: o.isoformat(), separators=(",", ":"))
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _append_chunk(path: str, lines: List[str]) -> None:
+    """Append a gzip member and make it durable (data and, for a new chunk, its directory entry)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    created = not os.path.exists(path)
+    with open(path, "ab") as f:
+        with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            gz.write(("\n".join(lines) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    if created:
+        _fsync_dir(os.path.dirname(path))
+
+def _write_archive(user_id: int, table: str, rows: List[Any], root: Optional[str]) -> None:
+    by_month: Dict[str, List[str]] = {}
+    for row in rows:
+        by_month.setdefault(row.created_at.strftime("%Y-%m"), []).append(_row_json(row))
+    for month, lines in by_month.items():
+        _append_chunk(os.path.join(user_archive_dir(user_id, root), f"{table}-{month}.ndjson.gz"), lines)
+
+def archive_user(db: Session, user_id: int, cutoff: datetime, batch_size: int = 500, root: Optional[str] = None) -> Dict[str, int]:
+    """Move the user's intakes older than cutoff (and whose reports are all older) to the archive."""
+    counts = {"intakes": 0, "reports": 0}
+    newer_report = exists().where(Report.session_id == SessionIntake.id, Report.created_at >= cutoff)
+    while True:
+        intakes = db.exec(
+            select(SessionIntake)
+            .where(SessionIntake.user_id == user_id, SessionIntake.created_at < cutoff, ~newer_report)
+            .order_by(SessionIntake.id)
+            .limit(batch_size)
+        ).all()
+        if not intakes:
+            return counts
+        ids = [s.id for s in intakes]
+        reports = db.exec(select(Report).where(Report.session_id.in_(ids), Report.user_id == user_id)).all()
+        # Archive first; rows are only deleted once their chunk is on disk.
+        _write_archive(user_id, "intakes", intakes, root)
+        if reports:
+            _write_archive(user_id, "reports", reports, root)
+        report_ids = [r.id for r in reports]
+        for model, column, values in (
+            (ReportVector, ReportVector.report_id, report_ids),
+            (IntakeStats, IntakeStats.session_id, ids),
+        ):
+            for row in db.exec(select(model).where(column.in_(values))).all() if values else []:
+                db.delete(row)
+        for row in [*reports, *intakes]:
+            db.delete(row)
+        db.commit()
+        if report_ids:
+            # drop the archived vectors from every worker's similarity index
+            get_cache().invalidate(vector_key(user_id))
+        counts["intakes"] += len(intakes)
+        counts["reports"] += len(reports)
+
+def run_archiver(db: Session, now: Optional[datetime] = None, root: Optional[str] = None) -> Dict[str, int]:
+    """One archiver pass over every user with data past their plan's retention window."""
+    now = now or datetime.utcnow()
+    plans = {s.user_id: {"plan": s.plan, "status": s.status} for s in db.exec(select(Subscription)).all()}
+    user_ids = db.exec(select(SessionIntake.user_id).distinct()).all()
+    totals = {"users": 0, "intakes": 0, "reports": 0}
+    for user_id in user_ids:
+        days = retention_days(plans.get(user_id, {"plan": "free", "status": "active"}))
+        if days is None:
+            continue
+        counts = archive_user(db, user_id, now - timedelta(days=days), root=root)
+        if counts["intakes"]:
+            totals["users"] += 1
+            totals["intakes"] += counts["intakes"]
+            totals["reports"] += counts["reports"]
+    if totals["intakes"]:
+        logger.info(f"Archived {totals['intakes']} intakes and {totals['reports']} reports of {totals['users']} users")
+    return totals
+
+def iter_archived(user_id: int, table: str, root: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Archived rows of one table for a user, oldest chunk first, de-duplicated by id."""
+    d = user_archive_dir(user_id, root)
+    if not os.path.isdir(d):
+        return
+    for name in sorted(os.listdir(d)):
+        if not (name.startswith(table + "-") and name.endswith(".ndjson.gz")):
+            continue
+        seen: Dict[int, Dict[str, Any]] = {}
+        with gzip.open(os.path.join(d, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    seen[row["id"]] = row
+        yield from seen.values()
+
+def _to_model(model, row: Dict[str, Any]):
+    row = dict(row, created_at=datetime.fromisoformat(row["created_at"]))
+    return model(**row)
+
+def restore_user(db: Session, user_id: int, since: Optional[datetime] = None, root: Optional[str] = None) -> Dict[str, int]:
+    """
+    Re-insert archived intakes created at or after since (all if None), with
+    their reports, skipping rows already present. Archive chunks are left
+    untouched; rows restored outside the retention window are archived again
+    on the next pass.
+    """
+    counts = {"intakes": 0, "reports": 0}
+    restored_intakes = set()
+    for row in iter_archived(user_id, "intakes", root):
+        if since and datetime.fromisoformat(row["created_at"]) < since:
+            continue
+        if db.get(SessionIntake, row["id"]) is None:
+            db.add(_to_model(SessionIntake, row))
+            counts["intakes"] += 1
+        restored_intakes.add(row["id"])
+    db.flush()
+    for row in iter_archived(user_id, "reports", root):
+        if row["session_id"] not in restored_intakes or db.get(Report, row["id"]) is not None:
+            continue
+        report = _to_model(Report, row)
+        db.add(report)
+        save_report_vector(db, report, json.loads(report.result_json).get("scores", {}))
+        counts["reports"] += 1
+    db.commit()
+    return counts
+
+def purge_user_archive(user_id: int, root: Optional[str] = None) -> None:
+    shutil.rmtree(user_archive_dir(user_id, root), ignore_errors=True)
+
+class Archiver:
+    """Background thread running run_archiver every interval seconds."""
+
+    def __init__(self, engine, interval: float, root: Optional[str] = None):
+        self.engine = engine
+        self.interval = interval
+        self.root = root
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _locked_pass(self) -> Optional[Dict[str, int]]:
+        # One archiver per archive directory: other workers skip the pass.
+        import fcntl
+        root = self.root or settings.ARCHIVE_DIR
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, ".archiver.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            with Session(self.engine) as db:
+                return run_archiver(db, root=self.root)
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                try:
+                    self._locked_pass()
+                except Exception as e:
+                    logger.error(f"Archiver pass failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
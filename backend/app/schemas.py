@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, Dict, Any, List
+from .config import settings
 
 class RegisterIn(BaseModel):
     email: EmailStr
@@ -16,7 +17,11 @@ class TokenOut(BaseModel):
 class IntakeIn(BaseModel):
     consent: bool
     survey: Dict[str, Any] = {}
-    free_text: str = ""
+    free_text: str = Field(default="", max_length=settings.MAX_FREE_TEXT_CHARS)
+
+class IntakePatchIn(BaseModel):
+    survey: Optional[Dict[str, Any]] = None  # merged into the stored survey
+    append_text: str = Field(default="", max_length=settings.MAX_FREE_TEXT_CHARS)  # appended verbatim to free_text
 
 class IntakeOut(BaseModel):
     session_id: int
@@ -30,3 +35,9 @@ class MeOut(BaseModel):
     email: EmailStr
     plan: str
     status: str
+
+class TrendsOut(BaseModel):
+    report_count: int
+    traits: Dict[str, Dict[str, Dict[str, float]]]  # group -> trait -> mean/min/max/last
+    series: Dict[str, Any]  # stride + points[{t, values, n}], values ordered like trait_order
+    trait_order: List[str]
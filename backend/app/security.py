@@ -1,16 +1,19 @@
-import bcrypt
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
 from typing import Optional
 
+# bcrypt and jose are imported inside the functions that need them so that
+# importing the API module stays cheap on scale-to-zero cold starts.
+
 def hash_password(pw: str) -> str:
     """Hash password using bcrypt. Automatically handles encoding and salting."""
+    import bcrypt
     pw_bytes = pw.encode('utf-8')
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(pw_bytes, salt).decode('utf-8')
 
 def verify_password(pw: str, pw_hash: str) -> bool:
     """Verify password against bcrypt hash."""
+    import bcrypt
     try:
         pw_bytes = pw.encode('utf-8')
         hash_bytes = pw_hash.encode('utf-8')
@@ -19,11 +22,13 @@ def verify_password(pw: str, pw_hash: str) -> bool:
         return False
 
 def create_access_token(subject: str, secret: str, expires_minutes: int = 60*24*7) -> str:
+    from jose import jwt
     exp = datetime.utcnow() + timedelta(minutes=expires_minutes)
     payload = {"sub": subject, "exp": exp}
     return jwt.encode(payload, secret, algorithm="HS256")
 
 def decode_token(token: str, secret: str) -> Optional[str]:
+    from jose import jwt, JWTError
     try:
         payload = jwt.decode(token, secret, algorithms=["HS256"])
         return payload.get("sub")
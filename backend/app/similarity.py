@@ -0,0 +1,366 @@
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from .analysis_engine import TRAIT_KEYS, trait_vector
+from .config import settings
+from .models import Report, ReportVector
+
+logger = logging.getLogger(__name__)
+
+# Similar profiles and archetypes over the 8-dim trait vectors of all reports.
+# Vectors are stored packed (ReportVector.vector, little-endian float32) and
+# held in one contiguous float32 matrix per process. At 8 dims a vectorized
+# brute-force scan beats tree/IVF structures: 1M vectors is 32 MB and one
+# k-NN query is a single pass over it. Archetypes are k-means centroids,
+# retrained when the population has grown enough to move them.
+
+DIMS = len(TRAIT_KEYS)
+DTYPE = np.dtype("<f4")
+VECTOR_PREFIX = "report_vectors:"  # cache invalidation key prefix, per user
+
+def pack_vector(vec: Sequence[float]) -> bytes:
+    return np.asarray(vec, dtype=DTYPE).tobytes()
+
+def unpack_vector(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype=DTYPE)
+
+def vector_key(user_id: int) -> str:
+    """Cache key invalidated when some or all of a user's report vectors are deleted."""
+    return f"{VECTOR_PREFIX}{user_id}"
+
+def save_report_vector(db: Session, report: Report, scores: Dict[str, Any]) -> List[float]:
+    """Store the packed trait vector of a flushed report (caller commits)."""
+    vec = trait_vector(scores)
+    db.add(ReportVector(report_id=report.id, user_id=report.user_id, vector=pack_vector(vec)))
+    return vec
+
+def purge_user_vectors(db: Session, user_id: int) -> None:
+    for row in db.exec(select(ReportVector).where(ReportVector.user_id == user_id)).all():
+        db.delete(row)
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means with k-means++ seeding; returns (k, dims) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = np.empty((k, data.shape[1]), dtype=np.float32)
+    centroids[0] = data[rng.integers(len(data))]
+    d2 = ((data - centroids[0]) ** 2).sum(1)
+    for i in range(1, k):
+        total = d2.sum()
+        idx = rng.choice(len(data), p=d2 / total) if total > 0 else rng.integers(len(data))
+        centroids[i] = data[idx]
+        d2 = np.minimum(d2, ((data - centroids[i]) ** 2).sum(1))
+    for _ in range(iterations):
+        labels = nearest_centroid(data, centroids)
+        moved = False
+        for i in range(k):
+            members = data[labels == i]
+            if len(members):
+                c = members.mean(0)
+                moved |= not np.allclose(c, centroids[i], atol=1e-3)
+                centroids[i] = c
+        if not moved:
+            break
+    return centroids
+
+def nearest_centroid(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 is constant per row
+    scores = data @ centroids.T * -2.0 + (centroids ** 2).sum(1)
+    return scores.argmin(1)
+
+class VectorIndex:
+    """
+    Process-local index of report trait vectors.
+
+    add() appends a vector written by this process; refresh() pulls rows
+    other workers wrote since the last load (ids above the high-water mark);
+    on_invalidate() drops a user's rows when some were deleted (purge,
+    archiving) and the next refresh() reloads the ones still stored.
+    Cluster centroids are retrained once the population grows by
+    retrain_growth since the last training; training runs in a background
+    thread (add() is called from the event loop) and the new centroids and
+    labels are swapped in under the lock when it finishes.
+    """
+
+    def __init__(self, clusters: int = 8, retrain_growth: float = 2.0, sample_size: int = 50000, refresh_interval: float = 30.0,
+                 background_train: bool = True):
+        self.clusters = clusters
+        self.retrain_growth = retrain_growth
+        self.sample_size = sample_size
+        self.refresh_interval = refresh_interval
+        self.background_train = background_train
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        cap = 1024
+        self._vecs = np.zeros((cap, DIMS), dtype=np.float32)
+        self._norms = np.zeros(cap, dtype=np.float32)  # |v|^2, for distances via one mat-vec
+        self._ids = np.zeros(cap, dtype=np.int64)
+        self._users = np.zeros(cap, dtype=np.int64)
+        self._alive = np.zeros(cap, dtype=bool)
+        self._labels = np.full(cap, -1, dtype=np.int32)
+        self._n = 0
+        self._live = 0
+        self._added: set = set()  # report ids add()ed here, not yet seen by refresh()
+        self._reload_users: set = set()  # users dropped by on_invalidate(), reloaded by refresh()
+        self._high_water = 0  # largest ReportVector.id loaded
+        self.centroids: Optional[np.ndarray] = None
+        self._cluster_sizes = np.zeros(self.clusters, dtype=np.int64)
+        self._trained_at = 0
+        self._training = False
+        self._generation += 1  # a training started before a reset is discarded
+        self._last_refresh = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return self._live
+
+    def _grow(self, extra: int) -> None:
+        need = self._n + extra
+        cap = len(self._ids)
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        for name in ("_vecs", "_norms", "_ids", "_users", "_alive", "_labels"):
+            old = getattr(self, name)
+            new = np.zeros((cap,) + old.shape[1:], dtype=old.dtype)
+            if name == "_labels":
+                new[:] = -1
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _append(self, report_ids: np.ndarray, user_ids: np.ndarray, vecs: np.ndarray) -> None:
+        m = len(report_ids)
+        if not m:
+            return
+        self._grow(m)
+        s = slice(self._n, self._n + m)
+        self._vecs[s] = vecs
+        self._norms[s] = (vecs.astype(np.float32) ** 2).sum(1)
+        self._ids[s] = report_ids
+        self._users[s] = user_ids
+        self._alive[s] = True
+        if self.centroids is not None:
+            labels = nearest_centroid(vecs, self.centroids)
+            self._labels[s] = labels
+            self._cluster_sizes += np.bincount(labels, minlength=self.clusters)
+        self._n += m
+        self._live += m
+        self._maybe_train()
+
+    def _maybe_train(self) -> None:
+        # Called under the lock: snapshot a sample and start training.
+        if self._training or self.size < max(self.clusters, 1) or self.size < self._trained_at * self.retrain_growth:
+            return
+        n = self._n
+        alive = np.flatnonzero(self._alive[:n])
+        rng = np.random.default_rng(0)
+        sample = alive if len(alive) <= self.sample_size else rng.choice(alive, self.sample_size, replace=False)
+        # Rows below n never change (appends go past n, _grow copies), so the
+        # current array can be read without the lock.
+        args = (self._vecs[sample], self._vecs[:n], n, len(alive), self._generation)
+        self._training = True
+        if not self.background_train:
+            self._train(*args)
+            return
+        threading.Thread(target=self._train, args=args, name="vector-index-train", daemon=True).start()
+
+    def _train(self, sample: np.ndarray, vecs: np.ndarray, n: int, population: int, generation: int) -> None:
+        try:
+            centroids = kmeans(sample, self.clusters)
+            labels = np.empty(n, dtype=np.int32)
+            for start in range(0, n, 262144):
+                labels[start:start + 262144] = nearest_centroid(vecs[start:start + 262144], centroids)
+        except Exception as e:
+            logger.error(f"Archetype training failed: {e}")
+            with self._lock:
+                if generation == self._generation:
+                    self._training = False
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            m = self._n
+            self._labels[:n] = labels
+            if m > n:  # appended while training
+                self._labels[n:m] = nearest_centroid(self._vecs[n:m], centroids)
+            self.centroids = centroids
+            self._cluster_sizes = np.bincount(self._labels[:m][self._alive[:m]], minlength=self.clusters)
+            self._trained_at = population
+            self._training = False
+            logger.info(f"Trained {self.clusters} archetypes on {len(sample)} of {population} report vectors")
+            self._maybe_train()  # the population may have doubled again meanwhile
+
+    def wait_for_training(self, timeout: float = 30.0) -> None:
+        """Block until no training is running (tests, benchmarks)."""
+        deadline = time.monotonic() + timeout
+        while self._training and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def add(self, report_id: int, user_id: int, vec: Sequence[float]) -> None:
+        with self._lock:
+            self._append(np.array([report_id]), np.array([user_id]), np.asarray([vec], dtype=np.float32))
+            self._added.add(report_id)
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            mask = self._alive[:self._n] & (self._users[:self._n] == user_id)
+            labels = self._labels[:self._n][mask]
+            labels = labels[labels >= 0]
+            self._cluster_sizes -= np.bincount(labels, minlength=self.clusters)
+            self._alive[:self._n][mask] = False
+            self._live -= int(mask.sum())
+            # rows add()ed here but not yet refreshed must be loaded again, not skipped
+            self._added.difference_update(self._ids[:self._n][mask].tolist())
+
+    def on_invalidate(self, key: str) -> None:
+        """Cache subscriber: drop a user's vectors in this process; refresh() reloads those still stored."""
+        if key.startswith(VECTOR_PREFIX):
+            user_id = int(key[len(VECTOR_PREFIX):])
+            self.remove_user(user_id)
+            with self._lock:
+                self._reload_users.add(user_id)
+
+    def _reload(self, db: Session) -> None:
+        with self._lock:
+            users, self._reload_users = self._reload_users, set()
+            high_water = self._high_water
+        if not users:
+            return
+        rows = db.exec(
+            select(ReportVector.report_id, ReportVector.user_id, ReportVector.vector)
+            .where(ReportVector.user_id.in_(users), ReportVector.id <= high_water)
+        ).all()
+        with self._lock:
+            # a user invalidated again meanwhile is reloaded by the next refresh instead
+            rows = [r for r in rows if r[1] not in self._reload_users]
+            if rows:
+                vecs = np.frombuffer(b"".join(r[2] for r in rows), dtype=DTYPE).reshape(-1, DIMS)
+                self._append(np.array([r[0] for r in rows]), np.array([r[1] for r in rows]), vecs)
+
+    def refresh(self, db: Session, batch_size: int = 100000) -> int:
+        """Load vectors stored since the last load (by any worker); returns how many."""
+        self._reload(db)
+        loaded = 0
+        while True:
+            rows = db.exec(
+                select(ReportVector.id, ReportVector.report_id, ReportVector.user_id, ReportVector.vector)
+                .where(ReportVector.id > self._high_water)
+                .order_by(ReportVector.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            with self._lock:
+                keep = [r for r in rows if r[1] not in self._added]
+                self._added.difference_update(r[1] for r in rows)
+                if keep:
+                    vecs = np.frombuffer(b"".join(r[3] for r in keep), dtype=DTYPE).reshape(-1, DIMS)
+                    self._append(np.array([r[1] for r in keep]), np.array([r[2] for r in keep]), vecs)
+                self._high_water = rows[-1][0]
+            loaded += len(rows)
+            if len(rows) < batch_size:
+                break
+        self._last_refresh = time.monotonic()
+        return loaded
+
+    def load(self, db: Session) -> None:
+        """Rebuild from the ReportVector table, first backfilling reports stored without a vector."""
+        backfill_report_vectors(db)
+        with self._lock:
+            self._reset()
+        self.refresh(db)
+        logger.info(f"Vector index loaded: {self.size} reports")
+
+    def maybe_refresh(self, db: Session) -> None:
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        try:
+            self.refresh(db)
+        except Exception as e:
+            logger.error(f"Vector index refresh failed: {e}")
+
+    def knn(self, vec: Sequence[float], k: int = 10, exclude_user: Optional[int] = None) -> List[Tuple[int, float, List[float]]]:
+        """The k nearest live reports as (report_id, distance, vector), nearest first."""
+        with self._lock:
+            n = self._n
+            vecs, norms, ids, alive, users = self._vecs[:n], self._norms[:n], self._ids[:n], self._alive[:n], self._users[:n]
+        if not n:
+            return []
+        q = np.asarray(vec, dtype=np.float32)
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2
+        d2 = vecs @ (q * -2.0)
+        d2 += norms
+        d2 += float(q @ q)
+        np.maximum(d2, 0.0, out=d2)
+        d2[~alive] = np.inf
+        if exclude_user is not None:
+            d2[users == exclude_user] = np.inf
+        k = min(k, n)
+        top = np.argpartition(d2, k - 1)[:k]
+        top = top[np.argsort(d2[top])]
+        return [(int(ids[i]), float(np.sqrt(d2[i])), vecs[i].tolist()) for i in top if np.isfinite(d2[i])]
+
+    def archetype(self, vec: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """The cluster vec belongs to: id, population share and centroid traits."""
+        with self._lock:
+            centroids, sizes, total = self.centroids, self._cluster_sizes.copy(), self.size
+        if centroids is None or not total:
+            return None
+        i = int(nearest_centroid(np.asarray([vec], dtype=np.float32), centroids)[0])
+        return {
+            "cluster": i,
+            "share": round(float(sizes[i]) / total, 4),
+            "centroid": vector_scores(centroids[i]),
+        }
+
+def vector_scores(vec: Sequence[float]) -> Dict[str, Dict[str, float]]:
+    """A trait vector shaped like report scores."""
+    out: Dict[str, Dict[str, float]] = {}
+    for (group, name), x in zip(TRAIT_KEYS, vec):
+        out.setdefault(group, {})[name] = round(float(x), 1)
+    return out
+
+def backfill_report_vectors(db: Session, batch_size: int = 5000) -> int:
+    """Store vectors for reports written before vectors existed; returns how many."""
+    done = 0
+    last_id = 0
+    while True:
+        rows = db.exec(
+            select(Report.id, Report.user_id, Report.result_json)
+            .outerjoin(ReportVector, ReportVector.report_id == Report.id)
+            .where(ReportVector.id.is_(None), Report.id > last_id)
+            .order_by(Report.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return done
+        stored = 0
+        for report_id, user_id, result_json in rows:
+            try:
+                vec = trait_vector(json.loads(result_json).get("scores", {}))
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                logger.warning(f"Report {report_id} has no usable scores, not indexed: {e}")
+                continue
+            db.add(ReportVector(report_id=report_id, user_id=user_id, vector=pack_vector(vec)))
+            stored += 1
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker backfilled some of these rows first (every worker
+            # runs this at startup). Re-query the same range: rows that now
+            # have a vector drop out, so this still makes progress.
+            db.rollback()
+            continue
+        last_id = rows[-1][0]
+        done += stored
+
+vector_index = VectorIndex(clusters=settings.SIMILARITY_CLUSTERS, refresh_interval=settings.SIMILARITY_REFRESH_SECONDS)
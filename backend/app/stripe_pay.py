@@ -1,5 +1,4 @@
 from __future__ import annotations
-import stripe
 from typing import Optional
 from .config import settings
 
@@ -7,11 +6,14 @@ def stripe_configured() -> bool:
     return bool(settings.STRIPE_SECRET_KEY)
 
 def init_stripe():
+    """Import and configure the Stripe SDK on first use (keeps cold start light)."""
+    import stripe
     if settings.STRIPE_SECRET_KEY:
         stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
 
 def create_checkout_session(customer_email: str, price_id: str, success_url: str, cancel_url: str, metadata: dict = None) -> str:
-    init_stripe()
+    stripe = init_stripe()
     session = stripe.checkout.Session.create(
         mode="subscription",
         customer_email=customer_email,
@@ -1,8 +1,8 @@
 from __future__ import annotations
-import stripe
 from fastapi import Request, HTTPException
 from sqlmodel import Session, select
 from typing import Dict, Any
+from .cache import get_cache, subscription_key
 from .config import settings
 from .models import Subscription, User, StripeEvent
 import logging
@@ -13,7 +13,9 @@ def verify_webhook_signature(payload: bytes, sig_header: str) -> Dict[str, Any]:
     """Verify Stripe webhook signature and return event dict."""
     if not settings.STRIPE_WEBHOOK_SECRET:
         raise HTTPException(status_code=500, detail="Webhook secret not configured")
-    
+
+    import stripe  # lazy: only webhook traffic pays for the SDK import
+
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
@@ -69,6 +71,8 @@ def handle_checkout_session_completed(db: Session, session: Dict[str, Any]) -> N
     
     db.add(sub)
     db.commit()
+    # Every worker drops its cached plan for this user
+    get_cache().invalidate(subscription_key(sub.user_id))
     logger.info(f"Checkout completed for user {user.email}, plan {plan}")
 
 def handle_subscription_updated(db: Session, subscription: Dict[str, Any]) -> None:
@@ -91,6 +95,7 @@ def handle_subscription_updated(db: Session, subscription: Dict[str, Any]) -> No
     
     db.add(sub)
     db.commit()
+    get_cache().invalidate(subscription_key(sub.user_id))
     logger.info(f"Subscription {subscription_id} updated to status {status}")
 
 def handle_subscription_deleted(db: Session, subscription: Dict[str, Any]) -> None:
@@ -106,6 +111,7 @@ def handle_subscription_deleted(db: Session, subscription: Dict[str, Any]) -> No
     sub.plan = "free"
     db.add(sub)
     db.commit()
+    get_cache().invalidate(subscription_key(sub.user_id))
     logger.info(f"Subscription {subscription_id} deleted")
 
 def process_webhook_event(db: Session, event: Dict[str, Any]) -> None:
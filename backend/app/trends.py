@@ -0,0 +1,149 @@
+from __future__ import annotations
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlmodel import Session, select
+from .analysis_engine import TRAIT_KEYS, trait_vector
+from .models import Report, UserTrend
+
+# Max points kept in the downsampled series. When full, adjacent points are
+# merged pairwise and every point covers twice as many reports ("stride").
+SERIES_POINTS = 64
+
+def _merge_point(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    n = a["n"] + b["n"]
+    return {
+        "t": max(a["t"], b["t"]),
+        "values": [round((x*a["n"] + y*b["n"]) / n, 2) for x, y in zip(a["values"], b["values"])],
+        "n": n,
+    }
+
+def _append_point(series: Dict[str, Any], at: datetime, vec: List[float]) -> None:
+    stride = series.setdefault("stride", 1)
+    points = series.setdefault("points", [])
+    point = {"t": at.isoformat(), "values": vec, "n": 1}
+    if points and points[-1]["n"] < stride:
+        points[-1] = _merge_point(points[-1], point)
+    else:
+        points.append(point)
+    if len(points) > SERIES_POINTS:
+        series["points"] = [
+            _merge_point(points[i], points[i + 1]) if i + 1 < len(points) else points[i]
+            for i in range(0, len(points), 2)
+        ]
+        series["stride"] = stride * 2
+
+def _fold(stats: Dict[str, Any], series: Dict[str, Any], n: int, vec: List[float], at: datetime) -> None:
+    """Fold the n-th report's trait vector into stats and series (in place)."""
+    for (group, name), x in zip(TRAIT_KEYS, vec):
+        s = stats.setdefault(group, {}).get(name)
+        if s is None:
+            s = {"mean": x, "min": x, "max": x, "last": x}
+        else:
+            s = {
+                "mean": s["mean"] + (x - s["mean"]) / n,
+                "min": min(s["min"], x),
+                "max": max(s["max"], x),
+                "last": x,
+            }
+        stats[group][name] = s
+    _append_point(series, at, vec)
+
+def _store(row: UserTrend, stats: Dict[str, Any], series: Dict[str, Any], n: int) -> None:
+    row.report_count = n
+    row.stats_json = json.dumps(stats, separators=(",", ":"))
+    row.series_json = json.dumps(series, separators=(",", ":"))
+    row.updated_at = datetime.utcnow()
+
+def _from_history(db: Session, user_id: int) -> UserTrend:
+    """
+    Aggregate row built from the user's stored reports, oldest first: the
+    backfill for users whose reports predate per-user trends. Reports not
+    yet flushed in this session are left out (no_autoflush); the caller
+    folds those in itself.
+    """
+    stats: Dict[str, Any] = {}
+    series: Dict[str, Any] = {}
+    n = 0
+    with db.no_autoflush:
+        rows = db.exec(
+            select(Report.result_json, Report.created_at)
+            .where(Report.user_id == user_id)
+            .order_by(Report.created_at, Report.id)
+            .execution_options(yield_per=500)
+        )
+        for result_json, created_at in rows:
+            try:
+                vec = trait_vector(json.loads(result_json).get("scores", {}))
+            except (KeyError, TypeError, ValueError):
+                continue  # malformed or pre-trait result; not part of the trends
+            n += 1
+            _fold(stats, series, n, vec, created_at)
+    row = UserTrend(user_id=user_id)
+    _store(row, stats, series, n)
+    return row
+
+def _insert_if_missing(db: Session, row: UserTrend) -> None:
+    """
+    INSERT ... ON CONFLICT (user_id) DO NOTHING: two first analyses of the
+    same user race to create the row; the loser keeps the winner's row.
+    """
+    values = {c: getattr(row, c) for c in ("user_id", "report_count", "stats_json", "series_json", "updated_at")}
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:  # pragma: no cover - no upsert; a concurrent first insert can still conflict
+        db.add(row)
+        db.flush()
+        return
+    db.execute(insert(UserTrend).values(**values).on_conflict_do_nothing(index_elements=["user_id"]))
+
+def _locked_row(db: Session, user_id: int) -> UserTrend:
+    """The user's aggregate row, locked for update; created (backfilled from stored reports) if missing."""
+    query = select(UserTrend).where(UserTrend.user_id == user_id).with_for_update()
+    row = db.exec(query).first()
+    if row is None:
+        _insert_if_missing(db, _from_history(db, user_id))
+        row = db.exec(query).one()
+    return row
+
+def update_trends(db: Session, user_id: int, scores: Dict[str, Any], at: datetime) -> None:
+    """Fold one report's scores into the user's aggregate row (caller commits)."""
+    with db.no_autoflush:  # a pending Report for these scores must not reach the backfill
+        row = _locked_row(db, user_id)
+    stats = json.loads(row.stats_json or "{}")
+    series = json.loads(row.series_json or "{}")
+    n = row.report_count + 1
+    _fold(stats, series, n, trait_vector(scores), at)
+    _store(row, stats, series, n)
+    db.add(row)
+
+def get_trends(db: Session, user_id: int) -> Dict[str, Any]:
+    """The user's trends; the first read for a user with older reports backfills (and commits) the row."""
+    row = db.exec(select(UserTrend).where(UserTrend.user_id == user_id)).first()
+    if row is None:
+        row = _from_history(db, user_id)
+        if row.report_count:
+            _insert_if_missing(db, row)
+            db.commit()
+    if not row.report_count:
+        return {"report_count": 0, "traits": {}, "series": {"stride": 1, "points": []}, "trait_order": [n for _, n in TRAIT_KEYS]}
+    stats = json.loads(row.stats_json)
+    traits = {
+        group: {name: {k: round(v, 1) for k, v in s.items()} for name, s in names.items()}
+        for group, names in stats.items()
+    }
+    series = json.loads(row.series_json)
+    return {
+        "report_count": row.report_count,
+        "traits": traits,
+        "series": {"stride": series.get("stride", 1), "points": series.get("points", [])},
+        "trait_order": [n for _, n in TRAIT_KEYS],
+    }
+
+def purge_user_trends(db: Session, user_id: int) -> None:
+    row = db.exec(select(UserTrend).where(UserTrend.user_id == user_id)).first()
+    if row:
+        db.delete(row)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Throughput of the analysis executor backends on large texts.
+
+    cd backend && python benchmarks/bench_executor.py [--tasks 32] [--kb 512]
+
+Prints analyses/second per backend and worker count. With the process
+backend throughput should scale with cores; inline/thread stay flat under
+the GIL.
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.analysis_engine import analyze
+from app.executor import AnalysisExecutor
+
+SAMPLE = (
+    "I really love building systems. Maybe the API will deploy cleanly, "
+    "perhaps not! Always test the docker image; never skip auth. "
+)
+
+def make_text(kb: int) -> str:
+    return (SAMPLE * (kb * 1024 // len(SAMPLE) + 1))[: kb * 1024]
+
+def bench(backend: str, workers: int, tasks: int, text: str) -> float:
+    ex = AnalysisExecutor(backend=backend, workers=workers, queue_size=tasks, timeout=600)
+    try:
+        start = time.perf_counter()
+        futures = [ex.submit(analyze, text, {}) for _ in range(tasks)]
+        for f in futures:
+            f.result()
+        return tasks / (time.perf_counter() - start)
+    finally:
+        ex.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tasks", type=int, default=32)
+    ap.add_argument("--kb", type=int, default=512, help="size of each text in KiB")
+    args = ap.parse_args()
+
+    text = make_text(args.kb)
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    print(f"{args.tasks} analyses of {args.kb} KiB each, {cpus} CPUs")
+    print(f"{'backend':<8} {'workers':>7} {'analyses/s':>11} {'speedup':>8}")
+    for backend in ("inline", "thread", "process"):
+        base = None
+        for workers in ([1] if backend == "inline" else counts):
+            rate = bench(backend, workers, args.tasks, text)
+            base = base or rate
+            print(f"{backend:<8} {workers:>7} {rate:>11.2f} {rate / base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+/reports serialization: decode + ReportOut + JSON encode (old path) versus
+splicing stored result_json into the response bytes (new path).
+
+    cd backend && python benchmarks/bench_reports_serialization.py [--reports 1000]
+"""
+from __future__ import annotations
+import argparse, json, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from app.analysis_engine import analyze
+from app.responses import report_list_bytes
+from app.schemas import ReportOut
+
+def old_path(rows):
+    out = [ReportOut(report_id=i, session_id=s, result=json.loads(rj)) for i, s, rj in rows]
+    # what FastAPI's response_model handling + JSONResponse.render do
+    validated = [ReportOut.model_validate(r) for r in out]
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def timed(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reports", type=int, nargs="*", default=[10, 100, 1000, 5000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    result_json = json.dumps(analyze("I really love the API. Maybe docker, perhaps yaml!" * 20, {"novelty_seeking": 5}))
+    print(f"result_json size: {len(result_json)} bytes")
+    print(f"{'reports':>8} {'old ms':>9} {'splice ms':>10} {'speedup':>8}")
+    for n in args.reports:
+        rows = [(i, i, result_json) for i in range(n)]
+        assert json.loads(old_path(rows)) == json.loads(report_list_bytes(rows))
+        old = timed(old_path, rows, args.repeat)
+        new = timed(report_list_bytes, rows, args.repeat)
+        print(f"{n:>8} {old * 1000:>9.2f} {new * 1000:>10.2f} {old / new:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Similar-profile index: build from packed vectors, k-NN and archetype
+queries, at 1M reports by default.
+
+    cd backend && python benchmarks/bench_similarity.py [--vectors 1000000]
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+from app.similarity import DIMS, DTYPE, VectorIndex
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vectors", type=int, default=1_000_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = rng.uniform(0, 100, (args.vectors, DIMS)).astype(np.float32)
+    users = rng.integers(0, args.vectors // 5 + 1, args.vectors)
+    packed = [data[i].astype(DTYPE).tobytes() for i in range(args.vectors)]  # what the table holds
+
+    index = VectorIndex(clusters=8)
+    start = time.perf_counter()
+    for lo in range(0, args.vectors, 100_000):  # refresh() batch size
+        vecs = np.frombuffer(b"".join(packed[lo:lo + 100_000]), dtype=DTYPE).reshape(-1, DIMS)
+        with index._lock:
+            index._append(np.arange(lo + 1, lo + 1 + len(vecs)), users[lo:lo + len(vecs)], vecs)
+    index.wait_for_training(timeout=600)
+    build = time.perf_counter() - start
+    print(f"build {args.vectors} vectors (incl. k-means): {build:.2f}s, {index._vecs.nbytes / 1e6:.0f} MB")
+
+    start = time.perf_counter()
+    for i in range(args.queries):
+        index.add(args.vectors + i + 1, 0, data[i])
+    print(f"incremental add: {(time.perf_counter() - start) / args.queries * 1e6:.1f} us/vector")
+
+    for name, fn in [
+        ("knn", lambda q: index.knn(q, args.k, exclude_user=int(users[0]))),
+        ("archetype", lambda q: index.archetype(q)),
+    ]:
+        times = []
+        for q in data[:args.queries]:
+            start = time.perf_counter()
+            fn(q)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"{name:>9}: p50 {times[len(times) // 2] * 1000:.2f} ms, p95 {times[int(len(times) * 0.95)] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
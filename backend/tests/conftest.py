@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, SQLModel
+from sqlalchemy.pool import NullPool
+from app import cache
+from app.main import app
+from app.db import get_session, get_async_session, async_session_dependency, create_async_engine_for
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    """A new process cache per test: rate-limit counters and cached plans do not leak between tests."""
+    monkeypatch.setattr(cache, "_cache", None)
+
+@pytest.fixture(name="session")
+def session_fixture(tmp_path):
+    # A file database, so the sync and async (aiosqlite) engines see the same data.
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'atlas.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+@pytest.fixture(name="client")
+def client_fixture(session: Session):
+    def get_session_override():
+        return session
+
+    app.dependency_overrides[get_session] = get_session_override
+    async_engine = create_async_engine_for(str(session.get_bind().url), poolclass=NullPool)
+    app.dependency_overrides[get_async_session] = async_session_dependency(async_engine)
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.admission import AdmissionController, AdmissionRejected, AdmissionTimeout, parse_tier_map, plan_tier
+
+def _hold(ctrl, tier, release, started=None, order=None):
+    with ctrl.slot(tier):
+        if order is not None:
+            order.append(tier)
+        if started is not None:
+            started.release()
+        release.wait(5)
+
+def _spawn(*args):
+    t = threading.Thread(target=_hold, args=args, daemon=True)
+    t.start()
+    return t
+
+def test_plan_tier_and_tier_maps():
+    assert plan_tier({"plan": "pro_yearly", "status": "active"}) == "pro"
+    assert plan_tier({"plan": "pro_monthly", "status": "canceled"}) == "free"
+    assert parse_tier_map("pro=8, free=0", int) == {"pro": 8, "free": 0}
+
+def test_free_traffic_cannot_take_reserved_pro_slots():
+    ctrl = AdmissionController(capacity=3, reserved={"pro": 1}, queue_timeout=0.05)
+    release, started = threading.Event(), threading.Semaphore(0)
+    threads = [_spawn(ctrl, "free", release, started) for _ in range(2)]
+    for _ in threads:
+        assert started.acquire(timeout=2)
+    with pytest.raises(AdmissionTimeout):
+        with ctrl.slot("free"):
+            pass
+    with ctrl.slot("pro"):  # the reserved slot is still free
+        assert ctrl.stats()["tiers"]["pro"]["running"] == 1
+    release.set()
+    for t in threads:
+        t.join(2)
+    stats = ctrl.stats()
+    assert stats["shared_free"] == 2 and stats["tiers"]["free"]["timeouts"] == 1
+
+def test_waiters_are_served_in_weighted_fair_order():
+    ctrl = AdmissionController(capacity=1, weights={"pro": 3, "free": 1})
+    blocker, started = threading.Event(), threading.Semaphore(0)
+    first = _spawn(ctrl, "free", blocker, started)
+    assert started.acquire(timeout=2)
+    order, go = [], threading.Event()
+    go.set()
+    waiters = []
+    for tier in ["free"] * 4 + ["pro"] * 6:
+        waiters.append(_spawn(ctrl, tier, go, None, order))
+        time.sleep(0.01)
+    assert ctrl.queue_depth() == 10
+    blocker.set()
+    for t in [first, *waiters]:
+        t.join(2)
+    # pro gets ~3 admissions per free one while both are waiting
+    assert order[:2] == ["pro", "pro"]
+    assert order[:8].count("pro") == 6 and order[8:] == ["free", "free"]
+    assert ctrl.stats()["tiers"]["pro"]["queue_wait_p95"] > 0
+
+def test_low_priority_tier_is_shed_while_slo_breached():
+    ctrl = AdmissionController(capacity=4, slo_seconds=0.01, slo_window=0.2)
+    with ctrl.slot("pro"):
+        ctrl.observe(0.03)
+    assert ctrl.breached
+    with pytest.raises(AdmissionRejected):
+        with ctrl.slot("free"):
+            pass
+    with ctrl.slot("pro"):
+        pass
+    assert ctrl.stats()["tiers"]["free"]["shed"] == 1
+    # with no traffic at all, the slow sample ages out and free is admitted again
+    time.sleep(0.25)
+    with ctrl.slot("free"):
+        pass
+    assert not ctrl.breached
+
+def test_time_in_slot_is_not_slo_latency():
+    ctrl = AdmissionController(capacity=1, slo_seconds=0.01)
+    with ctrl.slot("pro"):
+        time.sleep(0.03)  # e.g. polish; only observe()d analysis time counts
+    assert not ctrl.breached
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    ctrl = AdmissionController(capacity=1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with ctrl.aslot("pro"):
+                await release.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        assert ctrl.queue_depth() == 1
+        queued.cancel()  # client disconnect while queued
+        await asyncio.sleep(0.01)
+        release.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        async with ctrl.aslot("pro"):
+            pass
+
+    asyncio.run(main())
+    stats = ctrl.stats()
+    assert stats["shared_free"] == 1 and stats["tiers"]["pro"]["running"] == 0
+    assert stats["tiers"]["pro"]["timeouts"] == 0
+
+def test_async_slot_waits_without_blocking_loop():
+    ctrl = AdmissionController(capacity=1)
+
+    async def main():
+        order = []
+
+        async def job(name, hold):
+            async with ctrl.aslot("pro"):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(job("a", 0.05), job("b", 0), job("c", 0))
+        return order
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+    assert ctrl.stats()["tiers"]["pro"]["admitted"] == 3
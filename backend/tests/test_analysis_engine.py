@@ -0,0 +1,89 @@
+import tracemalloc
+from app.analysis_engine import (
+    analyze,
+    analyze_stats,
+    analyze_stream,
+    iter_decoded,
+    iter_text_chunks,
+    scan_text,
+    TextStats,
+    NARRATIVE_TEMPLATES,
+    TRAIT_KEYS,
+    render_templates,
+    select_templates,
+)
+
+SURVEY_HIGH = {
+    "novelty_seeking": 5,
+    "structure_preference": 5,
+    "social_energy": 5,
+    "sensory_sensitivity": 5,
+    "hyperfocus": 5,
+}
+
+def test_narrative_carries_template_ids():
+    """Rendered hypotheses/suggestions line up one-to-one with their template ids."""
+    result = analyze("I deploy the API with docker. Really, very excited!", SURVEY_HIGH)
+    narrative = result["narrative"]
+    assert narrative["hypotheses"] == [NARRATIVE_TEMPLATES[t] for t in narrative["hypothesis_ids"]]
+    assert narrative["suggestions"] == [NARRATIVE_TEMPLATES[t] for t in narrative["suggestion_ids"]]
+    assert "hyp.systems_thinking.high" in narrative["hypothesis_ids"]
+    assert "sug.extraversion.high" in narrative["suggestion_ids"]
+
+def test_balanced_fallback_when_no_rule_fires():
+    """A mid-range vector only gets the balanced hypothesis and the base suggestions."""
+    hyp_ids, sug_ids = select_templates([50.0] * len(TRAIT_KEYS))
+    assert hyp_ids == ["hyp.balanced"]
+    assert sug_ids == ["sug.two_pass", "sug.reduce_inputs", "sug.goal_constraints"]
+
+def test_render_templates_with_localized_table():
+    """A partial translation table overrides known ids and falls back to English."""
+    localized = {"hyp.balanced": "Perfil equilibrado."}
+    assert render_templates(["hyp.balanced", "sug.two_pass"], localized) == [
+        "Perfil equilibrado.",
+        NARRATIVE_TEMPLATES["sug.two_pass"],
+    ]
+
+def test_appended_text_matches_full_rescan():
+    """Feeding stored stats an appended paragraph scores exactly like the whole text."""
+    first, appended = "I really love the API. Maybe docke", "r deploys are calm!\nAlways"
+    stats = TextStats.from_dict(scan_text(first).to_dict())  # round-trip through storage
+    stats.feed(appended)
+    assert analyze_stats(stats, SURVEY_HIGH) == analyze(first + appended, SURVEY_HIGH)
+
+def test_streaming_matches_one_shot_across_chunk_boundaries():
+    """Words, sentences and multi-byte characters split across chunks are joined correctly."""
+    text = "Très calm… I REALLY love docker!! Maybe. Perhaps json — yaml; ok?" * 3
+    survey = {"hyperfocus": 4}
+    expected = analyze(text, survey)
+    for size in (1, 2, 3, 7, 64):
+        assert analyze_stream(iter_text_chunks(text, size), survey) == expected
+    raw = text.encode("utf-8")
+    byte_chunks = (raw[i:i + 5] for i in range(0, len(raw), 5))
+    assert analyze_stream(iter_decoded(byte_chunks), survey) == expected
+
+def _peak_stream_memory(n_blocks: int) -> int:
+    block = "I really love this api. Maybe tomorrow, perhaps not! " * 200
+    tracemalloc.start()
+    try:
+        analyze_stream((block for _ in range(n_blocks)), {})
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_streaming_peak_memory_independent_of_length():
+    """Peak memory tracks the chunk size, not the stream length (~100 KB vs ~2 MB)."""
+    small, large = _peak_stream_memory(10), _peak_stream_memory(200)
+    assert large < small * 1.5
+
+def test_scan_text_peak_memory_is_bounded():
+    """scan_text (used by /intake, analyze(), rescore) chunks internally: a 2 MB text needs ~one chunk of scratch."""
+    text = "I really love this api. Maybe tomorrow, perhaps not! " * 40000
+    tracemalloc.start()
+    try:
+        stats = scan_text(text)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 3 * 1024 * 1024
+    assert stats.to_dict() == scan_text(text[:1000000]).feed(text[1000000:]).to_dict()
@@ -0,0 +1,128 @@
+import time
+import pytest
+import fakeredis
+from app.cache import Cache, MemoryCache, RedisCache, SQLiteCache, TieredCache, versioned_key
+
+def _redis(server: fakeredis.FakeServer) -> RedisCache:
+    """A RedisCache on an in-process fake server; caches on the same server act as workers of one fleet."""
+    return RedisCache("redis://fake", client=fakeredis.FakeRedis(server=server))
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCache()
+    if request.param == "redis":
+        return _redis(fakeredis.FakeServer())
+    return SQLiteCache(str(tmp_path / "cache.db"))
+
+def test_get_set_delete_and_ttl(cache):
+    cache.set("a", {"plan": "pro_monthly"})
+    assert cache.get("a") == {"plan": "pro_monthly"}
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.set("short", 1, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("short") is None
+
+def test_backend_missing_an_operation_fails_at_construction():
+    class NoCounter(Cache):
+        def get(self, key):
+            return None
+
+        def set(self, key, value, ttl=None):
+            pass
+
+        def delete(self, key):
+            pass
+
+    with pytest.raises(TypeError, match="incr"):
+        NoCounter()
+
+def test_incr_is_a_fixed_window_counter(cache):
+    assert [cache.incr("rl", ttl=0.1) for _ in range(3)] == [1, 2, 3]
+    time.sleep(0.15)
+    assert cache.incr("rl", ttl=0.1) == 1
+
+def test_sqlite_counter_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    a, b = SQLiteCache(path), SQLiteCache(path)
+    a.incr("rl", ttl=60)
+    assert b.incr("rl", ttl=60) == 2
+
+def test_invalidation_fans_out_to_other_workers_near_caches(tmp_path):
+    """Two workers with near caches over one shared file; an invalidation in one evicts both."""
+    path = str(tmp_path / "cache.db")
+    worker_a, worker_b = TieredCache(SQLiteCache(path)), TieredCache(SQLiteCache(path))
+    worker_a.set("subscription:1", {"plan": "free"})
+    assert worker_b.get("subscription:1") == {"plan": "free"}  # now held in b's local tier
+
+    seen = []
+    worker_b.subscribe(seen.append)
+    worker_a.invalidate("subscription:1")
+    worker_b.shared.poll()  # what b's listener thread does every poll_interval
+
+    assert seen == ["subscription:1"]
+    assert worker_b.get("subscription:1") is None
+
+def test_redis_listener_fans_out_invalidations_to_other_workers():
+    """Two workers with near caches over one Redis; the pub/sub listener evicts the other's copy."""
+    server = fakeredis.FakeServer()
+    worker_a, worker_b = TieredCache(_redis(server)), TieredCache(_redis(server))
+    worker_b.start_listener()
+    try:
+        key = versioned_key(worker_a, "subscription:1")
+        assert versioned_key(worker_b, "subscription:1") == key  # the version is shared
+        worker_a.set(key, {"plan": "free"})
+        assert worker_b.get(key) == {"plan": "free"}
+        assert worker_b.local.get("subscription:1") is not None  # the version is held locally too
+
+        seen = []
+        worker_b.subscribe(seen.append)
+        worker_a.invalidate("subscription:1")
+        deadline = time.monotonic() + 5
+        while not seen and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert seen == ["subscription:1"]
+        assert worker_b.local.get("subscription:1") is None
+        assert versioned_key(worker_b, "subscription:1") != key  # b starts a new version
+    finally:
+        worker_b.close()
+
+def test_versioned_key_drops_a_stale_read_then_set(cache):
+    """A reader that loaded the old plan before an invalidation cannot re-cache it."""
+    key = versioned_key(cache, "subscription:1")
+    stale = {"plan": "free"}  # read from the database before the upgrade
+    cache.invalidate("subscription:1")  # webhook: upgrade committed
+    cache.set(key, stale, ttl=300)  # the slow reader's set lands afterwards
+    fresh = versioned_key(cache, "subscription:1")
+    assert fresh != key and cache.get(fresh) is None  # next read goes to the database
+    assert versioned_key(cache, "subscription:1") == fresh
+
+def test_rate_limit_counts_through_a_blocking_cache_off_the_loop(tmp_path):
+    import threading
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.middleware import RateLimitMiddleware
+
+    shared = SQLiteCache(str(tmp_path / "cache.db"))
+    threads = []
+    real_incr = shared.incr
+
+    def incr(key, ttl):
+        threads.append(threading.current_thread())
+        return real_incr(key, ttl)
+
+    shared.incr = incr
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, rpm=2, cache=TieredCache(shared))
+
+    @app.get("/ping")
+    async def ping():
+        return {"thread": threading.current_thread().name}
+
+    client = TestClient(app)
+    responses = [client.get("/ping") for _ in range(3)]
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    loop_thread = responses[0].json()["thread"]
+    assert all(t.name != loop_thread for t in threads)
@@ -0,0 +1,7 @@
+from app.db import async_database_url
+
+def test_async_database_url_swaps_in_async_driver():
+    assert async_database_url("sqlite:///./data/atlas.db") == "sqlite+aiosqlite:///./data/atlas.db"
+    assert async_database_url("postgresql://u:p@db/atlas") == "postgresql+asyncpg://u:p@db/atlas"
+    assert async_database_url("postgresql+psycopg2://u:p@db/atlas") == "postgresql+asyncpg://u:p@db/atlas"
+    assert async_database_url("postgresql+asyncpg://u:p@db/atlas") == "postgresql+asyncpg://u:p@db/atlas"
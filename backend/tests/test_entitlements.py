@@ -1,34 +1,8 @@
-import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, create_engine, SQLModel
-from sqlmodel.pool import StaticPool
-from app.main import app
-from app.db import get_session
+from sqlmodel import Session
 from app.models import User, Subscription
 from app.security import hash_password
 
-# Test database setup
-@pytest.fixture(name="session")
-def session_fixture():
-    engine = create_engine(
-        "sqlite:///:memory:",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
-        yield session
-
-@pytest.fixture(name="client")
-def client_fixture(session: Session):
-    def get_session_override():
-        return session
-
-    app.dependency_overrides[get_session] = get_session_override
-    client = TestClient(app)
-    yield client
-    app.dependency_overrides.clear()
-
 def test_free_user_cannot_create_intake(client: TestClient, session: Session):
     """Free users should not be able to create intakes in production mode."""
     # Create user
@@ -76,3 +50,39 @@ def test_subscription_status_validation():
     
     sub.status = "canceled"
     assert sub.status == "canceled"
+
+def test_principal_cache_is_not_read_on_the_event_loop(client: TestClient, monkeypatch):
+    """/me, /intake and /analyze do their cache round trips in the threadpool, not on the loop."""
+    import asyncio
+    from app import main
+    from app.cache import MemoryCache
+
+    class RecordingCache(MemoryCache):
+        def __init__(self):
+            super().__init__()
+            self.on_loop = []
+
+        def _record(self, op):
+            try:
+                asyncio.get_running_loop()
+                self.on_loop.append(op)
+            except RuntimeError:
+                pass
+
+        def get(self, key):
+            self._record("get")
+            return super().get(key)
+
+        def set(self, key, value, ttl=None):
+            self._record("set")
+            super().set(key, value, ttl)
+
+    cache = RecordingCache()
+    monkeypatch.setattr(main, "get_cache", lambda: cache)
+    token = client.post("/auth/register", json={"email": "loop@example.com", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me", headers=headers).status_code == 200
+    intake = client.post("/intake", json={"consent": True, "free_text": "hello"}, headers=headers)
+    if intake.status_code == 200:  # DEMO_MODE; otherwise the free plan gets a 402 after the lookup
+        client.post(f"/analyze/{intake.json()['session_id']}", headers=headers)
+    assert cache.on_loop == []
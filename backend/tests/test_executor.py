@@ -0,0 +1,42 @@
+import threading
+import time
+import pytest
+from app.analysis_engine import analyze
+from app.executor import AnalysisExecutor, AnalysisBusy, AnalysisTimeout
+
+TEXT = "I really love the API. Maybe docker, perhaps yaml!"
+
+@pytest.mark.parametrize("backend", ["inline", "thread", "process"])
+def test_backends_return_engine_result(backend):
+    ex = AnalysisExecutor(backend=backend, workers=1, queue_size=2, timeout=60)
+    try:
+        assert ex.run(analyze, TEXT, {}) == analyze(TEXT, {})
+        assert ex.stats()["in_flight"] == 0
+    finally:
+        ex.shutdown()
+
+def test_bounded_queue_rejects_when_full():
+    """workers + queue_size tasks may be outstanding; the next one is refused."""
+    release = threading.Event()
+    ex = AnalysisExecutor(backend="thread", workers=1, queue_size=1, timeout=5)
+    try:
+        held = [ex.submit(release.wait) for _ in range(2)]
+        with pytest.raises(AnalysisBusy):
+            ex.submit(release.wait)
+        release.set()
+        for f in held:
+            f.result()
+        assert ex.stats()["rejected"] == 1
+        assert ex.run(analyze, TEXT, {})  # capacity is returned
+    finally:
+        release.set()
+        ex.shutdown()
+
+def test_task_timeout():
+    ex = AnalysisExecutor(backend="thread", workers=1, queue_size=1, timeout=0.05)
+    try:
+        with pytest.raises(AnalysisTimeout):
+            ex.run(time.sleep, 0.5)
+        assert ex.stats()["timeouts"] == 1
+    finally:
+        ex.shutdown()
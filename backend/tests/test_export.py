@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app.config import settings
+from app.export import COLUMNS, iter_export
+from app.models import Report
+
+def _analyzed_user(client: TestClient, email: str) -> dict:
+    token = client.post("/auth/register", json={"email": email, "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = client.post("/intake", json={"consent": True, "free_text": "I love docker."}, headers=headers).json()["session_id"]
+    report = client.post(f"/analyze/{session_id}", headers=headers).json()
+    return {"headers": headers, "report": report}
+
+def _seed_reports(session: Session, n: int) -> None:
+    result = json.dumps({"scores": {"big_five": {"openness": 61.5}, "style_signals": {"intensity": 12.0}}, "model_version": "v1"})
+    for i in range(n):
+        session.add(Report(user_id=1 + i % 3, session_id=i + 1, result_json=result))
+    session.commit()
+
+def test_csv_and_ndjson_export_flatten_scores(client: TestClient):
+    alice = _analyzed_user(client, "alice@example.com")
+    _analyzed_user(client, "bob@example.com")
+    scores = alice["report"]["result"]["scores"]
+
+    response = client.get("/reports/export?format=csv", headers=alice["headers"])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1 and list(rows[0]) == COLUMNS
+    assert float(rows[0]["big_five_openness"]) == scores["big_five"]["openness"]
+    assert float(rows[0]["style_signals_intensity"]) == scores["style_signals"]["intensity"]
+
+    response = client.get("/reports/export?format=ndjson", headers=alice["headers"])
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["report_id"] for line in lines] == [alice["report"]["report_id"]]
+    assert lines[0]["model_version"] == "v1"
+
+    assert client.get("/reports/export?format=xml", headers=alice["headers"]).status_code == 400
+
+def test_admin_export_requires_admin_email(client: TestClient, monkeypatch):
+    alice = _analyzed_user(client, "alice@example.com")
+    _analyzed_user(client, "bob@example.com")
+    assert client.get("/admin/reports/export", headers=alice["headers"]).status_code == 403
+
+    monkeypatch.setattr(settings, "ADMIN_EMAILS", "ops@example.com, Alice@example.com")
+    response = client.get("/admin/reports/export?format=ndjson", headers=alice["headers"])
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 2
+
+def test_export_streams_in_batches(session: Session):
+    _seed_reports(session, 25)
+    chunks = list(iter_export(Session(session.get_bind()), "ndjson", batch_size=10))
+    assert [c.count(b"\n") for c in chunks] == [10, 10, 5]
+    chunks = list(iter_export(Session(session.get_bind()), "csv", user_id=2, batch_size=4))
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert [int(r["session_id"]) for r in rows] == [2, 5, 8, 11, 14, 17, 20, 23]
+    assert rows[0]["big_five_conscientiousness"] == ""
+
+def test_parquet_export_round_trips(session: Session):
+    pq = pytest.importorskip("pyarrow.parquet")
+    _seed_reports(session, 7)
+    data = b"".join(iter_export(Session(session.get_bind()), "parquet", batch_size=3))
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column_names == COLUMNS
+    assert table.num_rows == 7
+    assert pq.ParquetFile(io.BytesIO(data)).num_row_groups == 3
+    assert table.column("big_five_openness").to_pylist() == [61.5] * 7
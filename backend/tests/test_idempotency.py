@@ -0,0 +1,68 @@
+import asyncio
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.models import Report, SessionIntake
+from app.idempotency import AsyncSingleFlight
+
+def _auth(client: TestClient) -> dict:
+    token = client.post("/auth/register", json={"email": "idem@example.com", "password": "password"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_intake_retry_with_same_key_creates_one_row(client: TestClient, session: Session):
+    headers = {**_auth(client), "Idempotency-Key": "intake-1"}
+    body = {"consent": True, "survey": {}, "free_text": "hello"}
+    first = client.post("/intake", json=body, headers=headers).json()
+    second = client.post("/intake", json=body, headers=headers).json()
+    assert first == second
+    assert len(session.exec(select(SessionIntake)).all()) == 1
+
+def test_analyze_retry_replays_stored_report(client: TestClient, session: Session):
+    auth = _auth(client)
+    session_id = client.post("/intake", json={"consent": True, "free_text": "hi"}, headers=auth).json()["session_id"]
+    headers = {**auth, "Idempotency-Key": "analyze-1"}
+    first = client.post(f"/analyze/{session_id}", headers=headers).json()
+    second = client.post(f"/analyze/{session_id}", headers=headers).json()
+    assert first == second
+    assert len(session.exec(select(Report)).all()) == 1
+
+def test_key_reused_for_different_request_is_rejected(client: TestClient):
+    headers = {**_auth(client), "Idempotency-Key": "same"}
+    client.post("/intake", json={"consent": True, "free_text": "a"}, headers=headers)
+    response = client.post("/intake", json={"consent": True, "free_text": "b"}, headers=headers)
+    assert response.status_code == 422
+
+def test_async_single_flight_shares_one_execution():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "report"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["report"] * 4
+    assert calls == [1]
+
+def test_async_single_flight_shares_errors_and_releases_the_key():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    async def ok():
+        return "report"
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+        return results, await flight.do("k", ok)  # a finished call no longer coalesces
+
+    errors, after = asyncio.run(main())
+    assert calls == [1]
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert after == "report"
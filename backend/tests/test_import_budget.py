@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Cold-start budget for `import app.main`, in seconds. Override on slow CI
+# runners with IMPORT_BUDGET_SECONDS.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.75"))
+
+# SDKs that must only be imported on first use.
+LAZY_MODULES = ("openai", "stripe", "bcrypt", "jose")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+def _probe(extra_env=None):
+    env = dict(os.environ)
+    env.update(extra_env or {})
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_import_app_main_within_budget():
+    """Importing the API module must stay under the cold-start budget."""
+    result = _probe()
+    assert result["elapsed"] < IMPORT_BUDGET_SECONDS, (
+        f"import app.main took {result['elapsed']:.3f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    )
+
+def test_heavy_sdks_are_not_imported_at_startup():
+    """openai/stripe/bcrypt/jose load lazily, never as a side effect of importing the app."""
+    result = _probe({"OPENAI_POLISH_ENABLED": "false", "DEMO_MODE": "true"})
+    assert result["loaded"] == []
+
+def test_openai_not_loaded_when_polish_disabled():
+    """polish_narrative_async short-circuits before touching the openai SDK."""
+    code = (
+        "import asyncio, sys\n"
+        "from app.llm_polisher import polish_narrative_async\n"
+        "asyncio.run(polish_narrative_async({'scores': {}, 'narrative': {}}, None))\n"
+        "print('openai' in sys.modules)\n"
+    )
+    env = dict(os.environ, OPENAI_POLISH_ENABLED="false")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
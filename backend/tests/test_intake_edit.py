@@ -0,0 +1,49 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from app.analysis_engine import analyze
+
+def _auth(client: TestClient, email: str = "journal@example.com") -> dict:
+    token = client.post("/auth/register", json={"email": email, "password": "password"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_patch_append_rescores_from_stored_stats(client: TestClient):
+    """Appending text and changing a survey answer rescores like a fresh intake of the full text."""
+    headers = _auth(client)
+    body = {"consent": True, "survey": {"novelty_seeking": 2}, "free_text": "Day one. I really love the API"}
+    session_id = client.post("/intake", json=body, headers=headers).json()["session_id"]
+
+    patch = {"append_text": " docs.\nDay two: maybe calm, always curious!", "survey": {"novelty_seeking": 5}}
+    assert client.patch(f"/intake/{session_id}", json=patch, headers=headers).status_code == 200
+
+    report = client.post(f"/analyze/{session_id}", headers=headers).json()
+    expected = analyze(body["free_text"] + patch["append_text"], {"novelty_seeking": 5})
+    report["result"].pop("percentiles")
+    assert report["result"] == expected
+
+def test_patch_other_users_intake_is_404(client: TestClient):
+    owner = _auth(client, "owner@example.com")
+    session_id = client.post("/intake", json={"consent": True, "free_text": "hi"}, headers=owner).json()["session_id"]
+    other = _auth(client, "other@example.com")
+    response = client.patch(f"/intake/{session_id}", json={"append_text": "x"}, headers=other)
+    assert response.status_code == 404
+
+def test_intake_not_stored_when_scan_is_shed(client: TestClient, session: Session, monkeypatch):
+    """A 503 from the executor leaves no intake behind, so the retry creates exactly one."""
+    from sqlmodel import select
+    from app import main
+    from app.executor import AnalysisBusy
+    from app.models import IntakeStats, SessionIntake
+
+    class BusyExecutor:
+        async def run_async(self, fn, *args):
+            raise AnalysisBusy()
+
+    headers = _auth(client)
+    body = {"consent": True, "free_text": "I really love the API"}
+    with monkeypatch.context() as m:
+        m.setattr(main, "get_executor", lambda: BusyExecutor())
+        assert client.post("/intake", json=body, headers=headers).status_code == 503
+    assert session.exec(select(SessionIntake)).all() == []
+    assert client.post("/intake", json=body, headers=headers).status_code == 200
+    assert len(session.exec(select(SessionIntake)).all()) == 1
+    assert len(session.exec(select(IntakeStats)).all()) == 1
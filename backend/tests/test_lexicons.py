@@ -0,0 +1,35 @@
+import pytest
+from app.analysis_engine import analyze, analyze_stream, iter_text_chunks, scan_text
+from app.lexicons import LexiconMatcher, LexiconPackError, get_matcher
+
+def test_matcher_handles_exact_stems_and_phrases():
+    m = LexiconMatcher("test", {
+        "emotion": ["calm", "anxi*"],
+        "certainty": ["no doubt", "without a doubt"],
+    })
+    assert m.word_lexicons("calm") == ("emotion",)
+    assert m.word_lexicons("anxiously") == ("emotion",)
+    assert m.word_lexicons("anx") == ()
+    assert m.phrase_lexicons(["without", "a"], "doubt") == ("certainty",)
+    assert m.phrase_lexicons(["with", "no"], "doubt") == ("certainty",)
+    assert m.phrase_lexicons(["a"], "doubt") == ()
+
+def test_stems_inside_phrases_are_rejected():
+    with pytest.raises(LexiconPackError):
+        LexiconMatcher("bad", {"x": ["kind* of"]})
+
+def test_v1_pack_reproduces_builtin_lexicons():
+    assert get_matcher("v1").word_lexicons("docker") == ("technical",)
+    assert not get_matcher("v1").has_phrases
+
+def test_v2_phrases_and_stems_count_across_chunk_boundaries():
+    text = "I was worried, without a doubt, and kind of excited about kubernetes. " * 4
+    stats = scan_text(text, "v2").finalized()
+    assert stats.lexicon["certainty"] == 4  # "without a doubt"
+    assert stats.lexicon["modal"] == 4  # "kind of"
+    assert stats.lexicon["emotion"] == 8  # worr*, excit*
+    assert stats.lexicon["technical"] == 4  # kubernet*
+    expected = analyze(text, {}, "v2")
+    assert expected["model_version"] == "v2"
+    for size in (1, 3, 5, 11):
+        assert analyze_stream(iter_text_chunks(text, size), {}, "v2") == expected
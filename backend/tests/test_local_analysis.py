@@ -0,0 +1,55 @@
+import io
+import json
+import pytest
+from app.analysis_engine import analyze
+from app.executor import AnalysisExecutor
+from app.local_analysis import NdjsonWriter, ParquetWriter, detect_format, iter_records, run_local
+
+NDJSON = "\n".join([
+    json.dumps({"id": "a", "text": "I really love docker. Maybe.", "survey": {"hyperfocus": 5}}),
+    json.dumps({"free_text": "Painting calms me!"}),
+    "not json",
+    "",
+    json.dumps({"id": "d", "text": "Deadlines and structure help me focus."}),
+]) + "\n"
+
+def run(records, writer, chunk_size=2):
+    executor = AnalysisExecutor(backend="thread", workers=2, queue_size=1)
+    try:
+        return run_local(records, writer, executor, "v1", chunk_size=chunk_size)
+    finally:
+        executor.shutdown()
+
+def test_ndjson_in_order_with_error_rows():
+    out = io.BytesIO()
+    stats = run(iter_records(io.StringIO(NDJSON), "ndjson"), NdjsonWriter(out))
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["id"] for r in rows] == ["a", 2, 3, "d"]
+    assert rows[0] == json.loads(json.dumps({"id": "a", **analyze("I really love docker. Maybe.", {"hyperfocus": 5}, "v1")}))
+    assert rows[2]["error"].startswith("Invalid JSON")
+    assert stats["records"] == 4 and stats["errors"] == 1
+
+def test_csv_survey_columns():
+    raw = 'id,text,hyperfocus,survey\na,"Hello, world",4,\nb,I love docker,,"{""novelty_seeking"": 5}"\n'
+    records = list(iter_records(io.StringIO(raw), "csv"))
+    assert records[0] == {"id": "a", "text": "Hello, world", "survey": {"hyperfocus": "4"}}
+    assert records[1]["survey"] == {"novelty_seeking": 5}
+    out = io.BytesIO()
+    run(records, NdjsonWriter(out))
+    first = json.loads(out.getvalue().splitlines()[0])
+    assert first["scores"] == analyze("Hello, world", {"hyperfocus": 4}, "v1")["scores"]
+
+def test_parquet_output(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "out.parquet"
+    with open(path, "wb") as f:
+        run(iter_records(io.StringIO(NDJSON), "ndjson"), ParquetWriter(f), chunk_size=1)
+    table = pq.read_table(path)
+    assert table.num_rows == 4
+    assert table.column("id").to_pylist() == ["a", "2", "3", "d"]
+    assert table.column("big_five_openness").to_pylist()[2] is None
+
+def test_detect_format():
+    assert detect_format("x.jsonl", ("ndjson", "csv"), "csv") == "ndjson"
+    assert detect_format("x.CSV", ("ndjson", "csv"), "ndjson") == "csv"
+    assert detect_format("-", ("ndjson", "csv"), "ndjson") == "ndjson"
@@ -0,0 +1,44 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from app.middleware import BodySizeLimitMiddleware
+
+def _client(max_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+def test_body_within_limit_passes():
+    response = _client(16).post("/echo", content=b"x" * 16)
+    assert response.status_code == 200
+    assert response.json() == {"size": 16}
+
+def test_declared_content_length_over_limit_is_rejected():
+    response = _client(16).post("/echo", content=b"x" * 17)
+    assert response.status_code == 413
+
+def test_chunked_body_is_cut_off_while_streaming():
+    """Without Content-Length the running byte count still trips the limit."""
+    def body():
+        for _ in range(10):
+            yield b"x" * 8
+    response = _client(16).post("/echo", content=body())
+    assert response.status_code == 413
+
+def test_chunked_body_over_limit_on_a_real_route_is_413():
+    """FastAPI's body parser must not turn the cut-off into its own 400."""
+    from app.config import settings
+    from app.main import app
+
+    def body():
+        yield b'{"consent": true, "survey": {}, "free_text": "'
+        for _ in range(settings.MAX_REQUEST_BYTES // 65536 + 1):
+            yield b"x" * 65536
+        yield b'"}'
+    response = TestClient(app).post("/intake", content=body(), headers={"Content-Type": "application/json"})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body too large"}
@@ -0,0 +1,68 @@
+import json
+import random
+import pytest
+from sqlmodel import Session, create_engine, select, SQLModel
+from sqlmodel.pool import StaticPool
+from app.analysis_engine import TRAIT_KEYS, analyze
+from app.models import Report, TraitDistribution
+from app.percentiles import PercentileIndex, TraitHistogram
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def test_histogram_matches_exact_ranks():
+    rng = random.Random(3)
+    values = [round(rng.uniform(0, 100), 1) for _ in range(5000)]
+    h = TraitHistogram()
+    for v in values:
+        h.add(v)
+    ordered = sorted(values)
+    for probe in (0.0, 12.3, 50.0, 77.7, 100.0):
+        below = sum(1 for v in values if v < probe)
+        equal = values.count(probe)
+        assert h.percentile_of(probe) == round(100.0 * (below + 0.5 * equal) / len(values), 1)
+    for q in (10, 50, 90):
+        assert h.quantile(q) == ordered[-(-len(values) * q // 100) - 1]
+
+def test_workers_merge_through_snapshots(session: Session):
+    """Two workers flush deltas into the shared rows and both see the union."""
+    a, b = PercentileIndex(), PercentileIndex()
+    for i in range(30):
+        a.record(analyze("", {"novelty_seeking": 1 + i % 5})["scores"])
+    for i in range(20):
+        b.record(analyze("", {"social_energy": 1 + i % 5})["scores"])
+    a.flush(session)
+    b.flush(session)
+    a.load(session)
+    assert a.total == b.total == 50
+    assert a.summary() == b.summary()
+    block = a.percentiles(analyze("", {})["scores"])
+    assert set(block) == {"big_five", "style_signals"}
+    assert 0.0 <= block["big_five"]["openness"] <= 100.0
+
+def test_load_seeds_from_stored_reports(session: Session):
+    """A database with reports but no snapshot rows is seeded once from the reports."""
+    for i in range(12):
+        result = analyze("", {"novelty_seeking": 1 + i % 5})
+        session.add(Report(user_id=1, session_id=i, result_json=json.dumps(result)))
+    session.add(Report(user_id=1, session_id=99, result_json="{}"))  # malformed: skipped
+    session.commit()
+    a = PercentileIndex()
+    a.load(session)
+    assert a.total == 12
+    b = PercentileIndex()
+    b.load(session)  # rows exist now: loaded, not seeded again
+    assert b.total == 12
+    a.record(analyze("", {})["scores"])
+    a.flush(session)
+    b.load(session)
+    assert b.total == 13
+    assert len(session.exec(select(TraitDistribution)).all()) == len(TRAIT_KEYS)
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import pytest
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app import llm_polisher
+from app.analysis_engine import analyze
+from app.config import settings
+from app.db import create_async_engine_for
+from app.llm_polisher import PolishBatcher, polish_input, polish_narrative_async
+from app.models import PolishMemo, User
+
+@pytest.fixture(name="async_engine")
+def async_engine_fixture(session: Session):
+    engine = create_async_engine_for(str(session.get_bind().url), poolclass=NullPool)
+    yield engine
+    asyncio.run(engine.dispose())
+
+class FakeLLM:
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, inputs):
+        with self.lock:
+            self.batches.append(inputs)
+        return [
+            {"hypotheses": [h.upper() for h in item["original_hypotheses"]], "suggestions": item["original_suggestions"][:1]}
+            for item in inputs
+        ]
+
+@pytest.fixture(name="llm")
+def llm_fixture(monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(settings, "OPENAI_POLISH_ENABLED", True)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(llm_polisher, "_batcher", PolishBatcher(send=llm, window=0.1, max_items=16))
+    return llm
+
+def test_identical_inputs_are_memoized(session: Session, async_engine, llm):
+    a = analyze("I love docker. Really!", {"hyperfocus": 5})
+    b = analyze("I love kubernetes and the api. Really really!", {"hyperfocus": 5})
+    assert a["scores"] != b["scores"] and polish_input(a) == polish_input(b)
+
+    async def main():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            first = await polish_narrative_async(a, db)
+            await db.commit()
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            second = await polish_narrative_async(b, db)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert len(llm.batches) == 1
+    assert first["narrative"]["hypotheses"] == second["narrative"]["hypotheses"]
+    assert second["narrative"]["hypotheses"][0].isupper()
+    assert second["scores"] == analyze("I love kubernetes and the api. Really really!", {"hyperfocus": 5})["scores"]
+    assert len(session.exec(select(PolishMemo)).all()) == 1
+
+def test_concurrent_duplicate_inputs_keep_caller_sessions_usable(session: Session, async_engine, llm):
+    """Analyses sharing one batcher result all memoize it; none of their sessions is rolled back."""
+    for i in range(3):
+        session.add(User(email=f"u{i}@example.com", password_hash="x"))
+    session.commit()
+    payload = analyze("I love docker. Really!", {"hyperfocus": 5})
+
+    async def analysis(i):
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            user = (await db.exec(select(User).where(User.email == f"u{i}@example.com"))).one()
+            out = await polish_narrative_async(analyze("I love docker. Really!", {"hyperfocus": 5}), db)
+            user_id = user.id  # expired (MissingGreenlet) if the session had been rolled back
+            await db.commit()
+            return user_id, out
+
+    async def main():
+        return await asyncio.gather(*(analysis(i) for i in range(3)))
+
+    results = asyncio.run(main())
+    assert len(llm.batches) == 1 and len(llm.batches[0]) == 1
+    assert sorted(user_id for user_id, _ in results) == sorted(u.id for u in session.exec(select(User)).all())
+    for _, out in results:
+        assert out["narrative"]["hypotheses"] == [h.upper() for h in payload["narrative"]["hypotheses"]]
+    assert len(session.exec(select(PolishMemo)).all()) == 1
+
+def test_concurrent_distinct_inputs_share_one_request(monkeypatch, async_engine, llm):
+    # each caller opens a session and checks the memo first: leave room for that in the window
+    monkeypatch.setattr(llm_polisher, "_batcher", PolishBatcher(send=llm, window=1.0, max_items=16))
+    high = {"novelty_seeking": 5, "structure_preference": 5, "social_energy": 5, "hyperfocus": 5, "sensory_sensitivity": 5}
+    results = (
+        analyze("calm", {}),
+        analyze("I deploy the API with docker. Really, very excited!", high),
+        analyze("maybe perhaps art paint", {"novelty_seeking": 1, "social_energy": 1}),
+    )
+    payloads = list(results) * 2
+
+    async def polish(payload):
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            return await polish_narrative_async(payload, db)
+
+    async def main():
+        return await asyncio.gather(*(polish(p) for p in payloads))
+
+    polished = asyncio.run(main())
+    assert len(llm.batches) == 1 and len(llm.batches[0]) == 3
+    for original, out in zip(payloads, polished):
+        assert out["narrative"]["suggestions"] == original["narrative"]["suggestions"][:1]
+
+def test_unusable_output_falls_back(monkeypatch, async_engine, llm):
+    monkeypatch.setattr(llm_polisher, "_batcher", PolishBatcher(send=lambda inputs: [None] * len(inputs)))
+    payload = analyze("I love docker.", {})
+
+    async def main():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            return await polish_narrative_async(payload, db)
+
+    assert asyncio.run(main()) == analyze("I love docker.", {})
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from app import readiness
+from app.llm_polisher import PolishBatcher
+from app.main import app
+from app.readiness import LoopLagMonitor, ReadinessGate
+
+def test_gate_hysteresis():
+    gate = ReadinessGate({"queue_depth": 10, "llm_error_rate": 0}, recovery_ratio=0.8)
+    assert gate.update({"queue_depth": 10, "llm_error_rate": 1.0})  # at the limit, and 0 = not gated
+    assert not gate.update({"queue_depth": 11})
+    assert gate.tripped == {"queue_depth"}
+    assert not gate.update({"queue_depth": 9})  # below the limit, not yet below 8
+    assert gate.update({"queue_depth": 7})
+
+def test_loop_lag_monitor_sees_blocked_loop():
+    async def scenario():
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        assert monitor.lag() < 0.05
+        time.sleep(0.2)  # blocks the loop
+        assert monitor.lag() > 0.15  # overdue tick, before the monitor runs again
+        await asyncio.sleep(0.02)
+        assert monitor.lag() > 0.15  # now a recorded sample
+        await monitor.stop()
+        assert monitor.lag() == 0.0
+    asyncio.run(scenario())
+
+def test_batcher_error_rate():
+    calls = []
+
+    def send(inputs):
+        calls.append(inputs)
+        if len(calls) % 2:
+            raise RuntimeError("upstream 500")
+        return [None] * len(inputs)
+
+    batcher = PolishBatcher(send=send, window=0.0)
+    for i in range(4):
+        batcher.submit(f"k{i}", {"n": i}).result(timeout=5)
+    assert batcher.error_rate() == 0.0  # too few calls to judge
+    for i in range(4, 6):
+        batcher.submit(f"k{i}", {"n": i}).result(timeout=5)
+    assert batcher.error_rate() == 0.5
+
+def test_readyz_flips_with_hysteresis(monkeypatch):
+    gate = ReadinessGate({"loop_lag_seconds": 0.5}, recovery_ratio=0.8)
+    monkeypatch.setattr(readiness, "readiness_gate", gate)
+    lag = [0.0]
+    monkeypatch.setattr(readiness.loop_monitor, "lag", lambda: lag[0])
+    client = TestClient(app)
+
+    r = client.get("/readyz")
+    assert r.status_code == 200 and r.json()["ready"]
+    assert set(r.json()["signals"]) >= {"db_checked_out", "analyses_in_flight", "queue_depth", "loop_lag_seconds", "llm_error_rate"}
+
+    lag[0] = 1.0
+    r = client.get("/readyz")
+    assert r.status_code == 503 and r.json()["tripped"] == ["loop_lag_seconds"]
+    lag[0] = 0.45
+    assert client.get("/readyz").status_code == 503
+    lag[0] = 0.1
+    assert client.get("/readyz").status_code == 200
+
+    metrics = client.get("/metrics").text
+    assert "atlas_loop_lag_seconds 0.1" in metrics and "atlas_ready 1" in metrics
@@ -0,0 +1,21 @@
+import json
+from fastapi.testclient import TestClient
+from app.responses import report_list_bytes
+
+def test_report_list_bytes_splices_stored_json():
+    rows = [(2, 5, '{"scores":{"a":1.5},"note":"café"}'), (1, 4, "{}")]
+    assert json.loads(report_list_bytes(rows)) == [
+        {"report_id": 2, "session_id": 5, "result": {"scores": {"a": 1.5}, "note": "café"}},
+        {"report_id": 1, "session_id": 4, "result": {}},
+    ]
+    assert report_list_bytes([]) == b"[]"
+
+def test_reports_endpoint_returns_what_analyze_returned(client: TestClient):
+    token = client.post("/auth/register", json={"email": "r@example.com", "password": "password"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = client.post("/intake", json={"consent": True, "free_text": "I love json."}, headers=headers).json()["session_id"]
+    report = client.post(f"/analyze/{session_id}", headers=headers).json()
+
+    response = client.get("/reports", headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == [report]
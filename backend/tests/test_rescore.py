@@ -0,0 +1,91 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+from app.analysis_engine import analyze
+from app.db import get_session
+from app.executor import AnalysisExecutor
+from app.main import app
+from app.models import Report, ReportVector, RescoreCheckpoint, SessionIntake, User
+from app.percentiles import PercentileIndex
+from app.rescore import Throttle, run_rescore
+
+@pytest.fixture(name="engine")
+def engine_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as db:
+        for i in range(23):
+            db.add(SessionIntake(user_id=1 + i % 2, consent=True, survey_json=json.dumps({"hyperfocus": i % 5 + 1}), free_text=f"I really love docker {i}. Maybe."))
+        db.commit()
+    return engine
+
+def test_rescore_resumes_from_checkpoint(engine):
+    executor = AnalysisExecutor(backend="thread", workers=3, queue_size=0)
+    try:
+        partial = run_rescore(engine, "v2", executor=executor, chunk_size=5, max_chunks=2)
+        assert partial == {"job": "rescore-v2", "model_version": "v2", "processed": 10, "failed": 0, "last_intake_id": 10, "finished": False}
+        done = run_rescore(engine, "v2", executor=executor, chunk_size=5)
+    finally:
+        executor.shutdown()
+    assert done["processed"] == 23 and done["finished"]
+
+    with Session(engine) as db:
+        reports = db.exec(select(Report).order_by(Report.session_id)).all()
+        assert [r.session_id for r in reports] == list(range(1, 24))  # no duplicates across the restart
+        intake = db.get(SessionIntake, 7)
+        assert reports[6].user_id == intake.user_id
+        assert json.loads(reports[6].result_json) == analyze(intake.free_text, json.loads(intake.survey_json), "v2")
+        with pytest.raises(ValueError):
+            run_rescore(engine, "v1", job="rescore-v2", executor=AnalysisExecutor())
+        assert db.exec(select(RescoreCheckpoint)).one().finished
+
+def test_rescored_reports_have_vectors_and_trends(engine):
+    """Rescored reports are served by /reports/{id}/similar and counted in /me/trends and the percentiles like analyzed ones."""
+    with Session(engine) as db:
+        app.dependency_overrides[get_session] = lambda: db
+        try:
+            client = TestClient(app)
+            token = client.post("/auth/register", json={"email": "rescore@example.com", "password": "password"}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            user = db.exec(select(User).where(User.email == "rescore@example.com")).one()
+            assert user.id == 1  # owns the odd-numbered intakes of the fixture
+
+            PercentileIndex().load(db)  # a running deployment already has the shared histogram rows
+            executor = AnalysisExecutor(backend="thread", workers=2, queue_size=0)
+            try:
+                run_rescore(engine, "v2", executor=executor, chunk_size=5)
+            finally:
+                executor.shutdown()
+
+            reports = db.exec(select(Report).where(Report.user_id == user.id)).all()
+            assert len(reports) == 12
+            assert len(db.exec(select(ReportVector)).all()) == 23
+            similar = client.get(f"/reports/{reports[0].id}/similar", headers=headers)
+            assert similar.status_code == 200
+            assert similar.json()["report_id"] == reports[0].id
+
+            trends = client.get("/me/trends", headers=headers).json()
+            assert trends["report_count"] == 12
+            scores = [json.loads(r.result_json)["scores"]["big_five"]["openness"] for r in reports]
+            assert trends["traits"]["big_five"]["openness"]["mean"] == pytest.approx(sum(scores) / len(scores), abs=0.01)
+
+            population = PercentileIndex()  # what an API worker merges on its next flush
+            population.load(db)
+            assert population.total == 23
+        finally:
+            app.dependency_overrides.clear()
+
+def test_throttle_caps_rate():
+    now = [0.0]
+    slept = []
+    throttle = Throttle(max_rate=100, clock=lambda: now[0], sleep=slept.append)
+    throttle.wait(50)
+    now[0] += 0.1
+    throttle.wait(50)
+    assert slept == [0.5, pytest.approx(0.9)]
@@ -0,0 +1,103 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+from app.analysis_engine import analyze
+from app.config import settings
+from app.intake_stats import save_intake_stats
+from app.analysis_engine import scan_text
+from app.models import IntakeStats, Report, ReportVector, SessionIntake, Subscription
+from app.retention import archive_user, iter_archived, purge_user_archive, restore_user, run_archiver, user_archive_dir
+from app.similarity import save_report_vector
+
+NOW = datetime(2026, 6, 15)
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def _history(db: Session, user_id: int, ages_days):
+    """One intake + report per age, with the derived rows the app writes."""
+    for age in ages_days:
+        at = NOW - timedelta(days=age)
+        intake = SessionIntake(user_id=user_id, consent=True, free_text=f"I love docker {age}.", created_at=at)
+        db.add(intake)
+        db.flush()
+        save_intake_stats(db, intake.id, scan_text(intake.free_text))
+        result = analyze(intake.free_text, {})
+        report = Report(user_id=user_id, session_id=intake.id, result_json=json.dumps(result), created_at=at)
+        db.add(report)
+        db.flush()
+        save_report_vector(db, report, result["scores"])
+    db.commit()
+
+def test_archive_moves_old_rows_to_monthly_chunks_and_restores(session: Session, tmp_path):
+    _history(session, 1, [10, 200, 400, 430])
+    counts = archive_user(session, 1, NOW - timedelta(days=365), root=str(tmp_path))
+    assert counts == {"intakes": 2, "reports": 2}
+
+    assert [s.free_text for s in session.exec(select(SessionIntake)).all()] == ["I love docker 10.", "I love docker 200."]
+    assert len(session.exec(select(ReportVector)).all()) == 2
+    assert len(session.exec(select(IntakeStats)).all()) == 2
+    assert sorted(p.name for p in (tmp_path / "1").iterdir()) == [
+        "intakes-2025-04.ndjson.gz", "intakes-2025-05.ndjson.gz", "reports-2025-04.ndjson.gz", "reports-2025-05.ndjson.gz",
+    ]
+    archived = list(iter_archived(1, "reports", root=str(tmp_path)))
+    assert [json.loads(r["result_json"]) for r in archived] == [analyze("I love docker 430.", {}), analyze("I love docker 400.", {})]
+
+    # an upgrade to a 420-day window brings back only the newer archived intake
+    assert restore_user(session, 1, since=NOW - timedelta(days=420), root=str(tmp_path)) == {"intakes": 1, "reports": 1}
+    assert restore_user(session, 1, since=NOW - timedelta(days=420), root=str(tmp_path)) == {"intakes": 0, "reports": 0}
+    restored = session.exec(select(Report).where(Report.created_at == NOW - timedelta(days=400))).one()
+    assert session.exec(select(ReportVector).where(ReportVector.report_id == restored.id)).one()
+
+    purge_user_archive(1, root=str(tmp_path))
+    assert not (tmp_path / "1").exists()
+
+def test_archiver_applies_retention_per_plan(session: Session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RETENTION_DAYS", "free=30,pro=0")
+    _history(session, 1, [5, 60])
+    _history(session, 2, [5, 60])
+    session.add(Subscription(user_id=2, plan="pro_yearly", status="active"))
+    session.commit()
+    assert run_archiver(session, now=NOW, root=str(tmp_path)) == {"users": 1, "intakes": 1, "reports": 1}
+    assert len(session.exec(select(SessionIntake).where(SessionIntake.user_id == 1)).all()) == 1
+    assert len(session.exec(select(SessionIntake).where(SessionIntake.user_id == 2)).all()) == 2
+    assert run_archiver(session, now=NOW, root=str(tmp_path))["intakes"] == 0
+
+def test_intake_with_recent_report_stays_hot(session: Session, tmp_path):
+    _history(session, 1, [400])
+    intake = session.exec(select(SessionIntake)).one()
+    session.add(Report(user_id=1, session_id=intake.id, result_json=json.dumps(analyze("x", {})), created_at=NOW))
+    session.commit()
+    assert archive_user(session, 1, NOW - timedelta(days=365), root=str(tmp_path)) == {"intakes": 0, "reports": 0}
+    assert user_archive_dir(1, str(tmp_path)).endswith("/1")
+
+def test_archiving_drops_vectors_from_the_index(session: Session, tmp_path, monkeypatch):
+    from app.cache import MemoryCache
+    from app import retention
+    from app.similarity import VectorIndex
+    cache = MemoryCache()
+    monkeypatch.setattr(retention, "get_cache", lambda: cache)
+    index = VectorIndex(clusters=2)
+    cache.subscribe(index.on_invalidate)
+    _history(session, 1, [10, 400, 430])
+    _history(session, 2, [10])
+    index.load(session)
+    assert index.size == 4
+
+    archive_user(session, 1, NOW - timedelta(days=365), root=str(tmp_path))
+    assert index.size == 1  # the user's rows are dropped at once...
+    index.refresh(session)
+    assert index.size == 2  # ...and the one still stored is reloaded
+    kept = session.exec(select(Report.id).join(SessionIntake, SessionIntake.id == Report.session_id).where(SessionIntake.free_text == "I love docker 10.", Report.user_id == 1)).one()
+    assert kept in [rid for rid, _, _ in index.knn([50.0] * 8, k=10, exclude_user=2)]
+    assert len(index.knn([50.0] * 8, k=10, exclude_user=2)) == 1
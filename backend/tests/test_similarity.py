@@ -0,0 +1,136 @@
+import json
+import threading
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+import app.main as main
+from app.analysis_engine import analyze, trait_vector
+from app.models import Report, ReportVector
+from app.similarity import VectorIndex, pack_vector, unpack_vector, backfill_report_vectors
+
+@pytest.fixture(name="client")
+def client_fixture(client: TestClient, monkeypatch):
+    monkeypatch.setattr(main, "vector_index", VectorIndex(clusters=2))
+    return client
+
+def _blobs(n_per: int = 200):
+    rng = np.random.default_rng(1)
+    a = rng.normal(20, 3, (n_per, 8))
+    b = rng.normal(80, 3, (n_per, 8))
+    return np.vstack([a, b]).astype(np.float32)
+
+def test_knn_matches_exhaustive_search_and_skips_removed_users():
+    data = _blobs()
+    index = VectorIndex(clusters=2)
+    for i, vec in enumerate(data):
+        index.add(i + 1, i % 7, vec)
+    query = data[3] + 1
+    expected = np.argsort(((data - query) ** 2).sum(1))[:5] + 1
+    assert [rid for rid, _, _ in index.knn(query, 5)] == expected.tolist()
+
+    index.remove_user(3)
+    assert index.size == len(data) - len(range(3, len(data), 7))
+    found = [rid for rid, _, _ in index.knn(query, 20, exclude_user=1)]
+    assert all((rid - 1) % 7 not in (1, 3) for rid in found)
+
+def test_archetypes_separate_clusters():
+    data = _blobs()
+    index = VectorIndex(clusters=2)
+    for i, vec in enumerate(data):
+        index.add(i + 1, 1, vec)
+    index.wait_for_training()
+    low, high = index.archetype([20.0] * 8), index.archetype([80.0] * 8)
+    assert low["cluster"] != high["cluster"]
+    assert low["share"] == high["share"] == 0.5
+    assert abs(low["centroid"]["big_five"]["openness"] - 20) < 1.5
+
+def test_refresh_loads_other_workers_vectors_once(session: Session):
+    index = VectorIndex(clusters=2)
+    session.add(ReportVector(report_id=1, user_id=1, vector=pack_vector([1.0] * 8)))
+    session.commit()
+    index.add(2, 1, [2.0] * 8)  # written by this worker
+    session.add(ReportVector(report_id=2, user_id=1, vector=pack_vector([2.0] * 8)))
+    session.commit()
+    assert index.refresh(session) == 2
+    assert index.size == 2
+    assert unpack_vector(pack_vector([0.5] * 8)).tolist() == [0.5] * 8
+
+def test_similar_endpoint_returns_other_users_profiles(client: TestClient, session: Session):
+    reports = {}
+    for email, text in [("a@example.com", "I love docker."), ("b@example.com", "I love docker!"), ("c@example.com", "calm")]:
+        token = client.post("/auth/register", json={"email": email, "password": "password"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        sid = client.post("/intake", json={"consent": True, "free_text": text}, headers=headers).json()["session_id"]
+        reports[email] = (headers, client.post(f"/analyze/{sid}", headers=headers).json())
+
+    headers, report = reports["a@example.com"]
+    main.vector_index.wait_for_training()
+    body = client.get(f"/reports/{report['report_id']}/similar?k=5", headers=headers).json()
+    assert len(body["neighbors"]) == 2
+    assert body["neighbors"][0]["distance"] <= body["neighbors"][1]["distance"]
+    assert set(body["neighbors"][0]) == {"distance", "scores"}
+    assert body["archetype"]["share"] > 0
+
+    other_headers, _ = reports["b@example.com"]
+    assert client.get(f"/reports/{report['report_id']}/similar", headers=other_headers).status_code == 404
+
+def test_backfill_vectors_for_old_reports(session: Session):
+    result = analyze("I love docker.", {})
+    session.add(Report(user_id=1, session_id=1, result_json=json.dumps(result)))
+    session.commit()
+    assert backfill_report_vectors(session) == 1
+    assert backfill_report_vectors(session) == 0
+    row = session.exec(select(ReportVector)).one()
+    assert np.allclose(unpack_vector(row.vector), trait_vector(result["scores"]))
+
+def test_backfill_skips_malformed_reports(session: Session):
+    """A stored report without usable scores is skipped, not fatal to startup."""
+    session.add(Report(user_id=1, session_id=1, result_json="{}"))
+    session.add(Report(user_id=1, session_id=2, result_json=json.dumps({"scores": ["not", "a", "dict"]})))
+    session.add(Report(user_id=1, session_id=3, result_json=json.dumps(analyze("I love docker.", {}))))
+    session.commit()
+    assert backfill_report_vectors(session) == 1
+    index = VectorIndex(clusters=2)
+    index.load(session)
+    assert index.size == 1
+
+def test_training_runs_off_the_calling_thread(monkeypatch):
+    import app.similarity as similarity
+    release = threading.Event()
+    real_kmeans = similarity.kmeans
+
+    def slow_kmeans(*args, **kwargs):
+        release.wait(5)
+        return real_kmeans(*args, **kwargs)
+
+    monkeypatch.setattr(similarity, "kmeans", slow_kmeans)
+    index = VectorIndex(clusters=2)
+    for i, vec in enumerate(_blobs(10)):
+        index.add(i + 1, 1, vec)  # returns while training is blocked
+    assert index.centroids is None and index.size == 20
+    release.set()
+    index.wait_for_training()
+    assert index.archetype([20.0] * 8)["share"] == 0.5
+
+def test_concurrent_backfills_do_not_conflict(session: Session):
+    result = json.dumps(analyze("I love docker.", {}))
+    for i in range(3):
+        session.add(Report(user_id=1, session_id=i + 1, result_json=result))
+    session.commit()
+    # another worker backfilled one of them between our read and our commit
+    other = Session(session.get_bind())
+    first = session.exec(select(Report)).first()
+    original_commit = session.commit
+    calls = []
+
+    def racing_commit():
+        if not calls:
+            other.add(ReportVector(report_id=first.id, user_id=1, vector=pack_vector([0.0] * 8)))
+            other.commit()
+        calls.append(1)
+        original_commit()
+
+    session.commit = racing_commit
+    assert backfill_report_vectors(session) == 2
+    assert len(session.exec(select(ReportVector)).all()) == 3
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.pool import StaticPool
+import pytest
+from app.analysis_engine import analyze
+import json
+from sqlmodel import select
+from app.models import Report, UserTrend
+from app.trends import SERIES_POINTS, get_trends, update_trends
+
+@pytest.fixture(name="session")
+def session_fixture():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def test_running_aggregates_match_full_history(session: Session):
+    start = datetime(2026, 1, 1)
+    history = [analyze("", {"novelty_seeking": 1 + i % 5})["scores"] for i in range(10)]
+    for i, scores in enumerate(history):
+        update_trends(session, 7, scores, start + timedelta(days=i))
+        session.commit()
+
+    trends = get_trends(session, 7)
+    openness = [s["big_five"]["openness"] for s in history]
+    assert trends["report_count"] == 10
+    assert trends["traits"]["big_five"]["openness"] == {
+        "mean": round(sum(openness) / len(openness), 1),
+        "min": min(openness),
+        "max": max(openness),
+        "last": openness[-1],
+    }
+
+def test_series_is_downsampled_to_bounded_size(session: Session):
+    scores = analyze("", {})["scores"]
+    start = datetime(2026, 1, 1)
+    for i in range(500):
+        update_trends(session, 7, scores, start + timedelta(hours=i))
+    session.commit()
+
+    series = get_trends(session, 7)["series"]
+    assert len(series["points"]) <= SERIES_POINTS
+    assert sum(p["n"] for p in series["points"]) == 500
+    assert series["points"][-1]["t"] == (start + timedelta(hours=499)).isoformat()
+
+def _old_reports(session: Session, user_id: int, n: int):
+    start = datetime(2025, 1, 1)
+    history = [analyze("", {"novelty_seeking": 1 + i % 5})["scores"] for i in range(n)]
+    for i, scores in enumerate(history):
+        session.add(Report(user_id=user_id, session_id=i + 1, result_json=json.dumps({"scores": scores}), created_at=start + timedelta(days=i)))
+    session.commit()
+    return history
+
+def test_first_read_backfills_reports_written_before_trends(session: Session):
+    history = _old_reports(session, 7, 4)
+    trends = get_trends(session, 7)
+    assert trends["report_count"] == 4
+    assert trends["traits"]["big_five"]["openness"]["last"] == history[-1]["big_five"]["openness"]
+    assert session.exec(select(UserTrend)).one().report_count == 4  # stored once
+
+def test_first_update_backfills_without_counting_the_pending_report(session: Session):
+    _old_reports(session, 7, 3)
+    scores = analyze("", {})["scores"]
+    session.add(Report(user_id=7, session_id=99, result_json=json.dumps({"scores": scores})))  # not flushed yet
+    update_trends(session, 7, scores, datetime(2026, 1, 1))
+    session.commit()
+    assert get_trends(session, 7)["report_count"] == 4
+
+def test_concurrent_first_insert_keeps_the_winners_row(session: Session, monkeypatch):
+    # Another worker created the row between our SELECT and our INSERT.
+    from app import trends
+    real = trends._insert_if_missing
+
+    def racing_insert(db, row):
+        winner = Session(db.get_bind())
+        winner.add(UserTrend(user_id=7, report_count=5, stats_json=row.stats_json, series_json=row.series_json))
+        winner.commit()
+        real(db, row)
+
+    monkeypatch.setattr(trends, "_insert_if_missing", racing_insert)
+    update_trends(session, 7, analyze("", {})["scores"], datetime(2026, 1, 1))
+    session.commit()
+    assert session.exec(select(UserTrend)).one().report_count == 6
@@ -18,6 +18,83 @@ def req(method: str, url: str, token: str | None = None, body: dict | None = Non
         msg = e.read().decode("utf-8", errors="ignore")
         raise SystemExit(f"HTTP {e.code}: {msg}")
 
+def download(url: str, token: str, out: str | None):
+    r = urllib.request.Request(url, headers={"Authorization": f"Bearer {token}"}, method="GET")
+    try:
+        with urllib.request.urlopen(r) as resp:
+            dest = open(out, "wb") if out else sys.stdout.buffer
+            try:
+                while True:
+                    chunk = resp.read(64 * 1024)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+            finally:
+                if out:
+                    dest.close()
+    except urllib.error.HTTPError as e:
+        msg = e.read().decode("utf-8", errors="ignore")
+        raise SystemExit(f"HTTP {e.code}: {msg}")
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+def rescore(args):
+    # Runs against the database directly (DATABASE_URL etc. from the
+    # environment/.env), importing the backend in-process.
+    sys.path.insert(0, BACKEND_DIR)
+    from app.db import engine, init_db
+    from app.executor import AnalysisExecutor
+    from app.rescore import run_rescore
+
+    if args.nice:
+        os.nice(args.nice)  # inherited by the worker processes
+    init_db()
+    executor = AnalysisExecutor(backend="process", workers=args.workers, queue_size=0)
+
+    def progress(cp):
+        print(f"{cp.job}: {cp.processed} rescored, {cp.failed} failed, last intake {cp.last_intake_id}", file=sys.stderr)
+
+    try:
+        out = run_rescore(engine, args.model_version, job=args.job, executor=executor, chunk_size=args.chunk_size,
+                          max_rate=args.max_rate, progress=progress)
+    finally:
+        executor.shutdown()
+    print(json.dumps(out, indent=2))
+
+def analyze_local(args):
+    # Scores a file with the analysis engine in worker processes; never opens
+    # the database or the network.
+    sys.path.insert(0, BACKEND_DIR)
+    from app.executor import AnalysisExecutor
+    from app.local_analysis import INPUT_FORMATS, OUTPUT_FORMATS, detect_format, iter_records, open_writer, run_local
+    from app.lexicons import DEFAULT_MODEL_VERSION
+
+    in_fmt = args.input_format or detect_format(args.input, INPUT_FORMATS, "ndjson")
+    out_fmt = args.output_format or detect_format(args.out, OUTPUT_FORMATS, "ndjson")
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    dest = open(args.out, "wb") if args.out else sys.stdout.buffer
+    executor = None
+    try:
+        try:
+            writer = open_writer(dest, out_fmt)
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        executor = AnalysisExecutor(backend="process", workers=args.workers, queue_size=args.workers or os.cpu_count() or 1)
+
+        def progress(st):
+            print(f"{st['records']} analyzed ({st['errors']} errors), {st['records_per_second']:.0f} records/s", file=sys.stderr)
+
+        out = run_local(iter_records(src, in_fmt), writer, executor, args.model_version or DEFAULT_MODEL_VERSION,
+                        chunk_size=args.chunk_size, progress=progress)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if args.input != "-":
+            src.close()
+        if args.out:
+            dest.close()
+    print(json.dumps(out), file=sys.stderr)
+
 def main():
     ap = argparse.ArgumentParser(prog="atlasctl", description="Insight Atlas CLI")
     ap.add_argument("--api", default=os.getenv("ATLAS_API", "http://localhost:8000"), help="API base URL")
@@ -45,6 +122,28 @@ def main():
 
     lr = sub.add_parser("reports")
 
+    e = sub.add_parser("export")
+    e.add_argument("--format", choices=["csv","ndjson","parquet"], default="csv")
+    e.add_argument("--all", action="store_true", help="All users (admin only)")
+    e.add_argument("-o", "--out", help="Output file (default: stdout)")
+
+    rs = sub.add_parser("rescore", help="Re-score all intakes with a scoring model version (resumable)")
+    rs.add_argument("--model-version", required=True)
+    rs.add_argument("--job", help="Checkpoint name (default: rescore-<version>)")
+    rs.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per CPU)")
+    rs.add_argument("--chunk-size", type=int, default=500)
+    rs.add_argument("--max-rate", type=float, default=0.0, help="Max intakes/second (0 = unthrottled)")
+    rs.add_argument("--nice", type=int, default=10, help="Lower CPU priority of the job")
+
+    al = sub.add_parser("analyze-local", help="Analyze a file of texts offline with a local process pool")
+    al.add_argument("input", help="NDJSON or CSV file of {id, text, survey} records (- for stdin)")
+    al.add_argument("-o", "--out", help="Output file (default: stdout)")
+    al.add_argument("--input-format", choices=["ndjson","csv"], help="Default: from the file extension, else ndjson")
+    al.add_argument("--output-format", choices=["ndjson","parquet"], help="Default: from the file extension, else ndjson")
+    al.add_argument("--model-version", help="Scoring model version (default: the engine default)")
+    al.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per CPU)")
+    al.add_argument("--chunk-size", type=int, default=256, help="Records per worker task")
+
     b = sub.add_parser("billing")
     b.add_argument("plan", choices=["monthly","yearly"])
 
@@ -60,6 +159,13 @@ def main():
         print(json.dumps(out, indent=2))
         return
 
+    if args.cmd == "rescore":
+        rescore(args)
+        return
+    if args.cmd == "analyze-local":
+        analyze_local(args)
+        return
+
     if not args.token:
         raise SystemExit("Missing --token or ATLAS_TOKEN")
 
@@ -89,6 +195,11 @@ def main():
         print(json.dumps(out, indent=2))
         return
 
+    if args.cmd == "export":
+        path = "/admin/reports/export" if args.all else "/reports/export"
+        download(f"{api}{path}?format={args.format}", args.token, args.out)
+        return
+
     if args.cmd == "billing":
         out = req("POST", f"{api}/billing/checkout?plan={args.plan}", token=args.token)
         print(json.dumps(out, indent=2))